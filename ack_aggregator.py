@@ -0,0 +1,121 @@
+import threading
+import time
+
+ACK_MODES = ('single', 'batch')
+
+
+class AckAggregator:
+    """Acknowledge sensor readings one by one, or in per-sensor batches.
+
+    single: every reading gets its own {'origId': ...} ack (the original
+            4-way handshake behaviour)
+    batch:  message ids are collected per sensor and sent as one
+            {'origIds': [...]} ack when batch_size ids are waiting or every
+            window seconds, whichever comes first
+
+    send(ack_topic, ack_msg) does the actual publish; it is set once the MQTT
+    client exists. A background thread flushes batches and expires entries in
+    the pending-publish map that never got an on_publish callback, and
+    on_publish callbacks (early_publishes) that never met their publish.
+    """
+
+    def __init__(self, mode='single', window=0.5, batch_size=50, pending_ttl=30.0):
+        if mode not in ACK_MODES:
+            raise ValueError(f"unknown ack mode {mode!r}")
+        self.mode = mode
+        self.window = window
+        self.batch_size = batch_size
+        self.pending_ttl = pending_ttl
+        self.send = None
+        self.pending_publishes = None
+        self.early_publishes = None
+        self._lock = threading.Lock()
+        self._waiting = {}
+        self._halt = threading.Event()
+        self._thread = None
+        self.ids_acked = 0
+        self.acks_published = 0
+        self.pending_expired = 0
+        self.early_expired = 0
+        self.started = time.monotonic()
+
+    def start(self, send, pending_publishes, early_publishes=None):
+        self.send = send
+        self.pending_publishes = pending_publishes
+        self.early_publishes = early_publishes
+        if self._thread is None:
+            self._thread = threading.Thread(target=self._run, daemon=True)
+            self._thread.start()
+
+    def stop(self):
+        self._halt.set()
+        self.flush()
+
+    def add(self, sensor_id, orig_id):
+        self.ids_acked += 1
+        if self.mode == 'single':
+            self._publish(sensor_id, {'origId': orig_id})
+            return
+        with self._lock:
+            ids = self._waiting.setdefault(sensor_id, [])
+            ids.append(orig_id)
+            if len(ids) < self.batch_size:
+                return
+            del self._waiting[sensor_id]
+        self._publish(sensor_id, {'origIds': ids})
+
+    def flush(self):
+        with self._lock:
+            waiting, self._waiting = self._waiting, {}
+        for sensor_id, ids in waiting.items():
+            self._publish(sensor_id, {'origIds': ids})
+
+    def _publish(self, sensor_id, body):
+        body['ts'] = int(time.time() * 1000)
+        body['from'] = 'dashboard'
+        self.acks_published += 1
+        self.send(f"ack/{sensor_id}", body)
+
+    def expire_pending(self):
+        cutoff = int((time.time() - self.pending_ttl) * 1000)
+        expired = 0
+        pending = self.pending_publishes
+        if pending:
+            for mid, info in list(pending.items()):
+                if info['ts'] < cutoff and pending.pop(mid, None) is not None:
+                    expired += 1
+            self.pending_expired += expired
+        early = self.early_publishes
+        if early:
+            # mid -> ts; left when the publish it confirms was itself expired
+            stale = [mid for mid, ts in list(early.items()) if ts < cutoff]
+            for mid in stale:
+                early.pop(mid, None)
+            self.early_expired += len(stale)
+        return expired
+
+    def _run(self):
+        # batches flush every window; stale pending entries are checked about once a second
+        period = self.window if self.mode == 'batch' else 1.0
+        last_expire = time.monotonic()
+        while not self._halt.wait(period):
+            if self.mode == 'batch':
+                self.flush()
+            if time.monotonic() - last_expire >= 1.0:
+                last_expire = time.monotonic()
+                self.expire_pending()
+
+    def stats(self):
+        elapsed = max(time.monotonic() - self.started, 1e-9)
+        return {
+            'mode': self.mode,
+            'ids_acked': self.ids_acked,
+            'acks_published': self.acks_published,
+            'acks_saved': self.ids_acked - self.acks_published,
+            'ids_per_s': self.ids_acked / elapsed,
+            'publishes_per_s': self.acks_published / elapsed,
+            'pending_publishes': len(self.pending_publishes or ()),
+            'pending_expired': self.pending_expired,
+            'early_publishes': len(self.early_publishes or ()),
+            'early_expired': self.early_expired,
+        }
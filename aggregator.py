@@ -0,0 +1,211 @@
+import threading
+import time
+
+# (name, span seconds, buckets): each window is a ring of fixed-width buckets,
+# so add() touches one bucket and summaries never rescan raw readings
+WINDOWS = (('1m', 60, 60), ('5m', 300, 60), ('1h', 3600, 60))
+# topics whose last level is one of these carry 0/1 readings; their windows
+# also count events (0 -> 1 transitions: motion detected, door opened)
+BINARY_KINDS = ('motion', 'door')
+
+
+class RollingWindow:
+    """count/sum/min/max/events over the last `span` seconds in `buckets` slots."""
+
+    def __init__(self, span, buckets):
+        self.span = span
+        self.width = span / buckets
+        self.n = buckets
+        self.slot_ids = [-1] * buckets
+        self.counts = [0] * buckets
+        self.sums = [0.0] * buckets
+        self.mins = [0.0] * buckets
+        self.maxs = [0.0] * buckets
+        self.events = [0] * buckets
+
+    def add(self, t, value, event):
+        idx = int(t // self.width)
+        i = idx % self.n
+        if self.slot_ids[i] != idx:
+            # slot last held a bucket that has since slid out of the window
+            self.slot_ids[i] = idx
+            self.counts[i] = 1
+            self.sums[i] = value
+            self.mins[i] = self.maxs[i] = value
+            self.events[i] = int(event)
+            return
+        self.counts[i] += 1
+        self.sums[i] += value
+        if value < self.mins[i]:
+            self.mins[i] = value
+        elif value > self.maxs[i]:
+            self.maxs[i] = value
+        if event:
+            self.events[i] += 1
+
+    def summary(self, now, started, binary):
+        oldest = int(now // self.width) - self.n + 1
+        count = events = 0
+        total = 0.0
+        lo = hi = None
+        for i, idx in enumerate(self.slot_ids):
+            if idx < oldest or not self.counts[i]:
+                continue
+            count += self.counts[i]
+            total += self.sums[i]
+            events += self.events[i]
+            lo = self.mins[i] if lo is None or self.mins[i] < lo else lo
+            hi = self.maxs[i] if hi is None or self.maxs[i] > hi else hi
+        if not count:
+            return None
+        # until a topic has been seen for a full span, rate is over what we have
+        covered = max(min(self.span, now - started), 1.0)
+        out = {'n': count, 'mean': round(total / count, 3), 'min': lo, 'max': hi,
+               'rate': round(count / covered, 3)}
+        if binary:
+            out['events'] = events
+        return out
+
+
+class _TopicStats:
+    __slots__ = ('windows', 'binary', 'started', 'last_value')
+
+    def __init__(self, topic, now):
+        self.windows = [(name, RollingWindow(span, buckets)) for name, span, buckets in WINDOWS]
+        self.binary = topic.rsplit('/', 1)[-1] in BINARY_KINDS
+        self.started = now
+        self.last_value = None
+
+
+class AggregationEngine:
+    """Rolling per-topic statistics computed once on the server for every viewer.
+
+    add() is called from mqtt_on_message for each numeric reading and costs
+    one bucket update per window. Every `interval` seconds a background thread
+    summarizes the topics that changed and hands only the summaries that
+    differ from the last ones sent to send(changed); every `sweep` seconds
+    all topics are re-summarized so windows sliding past old readings (rate
+    decaying, a min expiring) reach clients too.
+    """
+
+    def __init__(self, interval=1.0, sweep=5.0):
+        self.interval = interval
+        self.sweep = sweep
+        self.send = None
+        self._lock = threading.Lock()
+        self._topics = {}
+        self._dirty = set()
+        self._sent = {}
+        self._halt = threading.Event()
+        self._thread = None
+        self.readings = 0
+        self.pushes = 0
+        self.topics_pushed = 0
+
+    def start(self, send):
+        self.send = send
+        if self._thread is None and self.interval > 0:
+            self._thread = threading.Thread(target=self._run, daemon=True)
+            self._thread.start()
+
+    def stop(self):
+        self._halt.set()
+
+    def add(self, topic, value, now=None):
+        if isinstance(value, bool):
+            value = int(value)
+        elif not isinstance(value, (int, float)):
+            return
+        now = time.time() if now is None else now
+        with self._lock:
+            stats = self._topics.get(topic)
+            if stats is None:
+                stats = self._topics[topic] = _TopicStats(topic, now)
+            event = stats.binary and value and not stats.last_value
+            stats.last_value = value
+            for _, window in stats.windows:
+                window.add(now, value, event)
+            self._dirty.add(topic)
+            self.readings += 1
+
+    def _summarize(self, topic, now):
+        stats = self._topics[topic]
+        return {name: window.summary(now, stats.started, stats.binary) for name, window in stats.windows}
+
+    def summaries(self, topics=None, now=None):
+        now = time.time() if now is None else now
+        out = {}
+        # lock per topic, so a sweep over many topics never stalls add() for long
+        for t in (list(self._topics) if topics is None else topics):
+            with self._lock:
+                out[t] = self._summarize(t, now)
+        return out
+
+    def changed(self, full=False, now=None):
+        """Summaries that differ from the last call's, for dirty (or all) topics."""
+        with self._lock:
+            topics = list(self._topics) if full else self._dirty
+            self._dirty = set()
+        out = {}
+        for topic, summary in self.summaries(topics, now).items():
+            if self._sent.get(topic) != summary:
+                self._sent[topic] = summary
+                out[topic] = summary
+        return out
+
+    def _run(self):
+        last_sweep = time.monotonic()
+        while not self._halt.wait(self.interval):
+            full = time.monotonic() - last_sweep >= self.sweep
+            if full:
+                last_sweep = time.monotonic()
+            changed = self.changed(full)
+            if changed:
+                self.pushes += 1
+                self.topics_pushed += len(changed)
+                self.send(changed)
+
+    def stats(self):
+        return {
+            'topics': len(self._topics),
+            'readings': self.readings,
+            'pushes': self.pushes,
+            'topics_pushed': self.topics_pushed,
+            'interval_s': self.interval,
+        }
+
+
+class AggregateMirror:
+    """Summaries pushed by an AggregationEngine in another process.
+
+    Dashboard web workers (--workers) keep one of these in place of an
+    engine: apply() takes each 'aggregates' delta from the ingest process and
+    summaries() answers snapshots and /aggregates from the last values seen.
+    """
+
+    def __init__(self):
+        self._stats = {}
+        self.pushes = 0
+        self.interval = None
+
+    def start(self, send):
+        pass
+
+    def stop(self):
+        pass
+
+    def apply(self, changed):
+        self._stats.update(changed)
+        self.pushes += 1
+
+    def reset(self, summaries):
+        self._stats = dict(summaries)
+
+    def summaries(self, topics=None, now=None):
+        stats = self._stats
+        if topics is None:
+            return dict(stats)
+        return {t: stats[t] for t in topics if t in stats}
+
+    def stats(self):
+        return {'topics': len(self._stats), 'pushes': self.pushes, 'mirror': True}
@@ -0,0 +1,74 @@
+"""JSON vs compact binary payloads: encode/decode cost and bytes per message.
+
+Encodes and decodes the reading and ack payloads the publisher and
+dashboard exchange, with the current json.dumps/json.loads path against
+payload_codec's fixed layout. The "dashboard decode" rows include what
+mqtt_on_message actually does per format (bytes.decode + json.loads vs
+payload_codec.loads).
+
+    python -m benchmarks.bench_codec --messages 200000
+"""
+import argparse
+import json
+import time
+import uuid
+
+import payload_codec
+
+SENSOR = 'livingroom-temperature-abc123'
+
+
+def timed(fn, items):
+    t0 = time.perf_counter()
+    for x in items:
+        fn(x)
+    return (time.perf_counter() - t0) / len(items) * 1e6
+
+
+def main():
+    parser = argparse.ArgumentParser(description='Payload codec benchmark')
+    parser.add_argument('--messages', type=int, default=100000)
+    parser.add_argument('--batch', type=int, default=50, help='ids per batch ack')
+    args = parser.parse_args()
+
+    n = args.messages
+    index = payload_codec.sensor_index(SENSOR)
+    ids = [uuid.uuid4() for _ in range(n)]
+    readings = [{'id': str(u), 'sensor': SENSOR, 'value': round(20 + (i % 50) / 10, 1), 'ts': 1700000000000 + i}
+                for i, u in enumerate(ids)]
+    raw_readings = [(u.bytes, r['value'], r['ts']) for u, r in zip(ids, readings)]
+    acks = [{'origId': u.hex, 'ts': 1700000000000 + i, 'from': 'dashboard'} for i, u in enumerate(ids)]
+    batches = [{'origIds': [u.hex for u in ids[i:i + args.batch]], 'ts': 1700000000000, 'from': 'dashboard'}
+               for i in range(0, n - args.batch + 1, args.batch)]
+
+    json_readings = [json.dumps(r).encode() for r in readings]
+    bin_readings = [payload_codec.encode_reading(b, index, v, ts) for b, v, ts in raw_readings]
+    json_acks = [json.dumps(a).encode() for a in acks]
+    bin_acks = [payload_codec.encode_ack(a) for a in acks]
+    json_batches = [json.dumps(b).encode() for b in batches]
+    bin_batches = [payload_codec.encode_ack(b) for b in batches]
+
+    rows = [
+        ('reading encode', 'json', timed(json.dumps, readings), json_readings),
+        ('reading encode', 'binary', timed(lambda r: payload_codec.encode_reading(r[0], index, r[1], r[2]), raw_readings), bin_readings),
+        ('reading decode', 'json', timed(lambda b: json.loads(b.decode()), json_readings), json_readings),
+        ('reading decode', 'binary', timed(payload_codec.loads, bin_readings), bin_readings),
+        ('ack encode', 'json', timed(json.dumps, acks), json_acks),
+        ('ack encode', 'binary', timed(payload_codec.encode_ack, acks), bin_acks),
+        ('ack decode', 'json', timed(lambda b: json.loads(b.decode()), json_acks), json_acks),
+        ('ack decode', 'binary', timed(payload_codec.loads, bin_acks), bin_acks),
+        (f'batch ack ({args.batch}) encode', 'json', timed(json.dumps, batches), json_batches),
+        (f'batch ack ({args.batch}) encode', 'binary', timed(payload_codec.encode_ack, batches), bin_batches),
+        (f'batch ack ({args.batch}) decode', 'json', timed(lambda b: json.loads(b.decode()), json_batches), json_batches),
+        (f'batch ack ({args.batch}) decode', 'binary', timed(payload_codec.loads, bin_batches), bin_batches),
+    ]
+
+    print(f"{n} messages\n")
+    print(f"{'operation':<26} {'format':<8} {'us/msg':>8} {'msgs/s':>12} {'bytes/msg':>10}")
+    for op, fmt, us, payloads in rows:
+        size = sum(len(p) for p in payloads) / len(payloads)
+        print(f"{op:<26} {fmt:<8} {us:>8.2f} {1e6 / us:>12,.0f} {size:>10.1f}")
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,205 @@
+"""Report-by-exception vs interval publishing: messages, acks and SSE traffic.
+
+Runs the same simulated fleet (publisher.py --sensors-per-topic, fixed
+--seed) twice against a fresh MiniBroker and dashboard, once with
+--publish-mode interval and once with --publish-mode exception, and counts
+over --duration seconds after a warm-up:
+
+    readings sent          publisher_messages_total
+    readings suppressed    publisher_suppressed_total (inside the deadband)
+    acks received          publisher_acks_total
+    SSE bytes and frames   read by --viewers /stream clients
+    dashboard CPU %        /proc
+
+then prints each mode and the interval/exception ratio. Keep --heartbeat
+well inside --duration so heartbeat readings are part of the count.
+
+It also checks the dashboard's staleness marking: no sensor of the
+exception run may be marked stale while the publisher is up. With
+--stale-check the publisher is then stopped and every sensor must be
+marked within STALE_HEARTBEATS heartbeats plus a sweep.
+
+    python -m benchmarks.bench_deadband
+    python -m benchmarks.bench_deadband --sensors-per-topic 1000 --duration 120 --stale-check
+"""
+import argparse
+import asyncio
+import os
+import subprocess
+import sys
+import time
+
+from benchmarks.load_sse import ROOT, free_port, raise_fd_limit, wait_for_port
+from benchmarks.mini_broker import MiniBroker
+from benchmarks.suite import ProcSampler, scrape, total
+from dashboard_complete import STALE_HEARTBEATS
+from publisher import DEADBANDS
+
+MODES = ('interval', 'exception')
+
+
+class Viewer:
+    """One /stream client counting bytes and SSE frames."""
+
+    def __init__(self):
+        self.bytes = 0
+        self.frames = 0
+        self.measuring = False
+
+    async def run(self, port, stop):
+        try:
+            reader, writer = await asyncio.open_connection('127.0.0.1', port)
+            writer.write(b"GET /stream HTTP/1.1\r\nHost: 127.0.0.1\r\nAccept: text/event-stream\r\n\r\n")
+            await writer.drain()
+            await reader.readuntil(b'\r\n\r\n')
+            while not stop.is_set():
+                chunk = await reader.read(262144)
+                if not chunk:
+                    break
+                if self.measuring:
+                    self.bytes += len(chunk)
+                    self.frames += chunk.count(b'\ndata: ') + chunk.startswith(b'data: ')
+            writer.close()
+        except (OSError, asyncio.IncompleteReadError):
+            pass
+
+
+def _kind(kind):
+    return lambda labels: labels.endswith(f'/{kind}"}}')
+
+
+async def run_mode(mode, args):
+    broker = await MiniBroker('127.0.0.1', 0).start()
+    webport, metrics_port = free_port(), free_port()
+    dashboard = subprocess.Popen(
+        [sys.executable, os.path.join(ROOT, 'dashboard_complete.py'), '--server', args.server,
+         '--broker', '127.0.0.1', '--port', str(broker.port), '--webport', str(webport),
+         '--history-dir', '', '--log-mode', 'summary'],
+        cwd=ROOT, stdout=subprocess.DEVNULL, stderr=subprocess.DEVNULL)
+    pub_cmd = [sys.executable, os.path.join(ROOT, 'publisher.py'), '--broker', '127.0.0.1',
+               '--port', str(broker.port), '--metrics-port', str(metrics_port), '--log-mode', 'summary',
+               '--report-interval', '0', '--outbox-dir', '', '--seed', str(args.seed),
+               '--sensors-per-topic', str(args.sensors_per_topic), '--publish-mode', mode,
+               '--heartbeat', str(args.heartbeat)]
+    if args.engine:
+        pub_cmd += ['--engine', args.engine]
+    publisher = None
+    stop = asyncio.Event()
+    viewers = [Viewer() for _ in range(args.viewers)]
+    tasks = []
+    result = {'mode': mode}
+    try:
+        if not await wait_for_port(webport):
+            raise SystemExit(f'{mode}: dashboard did not start')
+        tasks = [asyncio.create_task(v.run(webport, stop)) for v in viewers]
+        publisher = subprocess.Popen(pub_cmd, cwd=ROOT, stdout=subprocess.DEVNULL, stderr=subprocess.DEVNULL)
+        if not await wait_for_port(metrics_port):
+            raise SystemExit(f'{mode}: publisher did not start')
+        await asyncio.sleep(args.warmup)
+
+        sampler = ProcSampler(dashboard.pid)
+        sampler.begin()
+        pub0 = scrape(metrics_port)
+        for v in viewers:
+            v.measuring = True
+        t0 = time.monotonic()
+        while time.monotonic() - t0 < args.duration:
+            sampler.sample()
+            await asyncio.sleep(0.5)
+        pub1 = scrape(metrics_port)
+        for v in viewers:
+            v.measuring = False
+        elapsed = time.monotonic() - t0
+        dash = scrape(webport)
+        result.update(
+            duration_s=elapsed,
+            sensors=total(dash, 'dashboard_sensors_tracked'),
+            sent=total(pub1, 'publisher_messages_total') - total(pub0, 'publisher_messages_total'),
+            by_kind={kind: total(pub1, 'publisher_messages_total', _kind(kind))
+                     - total(pub0, 'publisher_messages_total', _kind(kind)) for kind in DEADBANDS},
+            suppressed=total(pub1, 'publisher_suppressed_total') - total(pub0, 'publisher_suppressed_total'),
+            acks=total(pub1, 'publisher_acks_total') - total(pub0, 'publisher_acks_total'),
+            sse_bytes=sum(v.bytes for v in viewers) / len(viewers),
+            sse_frames=sum(v.frames for v in viewers) / len(viewers),
+            dashboard_cpu_pct=sampler.end()['cpu_pct'],
+            stale_while_up=total(dash, 'dashboard_sensors_stale'))
+
+        if args.stale_check and mode == 'exception':
+            publisher.terminate()
+            publisher.wait()
+            t_down = time.monotonic()
+            # the sweeper runs every 5 s
+            deadline = t_down + args.heartbeat * STALE_HEARTBEATS + 10
+            stale = 0
+            while time.monotonic() < deadline:
+                await asyncio.sleep(1)
+                stale = total(scrape(webport), 'dashboard_sensors_stale')
+                if stale >= result['sensors']:
+                    break
+            result.update(stale_after_stop=stale, stale_marked_s=time.monotonic() - t_down)
+    finally:
+        stop.set()
+        for t in tasks:
+            t.cancel()
+        for proc in (publisher, dashboard):
+            if proc is not None and proc.poll() is None:
+                proc.terminate()
+                proc.wait()
+        await broker.stop()
+    return result
+
+
+def main():
+    parser = argparse.ArgumentParser(description='Message, ack and SSE volume: interval vs report-by-exception publishing')
+    parser.add_argument('--sensors-per-topic', type=int, default=200)
+    parser.add_argument('--heartbeat', type=float, default=30)
+    parser.add_argument('--duration', type=float, default=60)
+    parser.add_argument('--warmup', type=float, default=10, help='longer than the slowest publish interval')
+    parser.add_argument('--viewers', type=int, default=5)
+    parser.add_argument('--seed', type=int, default=1)
+    parser.add_argument('--engine', choices=('scalar', 'vector'))
+    parser.add_argument('--server', choices=('flask', 'asyncio'), default='asyncio')
+    parser.add_argument('--stale-check', action='store_true', help='stop the exception publisher and wait for every sensor to go stale')
+    args = parser.parse_args()
+
+    raise_fd_limit()
+    results = {}
+    for mode in MODES:
+        print(f"running {mode} for {args.duration:.0f}s ...", flush=True)
+        results[mode] = asyncio.run(run_mode(mode, args))
+
+    rows = [('sensors', 'sensors', '{:.0f}'), ('readings sent/s', 'sent', '{:.1f}'),
+            ('suppressed/s', 'suppressed', '{:.1f}'), ('acks/s', 'acks', '{:.1f}'),
+            ('SSE KB/s per viewer', 'sse_bytes', '{:.1f}'), ('SSE frames/s per viewer', 'sse_frames', '{:.1f}'),
+            ('dashboard CPU %', 'dashboard_cpu_pct', '{:.1f}')]
+    per_s = {'sent', 'suppressed', 'acks', 'sse_bytes', 'sse_frames'}
+    print(f"\n{'':<24} {'interval':>10} {'exception':>10} {'ratio':>7}")
+    for label, key, f in rows:
+        vals = []
+        for mode in MODES:
+            v = results[mode][key]
+            if key in per_s:
+                v /= results[mode]['duration_s']
+            if key == 'sse_bytes':
+                v /= 1024
+            vals.append(v)
+        ratio = f"{vals[0] / vals[1]:>6.1f}x" if vals[1] and key not in ('sensors', 'suppressed') else ''
+        print(f"{label:<24} {f.format(vals[0]):>10} {f.format(vals[1]):>10} {ratio:>7}")
+    for kind, deadband in DEADBANDS.items():
+        vals = [results[mode]['by_kind'][kind] / results[mode]['duration_s'] for mode in MODES]
+        ratio = f"{vals[0] / vals[1]:>6.1f}x" if vals[1] else ''
+        print(f"{'  ' + kind + ' (±' + format(deadband, 'g') + ')':<24} {vals[0]:>10.1f} {vals[1]:>10.1f} {ratio:>7}")
+
+    exc = results['exception']
+    ok = exc['stale_while_up'] == 0
+    print(f"\n  {'ok  ' if ok else 'FAIL'} sensors marked stale while the publisher was up: {exc['stale_while_up']:.0f}")
+    if args.stale_check:
+        marked = exc['stale_after_stop'] >= exc['sensors']
+        ok &= marked
+        print(f"  {'ok  ' if marked else 'FAIL'} stale after the publisher stopped: {exc['stale_after_stop']:.0f} of "
+              f"{exc['sensors']:.0f} in {exc['stale_marked_s']:.0f}s (heartbeat {args.heartbeat:.0f}s)")
+    sys.exit(0 if ok else 1)
+
+
+if __name__ == '__main__':
+    main()
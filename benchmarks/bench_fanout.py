@@ -0,0 +1,87 @@
+"""Fan-out throughput of the SSE broadcast hub.
+
+Publishes synthetic sensor events into a BroadcastHub with 1, 10 and 100
+simulated subscribers, each drained by its own thread (like a Flask /stream
+generator), and reports publish rate, delivery rate and drops.
+
+With --topics/--event-types every subscriber gets that /stream filter, so
+the hub routes through its topic trie instead of putting every event to
+every subscriber:
+
+    python -m benchmarks.bench_fanout --events 50000
+    python -m benchmarks.bench_fanout --topics 'home/livingroom/+' --event-types publish
+"""
+import argparse
+import threading
+import time
+
+from sse_hub import BroadcastHub, OVERFLOW_POLICIES, StreamFilter, Subscriber
+
+
+def run(n_subs, n_events, maxlen, overflow, slow_every, topics=None, event_types=None):
+    hub = BroadcastHub(maxlen=maxlen, overflow=overflow)
+    subs = [hub.attach(Subscriber(maxlen, overflow, StreamFilter.parse(topics, event_types)))
+            for _ in range(n_subs)]
+    done = threading.Event()
+    counts = [0] * n_subs
+
+    def drain(i, sub):
+        while not (done.is_set() and sub.lag == 0):
+            item = sub.get(timeout=0.05)
+            if item is None:
+                continue
+            counts[i] += 1
+            # every Nth subscriber simulates a slow browser
+            if slow_every and i % slow_every == 0:
+                time.sleep(0.0005)
+
+    threads = [threading.Thread(target=drain, args=(i, s), daemon=True) for i, s in enumerate(subs)]
+    for t in threads:
+        t.start()
+
+    topics = ['home/livingroom/temperature', 'home/livingroom/humidity', 'home/entrance/motion',
+              'home/livingroom/light', 'home/entrance/door']
+    directions = ['publisher->broker', 'broker->subscriber', 'subscriber->broker', 'broker->publisher']
+    events = [{'direction': directions[i % 4], 'topic': topics[i % 5], 'payload': {'value': i}, 'ts': i}
+              for i in range(1000)]
+
+    t0 = time.perf_counter()
+    for i in range(n_events):
+        hub.publish(events[i % 1000])
+    t_pub = time.perf_counter() - t0
+    done.set()
+    for t in threads:
+        t.join()
+    t_all = time.perf_counter() - t0
+
+    stats = hub.stats()['subscribers']
+    return {
+        'subscribers': n_subs,
+        'publish_eps': n_events / t_pub,
+        'delivered_eps': sum(counts) / t_all,
+        'dropped': sum(s['dropped'] for s in stats),
+        'coalesced': sum(s['coalesced'] for s in stats),
+        'max_lag': max(s['max_lag'] for s in stats),
+    }
+
+
+def main():
+    parser = argparse.ArgumentParser(description='BroadcastHub fan-out benchmark')
+    parser.add_argument('--events', type=int, default=20000)
+    parser.add_argument('--subscribers', type=int, nargs='+', default=[1, 10, 100])
+    parser.add_argument('--maxlen', type=int, default=1000)
+    parser.add_argument('--overflow', choices=OVERFLOW_POLICIES, default='drop_oldest')
+    parser.add_argument('--slow-every', type=int, default=0, help='make every Nth subscriber slow (0 = none)')
+    parser.add_argument('--topics', help='per-subscriber topic filters, e.g. home/livingroom/+')
+    parser.add_argument('--event-types', help='per-subscriber event types, e.g. publish,ack')
+    args = parser.parse_args()
+
+    print(f"{'subs':>5} {'publish ev/s':>14} {'delivered ev/s':>15} {'dropped':>9} {'coalesced':>10} {'max lag':>8}")
+    for n in args.subscribers:
+        r = run(n, args.events, args.maxlen, args.overflow, args.slow_every, args.topics, args.event_types)
+        print(f"{r['subscribers']:>5} {r['publish_eps']:>14,.0f} {r['delivered_eps']:>15,.0f} "
+              f"{r['dropped']:>9} {r['coalesced']:>10} {r['max_lag']:>8}")
+
+
+if __name__ == '__main__':
+    main()
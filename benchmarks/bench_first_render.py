@@ -0,0 +1,184 @@
+"""Time-to-first-render for a new /stream client, with and without the snapshot.
+
+Runs a MiniBroker, the dashboard and the simulated publisher (sensors every
+3-7 s), lets every sensor publish once, then repeatedly opens fresh SSE
+connections and measures how long until the first reading arrives and
+until every topic has a reading, i.e. until every card can render:
+
+    before  /stream?snapshot=0  cards wait for each sensor's next publish
+    after   /stream             the first frame carries the latest readings
+
+It then checks Last-Event-ID resume: a client reads for a while, drops for
+--gap seconds and reconnects with the last id it saw; the report compares
+the events replayed on reconnect with the ids it missed.
+
+    python -m benchmarks.bench_first_render --trials 5
+"""
+import argparse
+import asyncio
+import json
+import os
+import subprocess
+import sys
+import time
+
+from benchmarks.load_sse import ROOT, free_port, percentile, wait_for_port
+from benchmarks.mini_broker import MiniBroker
+
+
+async def open_stream(port, path, headers=''):
+    reader, writer = await asyncio.open_connection('127.0.0.1', port)
+    writer.write(f"GET {path} HTTP/1.1\r\nHost: 127.0.0.1\r\nAccept: text/event-stream\r\n{headers}\r\n".encode())
+    await writer.drain()
+    await reader.readuntil(b'\r\n\r\n')
+    return reader, writer
+
+
+async def frames(reader):
+    """Yield (event id, parsed data) per SSE frame."""
+    buf = b''
+    while True:
+        chunk = await reader.read(65536)
+        if not chunk:
+            return
+        buf += chunk
+        while b'\n\n' in buf:
+            raw, buf = buf.split(b'\n\n', 1)
+            event_id, data = None, None
+            for line in raw.decode().split('\n'):
+                if line.startswith('id: '):
+                    event_id = line[4:]
+                elif line.startswith('data: '):
+                    data = json.loads(line[6:])
+            if data is not None:
+                yield event_id, data
+
+
+def readings_in(data):
+    """Topics that got a value from one frame's data."""
+    items = data if isinstance(data, list) else [data]
+    for item in items:
+        if item.get('type') == 'snapshot':
+            for r in item['latest']:
+                yield r['topic']
+        elif item.get('direction') == 'publisher->broker':
+            yield item['topic']
+
+
+async def time_to_render(port, path, expected, timeout):
+    t0 = time.monotonic()
+    reader, writer = await open_stream(port, path)
+    first, seen = None, set()
+    try:
+        async def run():
+            nonlocal first
+            async for _, data in frames(reader):
+                for topic in readings_in(data):
+                    if first is None:
+                        first = time.monotonic() - t0
+                    seen.add(topic)
+                if len(seen) >= expected:
+                    return time.monotonic() - t0
+        full = await asyncio.wait_for(run(), timeout)
+        return first, full
+    except asyncio.TimeoutError:
+        return first, None
+    finally:
+        writer.close()
+
+
+async def resume(port, read_s, gap):
+    reader, writer = await open_stream(port, '/stream')
+    last = None
+    end = time.monotonic() + read_s
+    try:
+        async def run():
+            nonlocal last
+            async for event_id, _ in frames(reader):
+                if event_id:
+                    last = event_id
+                if time.monotonic() > end:
+                    return
+        await asyncio.wait_for(run(), read_s + 10)
+    except asyncio.TimeoutError:
+        pass
+    writer.close()
+    await asyncio.sleep(gap)
+
+    reader, writer = await open_stream(port, '/stream', f"Last-Event-ID: {last}\r\n")
+    replayed, kinds = [], set()
+    try:
+        # everything replayed is written in the first chunk(s) right away
+        async def run():
+            async for event_id, data in frames(reader):
+                for item in (data if isinstance(data, list) else [data]):
+                    kinds.add(item.get('type') or 'event')
+                    if 'seq' in item:
+                        replayed.append(item['seq'])
+        await asyncio.wait_for(run(), 0.5)
+    except asyncio.TimeoutError:
+        pass
+    writer.close()
+    return last, replayed, kinds
+
+
+async def run(args):
+    broker = await MiniBroker('127.0.0.1', 0).start()
+    webport = free_port()
+    dash = subprocess.Popen([sys.executable, os.path.join(ROOT, 'dashboard_complete.py'), '--server', args.server,
+                             '--broker', '127.0.0.1', '--port', str(broker.port), '--webport', str(webport),
+                             '--history-dir', '', '--log-mode', 'summary'],
+                            cwd=ROOT, stdout=subprocess.DEVNULL, stderr=subprocess.DEVNULL)
+    pub = subprocess.Popen([sys.executable, os.path.join(ROOT, 'publisher.py'), '--broker', '127.0.0.1',
+                            '--port', str(broker.port), '--log-mode', 'summary', '--report-interval', '0'],
+                           cwd=ROOT, stdout=subprocess.DEVNULL, stderr=subprocess.DEVNULL)
+    try:
+        if not await wait_for_port(webport):
+            raise SystemExit('dashboard did not start')
+        print(f"warming up {args.warmup:.0f}s so every sensor has published...")
+        await asyncio.sleep(args.warmup)
+
+        print(f"\n{'mode':<8} {'first reading ms':>22} {'all {0} topics ms'.format(args.topics):>22} {'timeouts':>9}")
+        for name, path in (('before', '/stream?snapshot=0'), ('after', '/stream')):
+            firsts, alls, timeouts = [], [], 0
+            for _ in range(args.trials):
+                first, full = await time_to_render(webport, path, args.topics, args.timeout)
+                if first is not None:
+                    firsts.append(first * 1000)
+                if full is None:
+                    timeouts += 1
+                else:
+                    alls.append(full * 1000)
+            firsts.sort()
+            alls.sort()
+            fmt = lambda v: f"p50={percentile(v, 50):.0f} max={(v[-1] if v else float('nan')):.0f}"
+            print(f"{name:<8} {fmt(firsts):>22} {fmt(alls):>22} {timeouts:>9}")
+
+        last, replayed, kinds = await resume(webport, 3, args.gap)
+        last_seq = int(last.split('-')[1]) if last else 0
+        contiguous = replayed == list(range(last_seq + 1, last_seq + 1 + len(replayed)))
+        print(f"\nresume after {args.gap:.0f}s gap from {last}: {len(replayed)} events replayed "
+              f"(seq {last_seq + 1}..{replayed[-1] if replayed else last_seq}, contiguous={contiguous}), "
+              f"frames: {', '.join(sorted(kinds)) or 'none'}")
+    finally:
+        pub.terminate()
+        dash.terminate()
+        pub.wait()
+        dash.wait()
+        await broker.stop()
+
+
+def main():
+    parser = argparse.ArgumentParser(description='SSE time-to-first-render and resume benchmark')
+    parser.add_argument('--server', choices=('flask', 'asyncio'), default='flask')
+    parser.add_argument('--trials', type=int, default=5)
+    parser.add_argument('--topics', type=int, default=5, help='topics the publisher uses')
+    parser.add_argument('--warmup', type=float, default=10)
+    parser.add_argument('--timeout', type=float, default=15)
+    parser.add_argument('--gap', type=float, default=5, help='seconds disconnected before resuming')
+    args = parser.parse_args()
+    asyncio.run(run(args))
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,124 @@
+"""Sensor value generation: publisher.py's scalar generators vs SimulationEngine.
+
+For each --sensors count (split evenly over the five sensor kinds) it times
+one tick's worth of values: a generator call per sensor for the scalar
+reference, one batched compute() for the engine's numpy and python
+backends. It also checks the engine against the reference:
+
+  - slot 0 of every kind (phase 0) has the scalar generator's mean and range
+    at the same instant
+  - two engines with the same seed and clock produce identical readings
+
+    python -m benchmarks.bench_generators --sensors 1000 10000 50000
+"""
+import argparse
+import functools
+import inspect
+import statistics
+import sys
+import time
+
+import publisher
+from sensor_sim import BACKENDS, SimulationEngine, np
+
+SCALAR = {kind: gen for _, kind, _, _, gen in publisher.SENSOR_SPECS}
+
+
+def best_of(fn, repeat):
+    best = float('inf')
+    for _ in range(repeat):
+        t0 = time.perf_counter()
+        fn()
+        best = min(best, time.perf_counter() - t0)
+    return best
+
+
+def scalar_tick(per_kind):
+    gens = list(SCALAR.values())
+    return lambda: [g() for g in gens for _ in range(per_kind)]
+
+
+def engine_for(backend, per_kind, seed=1, clock=time.time):
+    engine = SimulationEngine(seed, clock=clock, backend=backend)
+    gens = [engine.add(kind) for kind in SCALAR for _ in range(per_kind)]
+    return engine, gens
+
+
+def reference(gen, t):
+    """The scalar generator frozen at time t (those following a cycle take a clock)."""
+    if 'clock' in inspect.signature(gen).parameters:
+        return functools.partial(gen, clock=lambda: t)
+    return gen
+
+
+def check_distribution(backend, draws):
+    ok = True
+    # one instant for both sides: a sine term that moves during the draws
+    # would shift the reference range away from the engine's
+    t = time.time()
+    engine, _ = engine_for(backend, 1, clock=lambda: t)
+    samples = {kind: [] for kind in SCALAR}
+    for _ in range(draws):
+        for kind, values in engine.compute(t).items():
+            samples[kind].append(values[0])
+    for kind, gen in SCALAR.items():
+        gen = reference(gen, t)
+        ref = [gen() for _ in range(draws)]
+        mean_ref, mean_eng = statistics.mean(ref), statistics.mean(samples[kind])
+        spread = (max(ref) - min(ref)) or 1
+        # means within 5% of the reference range; ranges inside it, with slack for noise
+        same = abs(mean_ref - mean_eng) <= 0.05 * spread and \
+            min(samples[kind]) >= min(ref) - 0.05 * spread and max(samples[kind]) <= max(ref) + 0.05 * spread
+        ok &= same
+        print(f"  {'ok  ' if same else 'FAIL'} {backend:<6} {kind:<12} mean {mean_eng:9.3f} vs {mean_ref:9.3f}  "
+              f"range [{min(samples[kind])}, {max(samples[kind])}] vs [{min(ref)}, {max(ref)}]")
+    return ok
+
+
+def check_reproducible(backend):
+    runs = []
+    for _ in range(2):
+        now = [0.0]
+        engine, gens = engine_for(backend, 20, seed=7, clock=lambda: now[0])
+        values = []
+        for tick in range(10):
+            now[0] = tick * 2.0
+            values += [g() for g in gens]
+        runs.append(values)
+    same = runs[0] == runs[1]
+    print(f"  {'ok  ' if same else 'FAIL'} {backend:<6} same seed and clock -> identical readings")
+    return same
+
+
+def main():
+    parser = argparse.ArgumentParser(description='Scalar vs vectorized sensor value generation')
+    parser.add_argument('--sensors', type=int, nargs='+', default=[1000, 10000, 50000])
+    parser.add_argument('--repeat', type=int, default=5)
+    parser.add_argument('--draws', type=int, default=5000, help='samples per kind for the distribution check')
+    args = parser.parse_args()
+
+    backends = [b for b in BACKENDS if b != 'numpy' or np is not None]
+    if np is None:
+        print('numpy is not installed: timing the python backend only')
+    print(f"{'sensors':>8} {'scalar ms':>10} " + ' '.join(f"{b + ' ms':>10} {'speedup':>8}" for b in backends))
+    for n in args.sensors:
+        per_kind = max(1, n // len(SCALAR))
+        scalar = best_of(scalar_tick(per_kind), args.repeat)
+        row = f"{per_kind * len(SCALAR):>8} {scalar * 1000:>10.2f} "
+        for backend in backends:
+            engine, _ = engine_for(backend, per_kind)
+            now = time.time()
+            t = best_of(lambda: engine.compute(now), args.repeat)
+            row += f"{t * 1000:>10.2f} {scalar / t:>7.1f}x "
+        print(row)
+
+    print('\nagainst the scalar reference:')
+    ok = True
+    for backend in backends:
+        ok &= check_distribution(backend, args.draws)
+        ok &= check_reproducible(backend)
+    sys.exit(0 if ok else 1)
+
+
+if __name__ == '__main__':
+    main()
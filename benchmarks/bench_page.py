@@ -0,0 +1,168 @@
+"""Dashboard page delivery: requests/s and bytes per page load.
+
+Starts dashboard_complete.py against an in-process MiniBroker, once per
+--servers entry, and measures:
+
+    GET / requests/s    --concurrency clients for --duration seconds each,
+                        with no Accept-Encoding, with gzip, and revalidating
+                        (If-None-Match with the ETag of the last response)
+    bytes per page load everything received for / plus the same-origin
+                        scripts it references, as a browser would fetch them:
+                        cold (empty cache) and warm (second visit: immutable
+                        assets from cache, the rest revalidated when they
+                        have an ETag, fetched again when not)
+
+Point --dashboard at another checkout to measure the code before a change:
+
+    python -m benchmarks.bench_page
+    git worktree add /tmp/before HEAD~1
+    python -m benchmarks.bench_page --dashboard /tmp/before/dashboard_complete.py
+
+The client runs on the same machine, so on a small box requests/s is a
+lower bound shared with the load generator.
+"""
+import argparse
+import asyncio
+import gzip
+import json
+import os
+import re
+import subprocess
+import sys
+import time
+
+from benchmarks.load_sse import ROOT, free_port, wait_for_port
+from benchmarks.mini_broker import MiniBroker
+
+# same-origin scripts only; a CDN fetch is not this server's traffic
+SCRIPT_RE = re.compile(rb'<script src="(?!https?:)([^"]+)"')
+
+
+async def get(port, path, headers=None):
+    """(status, headers, body, bytes on the wire) for one GET on a fresh connection."""
+    reader, writer = await asyncio.open_connection('127.0.0.1', port)
+    lines = [f"GET {path} HTTP/1.1", "Host: 127.0.0.1", "Connection: close"]
+    lines += [f"{k}: {v}" for k, v in (headers or {}).items()]
+    writer.write(('\r\n'.join(lines) + '\r\n\r\n').encode())
+    await writer.drain()
+    data = await reader.read()
+    writer.close()
+    head, _, body = data.partition(b'\r\n\r\n')
+    status_line, *header_lines = head.decode('latin-1').split('\r\n')
+    resp_headers = {}
+    for line in header_lines:
+        k, _, v = line.partition(':')
+        resp_headers[k.strip().lower()] = v.strip()
+    return int(status_line.split()[1]), resp_headers, body, len(data)
+
+
+async def rate(port, path, headers, concurrency, duration):
+    count = 0
+    wire = 0
+    deadline = time.monotonic() + duration
+
+    async def client():
+        nonlocal count, wire
+        while time.monotonic() < deadline:
+            status, _, _, n = await get(port, path, headers)
+            if status in (200, 304):
+                count += 1
+                wire += n
+
+    t0 = time.monotonic()
+    await asyncio.gather(*(client() for _ in range(concurrency)))
+    elapsed = time.monotonic() - t0
+    return {'rps': count / elapsed, 'bytes_per_response': wire / max(count, 1)}
+
+
+async def page_load(port, cache=None):
+    """Bytes received for the page and its scripts; fills cache (path -> headers) on a cold load."""
+    accept = {'Accept-Encoding': 'gzip, br'}
+    total, requests = 0, 0
+    status, headers, body, n = await fetch(port, '/', accept, cache)
+    total += n
+    requests += n > 0
+    page = body
+    if headers.get('content-encoding') == 'gzip':
+        page = gzip.decompress(body)
+    elif status == 304:
+        page = cache['/']['body']
+    for src in SCRIPT_RE.findall(page):
+        path = src.decode()
+        if not path.startswith('/'):
+            path = '/' + path
+        _, _, _, n = await fetch(port, path, accept, cache)
+        total += n
+        requests += n > 0
+    return {'bytes': total, 'requests': requests}
+
+
+async def fetch(port, path, headers, cache):
+    """One asset the way a browser cache would: skip, revalidate or fetch."""
+    if cache is not None and path in cache:
+        entry = cache[path]
+        if 'immutable' in entry['headers'].get('cache-control', ''):
+            return 200, entry['headers'], entry['body'], 0
+        if 'etag' in entry['headers']:
+            headers = dict(headers, **{'If-None-Match': entry['headers']['etag']})
+    status, resp_headers, body, n = await get(port, path, headers)
+    if cache is not None and status == 200:
+        cache[path] = {'headers': resp_headers, 'body': body}
+    return status, resp_headers, body, n
+
+
+async def run(server, args):
+    broker = await MiniBroker('127.0.0.1', 0).start()
+    webport = free_port()
+    proc = subprocess.Popen([sys.executable, args.dashboard, '--server', server, '--broker', '127.0.0.1',
+                             '--port', str(broker.port), '--webport', str(webport), '--history-dir', '',
+                             '--log-mode', 'summary'],
+                            cwd=os.path.dirname(os.path.abspath(args.dashboard)),
+                            stdout=subprocess.DEVNULL, stderr=subprocess.DEVNULL)
+    try:
+        if not await wait_for_port(webport):
+            raise SystemExit(f'{server}: dashboard did not start')
+        await asyncio.sleep(1)
+        _, headers, _, _ = await get(webport, '/', {'Accept-Encoding': 'gzip'})
+        revalidate = {'Accept-Encoding': 'gzip'}
+        if 'etag' in headers:
+            revalidate['If-None-Match'] = headers['etag']
+        result = {'server': server,
+                  'etag': headers.get('etag'), 'cache_control': headers.get('cache-control'),
+                  'content_encoding': headers.get('content-encoding')}
+        for name, req_headers in (('plain', {}), ('gzip', {'Accept-Encoding': 'gzip'}), ('revalidate', revalidate)):
+            result[name] = await rate(webport, '/', req_headers, args.concurrency, args.duration)
+        cache = {}
+        result['cold_load'] = await page_load(webport, cache)
+        result['warm_load'] = await page_load(webport, cache)
+        return result
+    finally:
+        proc.terminate()
+        proc.wait()
+        await broker.stop()
+
+
+def main():
+    parser = argparse.ArgumentParser(description='Dashboard page requests/s and bytes per load')
+    parser.add_argument('--servers', nargs='+', choices=('flask', 'asyncio'), default=['flask', 'asyncio'])
+    parser.add_argument('--duration', type=float, default=5, help='seconds per request type')
+    parser.add_argument('--concurrency', type=int, default=16)
+    parser.add_argument('--dashboard', default=os.path.join(ROOT, 'dashboard_complete.py'))
+    parser.add_argument('--json', help='write the results here')
+    args = parser.parse_args()
+
+    results = [asyncio.run(run(server, args)) for server in args.servers]
+    print(f"{'server':<8} {'plain rps':>10} {'gzip rps':>9} {'304 rps':>8} {'B/resp plain':>13} {'B/resp gzip':>12} "
+          f"{'cold load B':>12} {'warm load B':>12}")
+    for r in results:
+        print(f"{r['server']:<8} {r['plain']['rps']:>10.0f} {r['gzip']['rps']:>9.0f} {r['revalidate']['rps']:>8.0f} "
+              f"{r['plain']['bytes_per_response']:>13.0f} {r['gzip']['bytes_per_response']:>12.0f} "
+              f"{r['cold_load']['bytes']:>12} {r['warm_load']['bytes']:>12}")
+        print(f"         ETag {r['etag']}, Cache-Control {r['cache_control']}, Content-Encoding {r['content_encoding']}")
+    if args.json:
+        with open(args.json, 'w') as f:
+            json.dump({'args': vars(args), 'results': results}, f, indent=2)
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,75 @@
+"""Publisher scheduling: one thread per sensor vs the single heap loop.
+
+Builds --sensors-per-topic copies of every publisher.py sensor against an
+in-process MiniBroker and runs each scheduler for --duration seconds,
+reporting achieved messages/s against the expected rate and schedule drift.
+
+    python -m benchmarks.bench_scheduler --sensors-per-topic 200 2000 --duration 10
+"""
+import argparse
+import contextlib
+import os
+import time
+import uuid
+
+import paho.mqtt.client as mqtt
+
+import publisher
+from benchmarks.mini_broker import BrokerThread
+
+
+def run(port, scheduler, per_topic, duration):
+    client = mqtt.Client(client_id=f"bench-{uuid.uuid4()}", userdata={'sensors': []})
+    client.connect('127.0.0.1', port)
+    client.loop_start()
+    stats = publisher.ScheduleStats(window=100000)
+    sensors = publisher.build_sensors(client, per_topic, publisher.AckRouter(client), stats)
+    expected = sum(1.0 / s.interval for s in sensors)
+
+    with open(os.devnull, 'w') as devnull, contextlib.redirect_stdout(devnull):
+        t0 = time.monotonic()
+        if scheduler == 'loop':
+            loop = publisher.SensorScheduler(sensors, stats)
+            loop.start()
+        else:
+            for s in sensors:
+                s.start()
+        # let every sensor publish at least once before measuring
+        time.sleep(max(s.interval for s in sensors))
+        stats.report()
+        time.sleep(duration)
+        r = stats.report()
+        if scheduler == 'loop':
+            loop.stop()
+        for s in sensors:
+            s.stop()
+    client.loop_stop()
+    client.disconnect()
+    r.update(scheduler=scheduler, sensors=len(sensors), expected=expected)
+    return r
+
+
+def main():
+    parser = argparse.ArgumentParser(description='Sensor scheduler benchmark')
+    parser.add_argument('--sensors-per-topic', type=int, nargs='+', default=[20, 200, 2000])
+    parser.add_argument('--schedulers', nargs='+', choices=('loop', 'threads'), default=['threads', 'loop'])
+    parser.add_argument('--duration', type=float, default=10)
+    parser.add_argument('--max-threads', type=int, default=2000, help='skip threads mode above this many sensors')
+    args = parser.parse_args()
+
+    broker = BrokerThread().start()
+    print(f"{'scheduler':<9} {'sensors':>8} {'expected/s':>11} {'msgs/s':>9} {'drift p50':>10} {'drift p99':>10} {'drift max':>10}")
+    try:
+        for n in args.sensors_per_topic:
+            for sched in args.schedulers:
+                if sched == 'threads' and n * len(publisher.SENSOR_SPECS) > args.max_threads:
+                    continue
+                r = run(broker.port, sched, n, args.duration)
+                print(f"{r['scheduler']:<9} {r['sensors']:>8} {r['expected']:>11.1f} {r['msgs_per_s']:>9.1f} "
+                      f"{r['drift_p50_ms']:>8.1f}ms {r['drift_p99_ms']:>8.1f}ms {r['drift_max_ms']:>8.1f}ms")
+    finally:
+        broker.close()
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,85 @@
+"""Per-event vs batched SSE framing.
+
+Replays the event pattern mqtt_on_message produces (publish, deliver, ack
+publish, broker-accepted per reading) through one hub subscriber and frames it
+the way /stream does, comparing bytes on the wire, frames and the time spent
+serializing.
+
+    python -m benchmarks.bench_sse_framing --readings 20000 --batch-max 50
+"""
+import argparse
+import json
+import time
+import uuid
+
+from sse_hub import BroadcastHub, collapse_latest
+
+TOPICS = ['home/livingroom/temperature', 'home/livingroom/humidity', 'home/entrance/motion',
+          'home/livingroom/light', 'home/entrance/door']
+
+
+def reading_events(i):
+    topic = TOPICS[i % len(TOPICS)]
+    sensor = topic.split('/', 1)[1].replace('/', '-') + '-abc123'
+    ts = 1700000000000 + i
+    payload = {'id': str(uuid.uuid4()), 'sensor': sensor, 'value': round(20 + (i % 50) / 10, 1), 'ts': ts}
+    ack_topic = f"ack/{sensor}"
+    ack_msg = {'origId': payload['id'], 'ts': ts, 'from': 'dashboard'}
+    return [
+        {'direction': 'publisher->broker', 'topic': topic, 'payload': payload, 'ts': ts},
+        {'direction': 'broker->subscriber', 'topic': topic, 'payload': payload, 'ts': ts, 'subscriber': 'dashboard'},
+        {'direction': 'subscriber->broker', 'topic': ack_topic, 'payload': ack_msg, 'ts': ts, 'publisher': 'dashboard'},
+        {'direction': 'broker->subscriber', 'topic': ack_topic, 'payload': ack_msg, 'ts': ts, 'note': 'broker accepted publish'},
+    ]
+
+
+def frame_stream(events, batch_max, collapse):
+    hub = BroadcastHub(maxlen=len(events) + 1)
+    sub = hub.subscribe()
+    for e in events:
+        hub.publish(e)
+
+    frames = 0
+    nbytes = 0
+    t0 = time.perf_counter()
+    if batch_max <= 1:
+        while sub.lag:
+            item = sub.get(timeout=0)
+            chunk = f"data: {json.dumps(item)}\n\n"
+            frames += 1
+            nbytes += len(chunk.encode())
+    else:
+        while sub.lag:
+            # window of 0 means "flush whatever is buffered, up to batch_max"
+            batch = sub.get_batch(batch_max, 0, timeout=0)
+            if collapse:
+                batch = collapse_latest(batch)
+            chunk = f"data: {json.dumps(batch)}\n\n"
+            frames += 1
+            nbytes += len(chunk.encode())
+    elapsed = time.perf_counter() - t0
+    return frames, nbytes, elapsed
+
+
+def main():
+    parser = argparse.ArgumentParser(description='SSE framing benchmark')
+    parser.add_argument('--readings', type=int, default=10000)
+    parser.add_argument('--batch-max', type=int, nargs='+', default=[20, 100, 500])
+    args = parser.parse_args()
+
+    events = [e for i in range(args.readings) for e in reading_events(i)]
+    print(f"{len(events)} events from {args.readings} readings\n")
+    print(f"{'mode':<22} {'frames':>8} {'bytes':>12} {'bytes/event':>12} {'frames/s':>12} {'events/s':>12}")
+
+    modes = [('per-event', 1, False)]
+    for n in args.batch_max:
+        modes.append((f'batch {n}', n, False))
+        modes.append((f'batch {n} + latest', n, True))
+    for name, batch_max, collapse in modes:
+        frames, nbytes, elapsed = frame_stream(events, batch_max, collapse)
+        print(f"{name:<22} {frames:>8} {nbytes:>12,} {nbytes / len(events):>12.1f} "
+              f"{frames / elapsed:>12,.0f} {len(events) / elapsed:>12,.0f}")
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,138 @@
+"""Viewer capacity of the dashboard as the number of web workers grows.
+
+For each --workers count this starts a MiniBroker and dashboard_complete.py
+--workers N (0 = the single-process server), then steps through the
+--clients levels: that many /stream viewers are opened from --client-procs
+processes, readings are injected at --rate per second for --duration, and
+every viewer measures broker -> dashboard -> SSE latency. A level passes
+when at least --min-delivery of the expected deliveries arrive with p99
+under --slo-ms; a worker count's capacity is its largest passing level.
+
+    python -m benchmarks.bench_workers --workers 0 1 2 4 --clients 1000 2000 4000 8000
+
+Run it on a box with more cores than the largest worker count plus the
+client processes; on a single core extra workers only add relay overhead.
+"""
+import argparse
+import asyncio
+import json
+import os
+import subprocess
+import sys
+import time
+import uuid
+from concurrent.futures import ProcessPoolExecutor
+
+from benchmarks.load_sse import ROOT, Client, free_port, percentile, raise_fd_limit, wait_for_port
+from benchmarks.mini_broker import MiniBroker
+
+
+def viewers(port, n, until):
+    """One client process: n /stream viewers reading until wall time `until`."""
+    raise_fd_limit()
+
+    async def main():
+        stop = asyncio.Event()
+        clients = [Client() for _ in range(n)]
+        tasks = []
+        for i, c in enumerate(clients):
+            tasks.append(asyncio.create_task(c.run(port, '/stream', stop)))
+            if i % 200 == 199:
+                await asyncio.sleep(0.05)
+        await asyncio.sleep(max(0, until - time.time()))
+        stop.set()
+        for t in tasks:
+            t.cancel()
+        return sum(c.connected for c in clients), [l for c in clients for l in c.latencies]
+
+    return asyncio.run(main())
+
+
+async def level(broker, pool, port, n, args):
+    loop = asyncio.get_running_loop()
+    connect_s = 3 + n / 1000.0
+    start = time.time() + connect_s
+    until = start + args.duration + args.drain
+    share = [n // args.client_procs + (i < n % args.client_procs) for i in range(args.client_procs)]
+    futures = [loop.run_in_executor(pool, viewers, port, k, until) for k in share if k]
+
+    await asyncio.sleep(max(0, start - time.time()))
+    sensor = f"bench-temperature-{uuid.uuid4().hex[:6]}"
+    sent = 0
+    while time.time() - start < args.duration:
+        payload = {'id': str(uuid.uuid4()), 'sensor': sensor, 'value': 21.5,
+                   'ts': int(time.time() * 1000), 'bench_t': time.time()}
+        broker.inject('home/livingroom/temperature', json.dumps(payload).encode())
+        sent += 1
+        await asyncio.sleep(1.0 / args.rate)
+
+    results = await asyncio.gather(*futures)
+    connected = sum(r[0] for r in results)
+    lat = sorted(l for r in results for l in r[1])
+    delivery = len(lat) / (sent * n) if sent and n else 0.0
+    p99 = percentile(lat, 99) * 1000
+    ok = connected == n and delivery >= args.min_delivery and p99 < args.slo_ms
+    return {'clients': n, 'connected': connected, 'delivery': delivery,
+            'p50_ms': percentile(lat, 50) * 1000, 'p99_ms': p99, 'ok': ok}
+
+
+async def run_workers(workers, pool, args):
+    broker = await MiniBroker('127.0.0.1', 0).start()
+    webport = free_port()
+    cmd = [sys.executable, os.path.join(ROOT, 'dashboard_complete.py'), '--server', args.server,
+           '--workers', str(workers), '--broker', '127.0.0.1', '--port', str(broker.port),
+           '--webport', str(webport), '--history-dir', '', '--log-mode', 'summary']
+    proc = subprocess.Popen(cmd, cwd=ROOT, stdout=subprocess.DEVNULL, stderr=subprocess.DEVNULL)
+    capacity = 0
+    try:
+        if not await wait_for_port(webport):
+            raise SystemExit('dashboard did not start')
+        await asyncio.sleep(1 + workers * 0.5)
+        for n in args.clients:
+            r = await level(broker, pool, webport, n, args)
+            print(f"{workers:>8} {r['clients']:>8} {r['connected']:>10} {r['delivery'] * 100:>9.1f}% "
+                  f"{r['p50_ms']:>8.1f} {r['p99_ms']:>8.1f} {'ok' if r['ok'] else 'FAIL':>5}", flush=True)
+            if not r['ok']:
+                break
+            capacity = n
+    finally:
+        proc.terminate()
+        proc.wait()
+        await broker.stop()
+    return capacity
+
+
+async def run(args):
+    print(f"{'workers':>8} {'clients':>8} {'connected':>10} {'delivered':>10} {'p50 ms':>8} {'p99 ms':>8} {'':>5}")
+    capacities = {}
+    with ProcessPoolExecutor(args.client_procs) as pool:
+        for workers in args.workers:
+            capacities[workers] = await run_workers(workers, pool, args)
+            # let the previous dashboard's sockets drain before the next run
+            await asyncio.sleep(2)
+    print(f"\ncpus={os.cpu_count()} server={args.server} rate={args.rate}/s slo p99<{args.slo_ms:.0f}ms")
+    for workers, capacity in capacities.items():
+        print(f"  workers={workers}: {capacity} viewers")
+
+
+def main():
+    parser = argparse.ArgumentParser(description='Viewer capacity vs dashboard web worker count')
+    parser.add_argument('--server', choices=('flask', 'asyncio'), default='asyncio')
+    parser.add_argument('--workers', type=int, nargs='+', default=[0, 1, 2, 4])
+    parser.add_argument('--clients', type=int, nargs='+', default=[500, 1000, 2000, 4000, 8000])
+    parser.add_argument('--client-procs', type=int, default=max(1, (os.cpu_count() or 2) // 2))
+    parser.add_argument('--rate', type=float, default=10, help='readings per second')
+    parser.add_argument('--duration', type=float, default=10)
+    parser.add_argument('--drain', type=float, default=2, help='seconds to wait for stragglers')
+    parser.add_argument('--slo-ms', type=float, default=500, help='p99 latency a level must stay under')
+    parser.add_argument('--min-delivery', type=float, default=0.99)
+    args = parser.parse_args()
+
+    limit = raise_fd_limit()
+    if limit is not None and limit < max(args.clients) + 100:
+        print(f"warning: file descriptor limit {limit} is below the largest --clients level")
+    asyncio.run(run(args))
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,157 @@
+"""SSE load test: thousands of concurrent /stream clients against the dashboard.
+
+Starts a MiniBroker on this process's event loop, launches dashboard_complete.py
+in a subprocess pointed at it, opens --clients SSE connections and injects
+sensor readings at --rate per second. Each reading carries its send time, so
+every client can measure broker -> dashboard -> SSE delivery latency.
+
+    python -m benchmarks.load_sse --server asyncio --clients 2000 --rate 20
+    python -m benchmarks.load_sse --server flask --clients 200
+"""
+import argparse
+import asyncio
+import json
+import os
+import re
+import socket
+import subprocess
+import sys
+import time
+import uuid
+
+from benchmarks.mini_broker import MiniBroker
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+SENT_RE = re.compile(rb'"publisher->broker", "topic": "[^"]*", "payload": \{[^}]*"bench_t": ([0-9.]+)')
+
+
+def raise_fd_limit():
+    try:
+        import resource
+        soft, hard = resource.getrlimit(resource.RLIMIT_NOFILE)
+        resource.setrlimit(resource.RLIMIT_NOFILE, (hard, hard))
+        return hard
+    except (ImportError, ValueError, OSError):
+        return None
+
+
+def free_port():
+    with socket.socket() as s:
+        s.bind(('127.0.0.1', 0))
+        return s.getsockname()[1]
+
+
+def percentile(sorted_values, p):
+    if not sorted_values:
+        return float('nan')
+    k = min(len(sorted_values) - 1, int(round(p / 100.0 * (len(sorted_values) - 1))))
+    return sorted_values[k]
+
+
+async def wait_for_port(port, timeout=20):
+    deadline = time.monotonic() + timeout
+    while time.monotonic() < deadline:
+        try:
+            _, w = await asyncio.open_connection('127.0.0.1', port)
+            w.close()
+            return True
+        except OSError:
+            await asyncio.sleep(0.2)
+    return False
+
+
+class Client:
+    def __init__(self):
+        self.connected = False
+        self.latencies = []
+        self.error = None
+
+    async def run(self, port, path, stop):
+        try:
+            reader, writer = await asyncio.open_connection('127.0.0.1', port)
+            writer.write(f"GET {path} HTTP/1.1\r\nHost: 127.0.0.1\r\nAccept: text/event-stream\r\n\r\n".encode())
+            await writer.drain()
+            await reader.readuntil(b'\r\n\r\n')
+            self.connected = True
+            while not stop.is_set():
+                chunk = await reader.read(65536)
+                if not chunk:
+                    break
+                now = time.time()
+                for m in SENT_RE.finditer(chunk):
+                    self.latencies.append(now - float(m.group(1)))
+            writer.close()
+        except Exception as e:
+            self.error = e
+
+
+async def run(args):
+    broker = await MiniBroker('127.0.0.1', 0).start()
+    webport = free_port()
+    cmd = [sys.executable, os.path.join(ROOT, 'dashboard_complete.py'), '--server', args.server,
+           '--broker', '127.0.0.1', '--port', str(broker.port), '--webport', str(webport),
+           '--history-dir', '']
+    proc = subprocess.Popen(cmd, cwd=ROOT, stdout=subprocess.DEVNULL, stderr=subprocess.DEVNULL)
+    try:
+        if not await wait_for_port(webport):
+            raise SystemExit('dashboard did not start')
+        await asyncio.sleep(1)
+
+        stop = asyncio.Event()
+        clients = [Client() for _ in range(args.clients)]
+        tasks = []
+        t0 = time.monotonic()
+        for i, c in enumerate(clients):
+            tasks.append(asyncio.create_task(c.run(webport, args.path, stop)))
+            if i % 200 == 199:
+                await asyncio.sleep(0.05)
+        while sum(c.connected for c in clients) + sum(c.error is not None for c in clients) < len(clients):
+            if time.monotonic() - t0 > 60:
+                break
+            await asyncio.sleep(0.1)
+        connected = sum(c.connected for c in clients)
+        print(f"{connected}/{args.clients} clients connected in {time.monotonic() - t0:.1f}s")
+
+        sensor = f"bench-temperature-{uuid.uuid4().hex[:6]}"
+        sent = 0
+        start = time.monotonic()
+        while time.monotonic() - start < args.duration:
+            payload = {'id': str(uuid.uuid4()), 'sensor': sensor, 'value': 21.5,
+                       'ts': int(time.time() * 1000), 'bench_t': time.time()}
+            broker.inject('home/livingroom/temperature', json.dumps(payload).encode())
+            sent += 1
+            await asyncio.sleep(1.0 / args.rate)
+        await asyncio.sleep(args.drain)
+        stop.set()
+        for t in tasks:
+            t.cancel()
+
+        lat = sorted(l for c in clients for l in c.latencies)
+        expected = sent * connected
+        print(f"server={args.server} readings={sent} deliveries={len(lat)}/{expected}")
+        print(f"latency ms: p50={percentile(lat, 50) * 1000:.1f} p90={percentile(lat, 90) * 1000:.1f} "
+              f"p99={percentile(lat, 99) * 1000:.1f} max={(lat[-1] if lat else float('nan')) * 1000:.1f}")
+    finally:
+        proc.terminate()
+        proc.wait()
+        await broker.stop()
+
+
+def main():
+    parser = argparse.ArgumentParser(description='Concurrent SSE viewer load test')
+    parser.add_argument('--server', choices=('flask', 'asyncio'), default='asyncio')
+    parser.add_argument('--clients', type=int, default=1000)
+    parser.add_argument('--rate', type=float, default=10, help='readings per second')
+    parser.add_argument('--duration', type=float, default=10)
+    parser.add_argument('--drain', type=float, default=2, help='seconds to wait for stragglers')
+    parser.add_argument('--path', default='/stream')
+    args = parser.parse_args()
+
+    limit = raise_fd_limit()
+    if limit is not None and limit < args.clients + 100:
+        print(f"warning: file descriptor limit {limit} is below --clients")
+    asyncio.run(run(args))
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,241 @@
+"""Minimal in-process MQTT 3.1.1 broker stand-in for benchmarks.
+
+Supports what publisher.py and dashboard_complete.py use: CONNECT, PUBLISH
+(QoS 0/1 in, always QoS 0 out), SUBSCRIBE/UNSUBSCRIBE with + and # wildcards,
+PINGREQ and DISCONNECT. No retained messages, sessions, auth or wills.
+
+Use it on an existing asyncio loop:
+
+    broker = MiniBroker('127.0.0.1', 0)
+    await broker.start()          # broker.port holds the bound port
+    broker.inject('home/x/temp', b'{...}')
+    await broker.stop()
+
+or standalone: python -m benchmarks.mini_broker --port 1883
+
+--tap prints every PUBLISH it receives as one 'topic<TAB>payload' line on
+stdout, before acknowledging it, so a test can see exactly what reached the
+broker even if it is killed mid-stream.
+"""
+import argparse
+import asyncio
+import struct
+import threading
+
+CONNECT, CONNACK, PUBLISH, PUBACK = 1, 2, 3, 4
+SUBSCRIBE, SUBACK, UNSUBSCRIBE, UNSUBACK = 8, 9, 10, 11
+PINGREQ, PINGRESP, DISCONNECT = 12, 13, 14
+
+
+def topic_matches(pattern, topic):
+    """MQTT filter match: '+' matches one level, a trailing '#' the rest."""
+    p = pattern.split('/')
+    t = topic.split('/')
+    for i, part in enumerate(p):
+        if part == '#':
+            return True
+        if i >= len(t):
+            return False
+        if part != '+' and part != t[i]:
+            return False
+    return len(p) == len(t)
+
+
+def encode_length(n):
+    out = bytearray()
+    while True:
+        byte = n % 128
+        n //= 128
+        if n:
+            byte |= 0x80
+        out.append(byte)
+        if not n:
+            return bytes(out)
+
+
+def publish_packet(topic, payload):
+    t = topic.encode()
+    body = struct.pack('!H', len(t)) + t + payload
+    return bytes([PUBLISH << 4]) + encode_length(len(body)) + body
+
+
+class _Session:
+    def __init__(self, writer):
+        self.writer = writer
+        self.filters = []
+        self.client_id = None
+
+
+class MiniBroker:
+    def __init__(self, host='127.0.0.1', port=1883):
+        self.host = host
+        self.port = port
+        self.sessions = set()
+        self._tasks = set()
+        self.messages_in = 0
+        self.messages_out = 0
+        self._server = None
+        # on_publish(topic, payload) for each client PUBLISH, before its PUBACK
+        self.on_publish = None
+
+    async def start(self):
+        self._server = await asyncio.start_server(self._handle, self.host, self.port)
+        self.port = self._server.sockets[0].getsockname()[1]
+        return self
+
+    async def stop(self):
+        if self._server is None:
+            return
+        self._server.close()
+        # drop every client connection too, like a broker process dying
+        for s in list(self.sessions):
+            s.writer.close()
+        if self._tasks:
+            await asyncio.wait(self._tasks, timeout=5)
+        await self._server.wait_closed()
+        self._server = None
+
+    @property
+    def running(self):
+        return self._server is not None
+
+    def inject(self, topic, payload):
+        """Route a message as if a client had published it."""
+        if isinstance(payload, str):
+            payload = payload.encode()
+        self.messages_in += 1
+        self._route(topic, payload)
+
+    def _route(self, topic, payload):
+        packet = None
+        for s in self.sessions:
+            if any(topic_matches(f, topic) for f in s.filters):
+                if packet is None:
+                    packet = publish_packet(topic, payload)
+                s.writer.write(packet)
+                self.messages_out += 1
+
+    async def _read_packet(self, reader):
+        header = await reader.readexactly(1)
+        length, mult = 0, 1
+        while True:
+            b = (await reader.readexactly(1))[0]
+            length += (b & 0x7F) * mult
+            if not b & 0x80:
+                break
+            mult *= 128
+        body = await reader.readexactly(length) if length else b''
+        return header[0], body
+
+    async def _handle(self, reader, writer):
+        session = _Session(writer)
+        task = asyncio.current_task()
+        self._tasks.add(task)
+        try:
+            while True:
+                first, body = await self._read_packet(reader)
+                kind = first >> 4
+                if kind == CONNECT:
+                    self.sessions.add(session)
+                    writer.write(bytes([CONNACK << 4, 2, 0, 0]))
+                elif kind == PUBLISH:
+                    qos = (first >> 1) & 0x03
+                    tlen = struct.unpack_from('!H', body)[0]
+                    topic = body[2:2 + tlen].decode()
+                    pos = 2 + tlen
+                    pid = None
+                    if qos:
+                        pid = body[pos:pos + 2]
+                        pos += 2
+                    if self.on_publish is not None:
+                        self.on_publish(topic, body[pos:])
+                    if pid is not None:
+                        writer.write(bytes([PUBACK << 4, 2]) + pid)
+                    self.messages_in += 1
+                    self._route(topic, body[pos:])
+                elif kind == SUBSCRIBE:
+                    pid, pos, granted = body[:2], 2, bytearray()
+                    while pos < len(body):
+                        flen = struct.unpack_from('!H', body, pos)[0]
+                        session.filters.append(body[pos + 2:pos + 2 + flen].decode())
+                        pos += 2 + flen + 1
+                        granted.append(0)
+                    writer.write(bytes([SUBACK << 4]) + encode_length(2 + len(granted)) + pid + bytes(granted))
+                elif kind == UNSUBSCRIBE:
+                    pid, pos = body[:2], 2
+                    while pos < len(body):
+                        flen = struct.unpack_from('!H', body, pos)[0]
+                        f = body[pos + 2:pos + 2 + flen].decode()
+                        if f in session.filters:
+                            session.filters.remove(f)
+                        pos += 2 + flen
+                    writer.write(bytes([UNSUBACK << 4, 2]) + pid)
+                elif kind == PINGREQ:
+                    writer.write(bytes([PINGRESP << 4, 0]))
+                elif kind == DISCONNECT:
+                    break
+                await writer.drain()
+        except (asyncio.IncompleteReadError, ConnectionError):
+            pass
+        finally:
+            self.sessions.discard(session)
+            self._tasks.discard(task)
+            writer.close()
+
+
+class BrokerThread:
+    """Run a MiniBroker on its own event loop thread (for synchronous callers)."""
+
+    def __init__(self, host='127.0.0.1', port=0):
+        self.broker = MiniBroker(host, port)
+        self.loop = asyncio.new_event_loop()
+        self._thread = threading.Thread(target=self.loop.run_forever, daemon=True)
+        self._thread.start()
+
+    @property
+    def port(self):
+        return self.broker.port
+
+    def _call(self, coro):
+        return asyncio.run_coroutine_threadsafe(coro, self.loop).result()
+
+    def start(self):
+        self._call(self.broker.start())
+        return self
+
+    def stop(self):
+        self._call(self.broker.stop())
+
+    def inject(self, topic, payload):
+        self.loop.call_soon_threadsafe(self.broker.inject, topic, payload)
+
+    def close(self):
+        if self.broker.running:
+            self.stop()
+        self.loop.call_soon_threadsafe(self.loop.stop)
+        self._thread.join()
+
+
+def main():
+    parser = argparse.ArgumentParser(description='Minimal MQTT broker stand-in')
+    parser.add_argument('--host', default='127.0.0.1')
+    parser.add_argument('--port', type=int, default=1883)
+    parser.add_argument('--tap', action='store_true', help="print each received PUBLISH as 'topic<TAB>payload'")
+    args = parser.parse_args()
+
+    async def run():
+        broker = MiniBroker(args.host, args.port)
+        if args.tap:
+            broker.on_publish = lambda topic, payload: print(f"{topic}\t{payload.decode(errors='replace')}", flush=True)
+        await broker.start()
+        print(f"Mini broker listening on {args.host}:{broker.port}", flush=True)
+        await asyncio.Event().wait()
+
+    try:
+        asyncio.run(run())
+    except KeyboardInterrupt:
+        pass
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,204 @@
+"""Broker outage test for the publisher's disk-backed outbox.
+
+Runs the MiniBroker as a separate process, publishes numbered readings at
+--rate through an OutboxPublisher (the same path publisher.py's sensors
+use), kills the broker with SIGKILL for --outage seconds and starts it
+again on the same port. The broker runs with --tap, so the test sees every
+reading that reached it, whichever client was subscribed at the time. Then:
+
+  1. every reading 0..N-1 arrived (duplicates allowed, losses not)
+  2. the backlog replayed at no more than --replay-rate (+ the live rate)
+  3. the outbox ended empty and compacted
+
+Finally it kills the broker again, stops the publisher with readings still
+buffered, reopens the outbox from disk in a new client and checks those
+readings arrive after the broker comes back, as after a publisher restart.
+
+    python -m benchmarks.outage_replay --rate 100 --outage 10 --replay-rate 300
+
+Exits non-zero if any check fails.
+"""
+import argparse
+import json
+import shutil
+import signal
+import socket
+import subprocess
+import sys
+import tempfile
+import threading
+import time
+import uuid
+
+import paho.mqtt.client as mqtt
+
+from benchmarks.load_sse import ROOT, free_port
+from outbox import Outbox, OutboxPublisher
+
+TOPIC = 'home/outage/counter'
+
+
+def start_broker(port, tap):
+    proc = subprocess.Popen([sys.executable, '-m', 'benchmarks.mini_broker', '--port', str(port), '--tap'],
+                            cwd=ROOT, stdout=subprocess.PIPE, stderr=subprocess.DEVNULL, text=True)
+    threading.Thread(target=tap.read, args=(proc.stdout,), daemon=True).start()
+    deadline = time.monotonic() + 10
+    while time.monotonic() < deadline:
+        try:
+            with socket.create_connection(('127.0.0.1', port), timeout=0.2):
+                return proc
+        except OSError:
+            time.sleep(0.05)
+    raise SystemExit('broker did not start')
+
+
+def kill_broker(proc):
+    proc.send_signal(signal.SIGKILL)
+    proc.wait()
+
+
+def connect(port, name):
+    client = mqtt.Client(client_id=f"{name}-{uuid.uuid4().hex[:6]}")
+    client.reconnect_delay_set(min_delay=1, max_delay=2)
+    client.connect('127.0.0.1', port, keepalive=10)
+    client.loop_start()
+    return client
+
+
+class Tap:
+    """Readings seen by the broker, across restarts: n -> first arrival time."""
+
+    def __init__(self):
+        self.lock = threading.Lock()
+        self.seen = {}
+        self.received = 0
+
+    def read(self, stream):
+        for line in stream:
+            topic, _, payload = line.rstrip('\n').partition('\t')
+            if topic != TOPIC:
+                continue
+            n = json.loads(payload)['n']
+            with self.lock:
+                self.received += 1
+                self.seen.setdefault(n, time.monotonic())
+
+    def missing(self, total, start=0):
+        with self.lock:
+            return [n for n in range(start, total) if n not in self.seen]
+
+
+def publish_for(pub, seconds, rate, counter):
+    end = time.monotonic() + seconds
+    due = time.monotonic()
+    while time.monotonic() < end:
+        pub.publish(TOPIC, json.dumps({'n': counter[0], 'ts': int(time.time() * 1000)}))
+        counter[0] += 1
+        due += 1.0 / rate
+        time.sleep(max(0.0, due - time.monotonic()))
+
+
+def wait_until(cond, timeout):
+    deadline = time.monotonic() + timeout
+    while time.monotonic() < deadline:
+        if cond():
+            return True
+        time.sleep(0.1)
+    return cond()
+
+
+def peak_rate(times, window=1.0):
+    times = sorted(times)
+    best, lo = 0, 0
+    for hi, t in enumerate(times):
+        while t - times[lo] > window:
+            lo += 1
+        best = max(best, hi - lo + 1)
+    return best / window
+
+
+def check(results, name, ok, detail):
+    results.append(ok)
+    print(f"  [{'PASS' if ok else 'FAIL'}] {name}: {detail}")
+
+
+def run(args):
+    port = free_port()
+    directory = tempfile.mkdtemp(prefix='outbox-test-')
+    results = []
+    collector = Tap()
+    broker = start_broker(port, collector)
+    try:
+        client = connect(port, 'publisher')
+        pub = OutboxPublisher(client, Outbox(directory, int(args.max_mb * 1024 * 1024)),
+                              args.replay_rate, args.batch).start()
+        counter = [0]
+        time.sleep(1)
+
+        print(f"publishing {args.rate:.0f}/s; broker killed for {args.outage:.0f}s after {args.before:.0f}s")
+        publish_for(pub, args.before, args.rate, counter)
+        kill_broker(broker)
+        outage_start = counter[0]
+        publish_for(pub, args.outage, args.rate, counter)
+        buffered = len(pub.outbox)
+        peak_bytes = pub.outbox.bytes
+        broker = start_broker(port, collector)
+        reconnected = time.monotonic()
+        outage_end = counter[0]
+        publish_for(pub, args.after, args.rate, counter)
+        total = counter[0]
+        drained = wait_until(lambda: not len(pub.outbox), args.drain_timeout)
+        replay_s = time.monotonic() - reconnected
+        wait_until(lambda: not collector.missing(total), 10)
+
+        missing = collector.missing(total)
+        check(results, 'no readings lost', not missing and drained,
+              f"{total} published, {len(collector.seen)} distinct received, {collector.received - len(collector.seen)} duplicates"
+              + (f", missing {missing[:10]}..." if missing else ''))
+        replayed_at = [collector.seen[n] for n in range(outage_start, outage_end) if n in collector.seen]
+        limit = args.replay_rate + args.rate
+        peak = peak_rate(replayed_at)
+        check(results, 'replay paced', peak <= limit * 1.2,
+              f"{buffered} buffered during the outage ({peak_bytes / 1024:.0f} KiB on disk), "
+              f"peak {peak:.0f}/s vs limit {args.replay_rate:.0f}/s + live {args.rate:.0f}/s, backlog gone {replay_s:.1f}s after restart")
+        stats = pub.stats()
+        check(results, 'outbox compacted', stats['pending'] == 0 and stats['segments'] == 1 and stats['dropped'] == 0,
+              f"pending={stats['pending']} bytes={stats['bytes']} segments={stats['segments']} dropped={stats['dropped']}")
+
+        print("publisher restart with readings still buffered")
+        kill_broker(broker)
+        restart_start = counter[0]
+        publish_for(pub, 2, args.rate, counter)
+        client.loop_stop()
+        pub.outbox.close()
+        left = len(Outbox(directory))
+        broker = start_broker(port, collector)
+        client = connect(port, 'publisher')
+        pub = OutboxPublisher(client, Outbox(directory), args.replay_rate, args.batch).start()
+        wait_until(lambda: not len(pub.outbox) and not collector.missing(counter[0], restart_start), args.drain_timeout)
+        missing = collector.missing(counter[0], restart_start)
+        check(results, 'survives publisher restart', left == counter[0] - restart_start and not missing,
+              f"{left} readings reopened from disk, {len(missing)} missing after replay")
+        client.loop_stop()
+    finally:
+        kill_broker(broker)
+        shutil.rmtree(directory, ignore_errors=True)
+    return all(results)
+
+
+def main():
+    parser = argparse.ArgumentParser(description='Publisher outbox broker kill/restart test')
+    parser.add_argument('--rate', type=float, default=100, help='readings per second')
+    parser.add_argument('--before', type=float, default=3, help='seconds of normal publishing first')
+    parser.add_argument('--outage', type=float, default=8, help='seconds the broker is down')
+    parser.add_argument('--after', type=float, default=3, help='seconds of publishing after the restart')
+    parser.add_argument('--replay-rate', type=float, default=300)
+    parser.add_argument('--batch', type=int, default=50)
+    parser.add_argument('--max-mb', type=float, default=64)
+    parser.add_argument('--drain-timeout', type=float, default=60)
+    args = parser.parse_args()
+    sys.exit(0 if run(args) else 1)
+
+
+if __name__ == '__main__':
+    main()
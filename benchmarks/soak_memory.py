@@ -0,0 +1,185 @@
+"""Memory soak test: dashboard RSS under sensor id and viewer churn.
+
+Runs dashboard_complete.py against an in-process MiniBroker and keeps
+replacing the sensor fleet the way publisher.py restarts do: every
+--generation seconds a fresh set of --sensors ids (new random suffix, a
+quarter of them binary with fresh announcements) takes over at --rate
+readings/s. --viewers /stream clients reconnect every --viewer-life seconds.
+Every --sample seconds it reads /debug/memory.
+
+With small --sensor-max / --sensor-ttl the dashboard's bounds are reached
+within minutes, so a short run compresses hours of restarts:
+
+    python -m benchmarks.soak_memory --duration 600
+    python -m benchmarks.soak_memory --duration 10800 --generation 60 --json soak.json
+
+Passes when RSS over the last quarter of the run is within --max-growth-mb
+of the second quarter (after warm-up) and every per-sensor structure stays
+inside its bound. Exits non-zero otherwise.
+"""
+import argparse
+import asyncio
+import json
+import os
+import subprocess
+import sys
+import time
+import urllib.request
+import uuid
+
+import payload_codec
+from benchmarks.load_sse import ROOT, free_port, raise_fd_limit, wait_for_port
+from benchmarks.mini_broker import MiniBroker
+
+SPECS = [('livingroom', 'temperature', 21.5), ('livingroom', 'humidity', 45), ('entrance', 'motion', 0),
+         ('livingroom', 'light', 600), ('entrance', 'door', 0)]
+
+
+def fleet(n):
+    """n new sensors as (sensor id, topic, value, binary index or None)."""
+    suffix = uuid.uuid4().hex[:6]
+    sensors = []
+    for i in range(n):
+        room, kind, value = SPECS[i % len(SPECS)]
+        sensor_id = f"{room}{i // len(SPECS)}-{kind}-{suffix}"
+        index = payload_codec.sensor_index(sensor_id) if i % 4 == 3 else None
+        sensors.append((sensor_id, f"home/{room}{i // len(SPECS)}/{kind}", value, index))
+    return sensors
+
+
+def reading(sensor):
+    sensor_id, topic, value, index = sensor
+    ts = int(time.time() * 1000)
+    if index is not None:
+        return payload_codec.encode_reading(uuid.uuid4().bytes, index, value, ts)
+    return json.dumps({'id': str(uuid.uuid4()), 'sensor': sensor_id, 'value': value, 'ts': ts}).encode()
+
+
+async def viewer(port, life, stop):
+    while not stop.is_set():
+        try:
+            reader, writer = await asyncio.open_connection('127.0.0.1', port)
+            writer.write(b"GET /stream HTTP/1.1\r\nHost: 127.0.0.1\r\n\r\n")
+            deadline = time.monotonic() + life
+            while time.monotonic() < deadline and not stop.is_set():
+                try:
+                    if not await asyncio.wait_for(reader.read(65536), 1):
+                        break
+                except asyncio.TimeoutError:
+                    pass
+            writer.close()
+        except OSError:
+            await asyncio.sleep(1)
+
+
+def debug_memory(port):
+    with urllib.request.urlopen(f'http://127.0.0.1:{port}/debug/memory', timeout=10) as resp:
+        return json.load(resp)
+
+
+async def run(args):
+    loop = asyncio.get_running_loop()
+    broker = await MiniBroker('127.0.0.1', 0).start()
+    webport = free_port()
+    cmd = [sys.executable, os.path.join(ROOT, 'dashboard_complete.py'), '--server', args.server,
+           '--broker', '127.0.0.1', '--port', str(broker.port), '--webport', str(webport),
+           '--history-dir', '', '--log-mode', 'summary', '--sensor-max', str(args.sensor_max),
+           '--sensor-ttl', str(args.sensor_ttl), '--sse-replay', str(args.sse_replay)]
+    proc = subprocess.Popen(cmd, cwd=ROOT, stdout=subprocess.DEVNULL, stderr=subprocess.DEVNULL)
+    stop = asyncio.Event()
+    samples = []
+    churned = 0
+    try:
+        if not await wait_for_port(webport):
+            raise SystemExit('dashboard did not start')
+        viewers = [asyncio.create_task(viewer(webport, args.viewer_life, stop)) for _ in range(args.viewers)]
+        print(f"{'t s':>7} {'rss MB':>8} {'latest':>7} {'by id':>7} {'names':>7} {'evicted':>8} "
+              f"{'pending':>8} {'early':>6} {'subs':>5} {'churned':>8}")
+        start = time.monotonic()
+        next_sample = next_generation = start
+        sensors, i = [], 0
+        while time.monotonic() - start < args.duration:
+            now = time.monotonic()
+            if now >= next_generation:
+                # a publisher restart: new ids for every sensor
+                sensors = fleet(args.sensors)
+                churned += len(sensors)
+                binary = [(s[0], s[1]) for s in sensors if s[3] is not None]
+                broker.inject(payload_codec.ANNOUNCE_TOPIC, payload_codec.announce_message(binary).encode())
+                next_generation = now + args.generation
+            for _ in range(max(1, int(args.rate / 20))):
+                s = sensors[i % len(sensors)]
+                broker.inject(s[1], reading(s))
+                i += 1
+            if now >= next_sample:
+                m = await loop.run_in_executor(None, debug_memory, webport)
+                m['t'] = now - start
+                m['churned'] = churned
+                samples.append(m)
+                print(f"{m['t']:>7.0f} {m['rss_bytes'] / 2 ** 20:>8.1f} {m['latest']['size']:>7} "
+                      f"{m['sensor_topics']['size']:>7} {m['sensor_names']['size']:>7} "
+                      f"{m['latest']['evicted_lru'] + m['latest']['evicted_ttl']:>8} "
+                      f"{m['pending_publishes']['size']:>8} {m['early_publishes']['size']:>6} "
+                      f"{m['sse_subscribers']['count']:>5} {churned:>8}", flush=True)
+                next_sample = now + args.sample
+            await asyncio.sleep(0.05)
+        stop.set()
+        await asyncio.gather(*viewers, return_exceptions=True)
+    finally:
+        proc.terminate()
+        proc.wait()
+        await broker.stop()
+    return samples
+
+
+def verdict(samples, args):
+    ok = True
+    n = len(samples)
+    if n < 8:
+        print('too few samples for a verdict; run longer or sample more often')
+        return False
+    mean = lambda xs: sum(x['rss_bytes'] for x in xs) / len(xs) / 2 ** 20
+    mid, last = mean(samples[n // 4:n // 2]), mean(samples[3 * n // 4:])
+    growth = last - mid
+    print(f"\nRSS {mid:.1f} MB (2nd quarter) -> {last:.1f} MB (last quarter): {growth:+.1f} MB")
+    if growth > args.max_growth_mb:
+        print(f"  FAIL: grew more than {args.max_growth_mb} MB")
+        ok = False
+    bound = args.sensor_max
+    for key in ('latest', 'sensor_topics', 'sensor_names'):
+        peak = max(s[key]['size'] for s in samples)
+        within = peak <= bound
+        ok &= within
+        print(f"  {'ok  ' if within else 'FAIL'} {key}: peak {peak} (bound {bound})")
+    print(f"  {samples[-1]['churned']} sensor ids churned through; "
+          f"{samples[-1]['latest']['evicted_lru']} evicted by count, {samples[-1]['latest']['evicted_ttl']} by age")
+    return ok
+
+
+def main():
+    parser = argparse.ArgumentParser(description='Dashboard memory soak under sensor and viewer churn')
+    parser.add_argument('--duration', type=float, default=600)
+    parser.add_argument('--sensors', type=int, default=50, help='sensors per generation')
+    parser.add_argument('--generation', type=float, default=10, help='seconds between simulated publisher restarts')
+    parser.add_argument('--rate', type=float, default=200, help='readings per second')
+    parser.add_argument('--viewers', type=int, default=20)
+    parser.add_argument('--viewer-life', type=float, default=30, help='seconds before a viewer reconnects')
+    parser.add_argument('--sample', type=float, default=10, help='seconds between /debug/memory samples')
+    parser.add_argument('--sensor-max', type=int, default=500)
+    parser.add_argument('--sensor-ttl', type=float, default=60)
+    parser.add_argument('--sse-replay', type=int, default=10000)
+    parser.add_argument('--max-growth-mb', type=float, default=5)
+    parser.add_argument('--server', choices=('flask', 'asyncio'), default='asyncio')
+    parser.add_argument('--json', help='write every sample here')
+    args = parser.parse_args()
+
+    raise_fd_limit()
+    samples = asyncio.run(run(args))
+    if args.json:
+        with open(args.json, 'w') as f:
+            json.dump({'args': vars(args), 'samples': samples}, f, indent=2)
+    sys.exit(0 if verdict(samples, args) else 1)
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,418 @@
+"""End-to-end benchmark suite: publisher.py -> MiniBroker -> dashboard -> SSE viewers.
+
+Each scenario starts a MiniBroker on this process's event loop (no real
+broker needed), dashboard_complete.py and publisher.py as subprocesses
+pointed at it, and --viewers /stream clients here. After a warm-up it
+measures for --duration seconds:
+
+    publisher and dashboard msgs/s      /metrics counter deltas
+    CPU % and RSS (peak) per process    /proc, process and its children
+    ack latency p50/p99                 publisher_ack_roundtrip_seconds buckets
+    SSE delivery latency p50/p99        reading ts -> viewer, per delivery
+    delivery ratio                      deliveries / (readings x viewers)
+
+Scenarios (scaled with --scale, which multiplies rates, sensors and viewers):
+
+    baseline        200 readings/s from 50 load sensors, 10 viewers
+    many_sensors    2000 simulated publisher.py sensors (~400 readings/s)
+    many_viewers    50 readings/s, 500 viewers
+    large_payloads  200 readings/s of 16 KiB JSON
+    broker_restart  simulated sensors with the outbox; the broker is down
+                    for 3 s mid-run, reporting readings lost and recovery time
+
+Results go to --out as JSON along with the commit they were run on, so runs
+can be compared across commits:
+
+    python -m benchmarks.suite --out before.json
+    python -m benchmarks.suite --scenarios baseline many_viewers --scale 0.5 --out after.json
+    python -m benchmarks.suite --compare before.json after.json
+"""
+import argparse
+import asyncio
+import json
+import math
+import os
+import platform
+import re
+import shutil
+import subprocess
+import sys
+import tempfile
+import time
+import urllib.request
+
+from benchmarks.load_sse import ROOT, free_port, percentile, raise_fd_limit, wait_for_port
+from benchmarks.mini_broker import MiniBroker
+
+SCENARIOS = {
+    'baseline': {'mode': 'load', 'rate': 200, 'sensors': 50, 'viewers': 10},
+    'many_sensors': {'mode': 'simulate', 'per_topic': 400, 'viewers': 10},
+    'many_viewers': {'mode': 'load', 'rate': 50, 'sensors': 50, 'viewers': 500},
+    'large_payloads': {'mode': 'load', 'rate': 200, 'sensors': 50, 'payload_size': 16384, 'viewers': 10},
+    'broker_restart': {'mode': 'simulate', 'per_topic': 40, 'viewers': 10, 'outage': 3},
+}
+# shown by --compare: (key, label, True if higher is better)
+HEADLINE = [
+    ('publisher_msgs_s', 'publisher msgs/s', True),
+    ('dashboard_msgs_s', 'dashboard msgs/s', True),
+    ('dashboard_cpu_pct', 'dashboard CPU %', False),
+    ('dashboard_rss_peak_mb', 'dashboard RSS MB', False),
+    ('publisher_cpu_pct', 'publisher CPU %', False),
+    ('ack_p99_ms', 'ack p99 ms', False),
+    ('sse_p99_ms', 'SSE p99 ms', False),
+    ('delivery', 'delivery ratio', True),
+]
+READING_TS_RE = re.compile(rb'"publisher->broker", "topic": "[^"]*", "payload": \{[^}]*?"ts": (\d+)')
+METRIC_RE = re.compile(r'^([a-zA-Z_:][a-zA-Z0-9_:]*)(\{[^}]*\})? (\S+)$')
+CLK_TCK = os.sysconf('SC_CLK_TCK') if hasattr(os, 'sysconf') else 100
+PAGE_SIZE = os.sysconf('SC_PAGE_SIZE') if hasattr(os, 'sysconf') else 4096
+
+
+def _descendants(pid):
+    pids = [pid]
+    for p in pids:
+        try:
+            for task in os.listdir(f'/proc/{p}/task'):
+                with open(f'/proc/{p}/task/{task}/children') as f:
+                    pids.extend(int(c) for c in f.read().split())
+        except OSError:
+            pass
+    return pids
+
+
+def proc_usage(pid):
+    """(CPU seconds, RSS bytes) of pid and its children, or None without /proc."""
+    cpu = rss = 0
+    for p in _descendants(pid):
+        try:
+            with open(f'/proc/{p}/stat') as f:
+                fields = f.read().rsplit(')', 1)[1].split()
+            with open(f'/proc/{p}/statm') as f:
+                rss += int(f.read().split()[1]) * PAGE_SIZE
+        except OSError:
+            if p == pid:
+                return None
+            continue
+        # utime and stime are fields 14 and 15 of stat, 12 and 13 after the ')'
+        cpu += (int(fields[11]) + int(fields[12])) / CLK_TCK
+    return cpu, rss
+
+
+class ProcSampler:
+    """CPU time over the measurement window and peak RSS, sampled while it runs."""
+
+    def __init__(self, pid):
+        self.pid = pid
+        self.rss_peak = 0
+        self._cpu0 = self._t0 = None
+
+    def sample(self):
+        usage = proc_usage(self.pid)
+        if usage is not None:
+            self.rss_peak = max(self.rss_peak, usage[1])
+        return usage
+
+    def begin(self):
+        usage = self.sample()
+        self._t0 = time.monotonic()
+        self._cpu0 = usage[0] if usage else None
+
+    def end(self):
+        usage = self.sample()
+        if usage is None or self._cpu0 is None:
+            return {'cpu_pct': None, 'rss_mb': None, 'rss_peak_mb': None}
+        wall = time.monotonic() - self._t0
+        return {'cpu_pct': 100.0 * (usage[0] - self._cpu0) / wall, 'rss_mb': usage[1] / 2 ** 20,
+                'rss_peak_mb': self.rss_peak / 2 ** 20}
+
+
+def scrape(port):
+    """Prometheus text from a /metrics endpoint as {(name, labels): value}."""
+    try:
+        with urllib.request.urlopen(f'http://127.0.0.1:{port}/metrics', timeout=10) as resp:
+            text = resp.read().decode()
+    except OSError:
+        return {}
+    out = {}
+    for line in text.splitlines():
+        m = METRIC_RE.match(line)
+        if m:
+            out[(m.group(1), m.group(2) or '')] = float(m.group(3))
+    return out
+
+
+def total(metrics, name, label_filter=None):
+    return sum(v for (n, labels), v in metrics.items() if n == name and (label_filter is None or label_filter(labels)))
+
+
+def histogram_quantile(before, after, name, q):
+    """q-quantile (seconds) of what a histogram observed between two scrapes."""
+    buckets = []
+    for (n, labels), v in after.items():
+        if n == name + '_bucket':
+            le = labels.split('le="', 1)[1].split('"', 1)[0]
+            buckets.append((math.inf if le == '+Inf' else float(le), v - before.get((n, labels), 0)))
+    buckets.sort()
+    count = buckets[-1][1] if buckets else 0
+    if count <= 0:
+        return None
+    rank, prev_le, prev_n = q * count, 0.0, 0.0
+    for le, n in buckets:
+        if n >= rank:
+            if le == math.inf:
+                return prev_le
+            # linear within the bucket, as Prometheus' histogram_quantile does
+            return prev_le + (le - prev_le) * (rank - prev_n) / max(n - prev_n, 1e-12)
+        prev_le, prev_n = le, n
+    return prev_le
+
+
+def _home(labels):
+    return 'topic="home/' in labels
+
+
+class Viewer:
+    """One /stream client measuring reading ts -> arrival for every delivery."""
+
+    def __init__(self):
+        self.connected = False
+        self.latencies = []
+        self.measuring = False
+
+    async def run(self, port, stop):
+        try:
+            reader, writer = await asyncio.open_connection('127.0.0.1', port)
+            writer.write(b"GET /stream HTTP/1.1\r\nHost: 127.0.0.1\r\nAccept: text/event-stream\r\n\r\n")
+            await writer.drain()
+            await reader.readuntil(b'\r\n\r\n')
+            self.connected = True
+            tail = b''
+            while not stop.is_set():
+                chunk = await reader.read(262144)
+                if not chunk:
+                    break
+                now = time.time() * 1000
+                data = tail + chunk
+                # keep an incomplete last frame for the next read
+                cut = data.rfind(b'\n\n') + 2
+                if cut < 2:
+                    tail = data
+                    continue
+                data, tail = data[:cut], data[cut:]
+                if self.measuring:
+                    self.latencies.extend(now - int(m.group(1)) for m in READING_TS_RE.finditer(data))
+            writer.close()
+        except (OSError, asyncio.IncompleteReadError):
+            pass
+
+
+def ms(seconds):
+    return None if seconds is None or (isinstance(seconds, float) and math.isnan(seconds)) else seconds * 1000
+
+
+async def run_scenario(name, spec, args, workdir):
+    scale = args.scale
+    broker = await MiniBroker('127.0.0.1', 0).start()
+    webport, metrics_port = free_port(), free_port()
+    dashboard = subprocess.Popen(
+        [sys.executable, os.path.join(ROOT, 'dashboard_complete.py'), '--server', args.server,
+         '--broker', '127.0.0.1', '--port', str(broker.port), '--webport', str(webport),
+         '--history-dir', os.path.join(workdir, 'history'), '--log-mode', 'summary'],
+        cwd=ROOT, stdout=subprocess.DEVNULL, stderr=subprocess.DEVNULL)
+    pub_cmd = [sys.executable, os.path.join(ROOT, 'publisher.py'), '--broker', '127.0.0.1',
+               '--port', str(broker.port), '--metrics-port', str(metrics_port), '--log-mode', 'summary',
+               '--report-interval', '0', '--outbox-dir', os.path.join(workdir, 'outbox')]
+    if spec['mode'] == 'load':
+        # longer than the run; stopped once the final scrape is done
+        pub_cmd += ['--mode', 'load', '--rate', str(spec['rate'] * scale), '--sensors', str(spec['sensors']),
+                    '--payload-size', str(spec.get('payload_size', 0)),
+                    '--duration', str(args.warmup + args.duration + 60)]
+    else:
+        pub_cmd += ['--sensors-per-topic', str(max(1, int(spec['per_topic'] * scale)))]
+    publisher = None
+    stop = asyncio.Event()
+    tasks = []
+    try:
+        if not await wait_for_port(webport):
+            raise SystemExit(f'{name}: dashboard did not start')
+        viewers = [Viewer() for _ in range(max(1, int(spec['viewers'] * scale)))]
+        for i, v in enumerate(viewers):
+            tasks.append(asyncio.create_task(v.run(webport, stop)))
+            if i % 200 == 199:
+                await asyncio.sleep(0.05)
+        publisher = subprocess.Popen(pub_cmd, cwd=ROOT, stdout=subprocess.DEVNULL, stderr=subprocess.DEVNULL)
+        if not await wait_for_port(metrics_port):
+            raise SystemExit(f'{name}: publisher did not start')
+        await asyncio.sleep(args.warmup)
+
+        samplers = {'dashboard': ProcSampler(dashboard.pid), 'publisher': ProcSampler(publisher.pid)}
+        for s in samplers.values():
+            s.begin()
+        pub0, dash0 = scrape(metrics_port), scrape(webport)
+        for v in viewers:
+            v.measuring = True
+        t0 = time.monotonic()
+        extra = {}
+        outage = spec.get('outage')
+        while time.monotonic() - t0 < args.duration:
+            if outage and 'recovery_s' not in extra and time.monotonic() - t0 >= args.duration / 3:
+                extra.update(await restart_broker(broker, webport, outage, samplers))
+            for s in samplers.values():
+                s.sample()
+            await asyncio.sleep(0.5)
+        elapsed = time.monotonic() - t0
+        pub1 = pub_end = scrape(metrics_port)
+        if outage:
+            # let the outbox replay what was published during the outage
+            await asyncio.sleep(args.drain)
+            pub_end = scrape(metrics_port)
+            await asyncio.sleep(1)
+        dash1 = scrape(webport)
+        received_s = time.monotonic() - t0
+        usage = {k: s.end() for k, s in samplers.items()}
+        for v in viewers:
+            v.measuring = False
+    finally:
+        stop.set()
+        for t in tasks:
+            t.cancel()
+        for proc in (publisher, dashboard):
+            if proc is not None:
+                proc.terminate()
+                proc.wait()
+        await broker.stop()
+
+    published = total(pub1, 'publisher_messages_total') - total(pub0, 'publisher_messages_total')
+    received = total(dash1, 'dashboard_messages_total', _home) - total(dash0, 'dashboard_messages_total', _home)
+    lat = sorted(l for v in viewers for l in v.latencies)
+    connected = sum(v.connected for v in viewers)
+    result = dict(spec, scale=scale, server=args.server, duration_s=elapsed, viewers=len(viewers), connected=connected,
+                  published=published, received=received,
+                  publisher_msgs_s=published / elapsed, dashboard_msgs_s=received / received_s,
+                  ack_p50_ms=ms(histogram_quantile(pub0, pub1, 'publisher_ack_roundtrip_seconds', 0.5)),
+                  ack_p99_ms=ms(histogram_quantile(pub0, pub1, 'publisher_ack_roundtrip_seconds', 0.99)),
+                  sse_deliveries=len(lat),
+                  sse_p50_ms=percentile(lat, 50) if lat else None,
+                  sse_p99_ms=percentile(lat, 99) if lat else None,
+                  sse_max_ms=lat[-1] if lat else None,
+                  delivery=len(lat) / (received * connected) if received and connected else None)
+    for proc, u in usage.items():
+        for k, v in u.items():
+            result[f'{proc}_{k}'] = v
+    if outage:
+        extra['lost'] = max(0, total(pub_end, 'publisher_messages_total') - total(pub0, 'publisher_messages_total') - received)
+    result.update(extra)
+    return result
+
+
+async def restart_broker(broker, webport, outage, samplers):
+    """Stop the broker for `outage` seconds; time until readings flow again."""
+    await broker.stop()
+    t_down = time.monotonic()
+    while time.monotonic() - t_down < outage:
+        for s in samplers.values():
+            s.sample()
+        await asyncio.sleep(0.5)
+    await broker.start()
+    t_up = time.monotonic()
+    before = total(scrape(webport), 'dashboard_messages_total', _home)
+    while time.monotonic() - t_up < 60:
+        await asyncio.sleep(0.1)
+        if total(scrape(webport), 'dashboard_messages_total', _home) > before:
+            break
+    return {'outage_s': outage, 'recovery_s': time.monotonic() - t_up}
+
+
+def git_commit():
+    try:
+        head = subprocess.run(['git', 'rev-parse', '--short', 'HEAD'], cwd=ROOT, capture_output=True, text=True).stdout.strip()
+        dirty = bool(subprocess.run(['git', 'status', '--porcelain', '--untracked-files=no'], cwd=ROOT,
+                                    capture_output=True, text=True).stdout.strip())
+        return head or None, dirty
+    except OSError:
+        return None, None
+
+
+def fmt(v):
+    if v is None:
+        return '—'
+    return f"{v:.3f}" if abs(v) < 10 else f"{v:.1f}"
+
+
+def print_result(name, r):
+    print(f"\n[{name}] {r['publisher_msgs_s']:.0f} msgs/s published, {r['dashboard_msgs_s']:.0f} received, "
+          f"{r['connected']}/{r['viewers']} viewers")
+    print(f"  CPU     dashboard {fmt(r['dashboard_cpu_pct'])}%  publisher {fmt(r['publisher_cpu_pct'])}%")
+    print(f"  RSS MB  dashboard {fmt(r['dashboard_rss_mb'])} (peak {fmt(r['dashboard_rss_peak_mb'])})  "
+          f"publisher {fmt(r['publisher_rss_mb'])} (peak {fmt(r['publisher_rss_peak_mb'])})")
+    print(f"  ack ms  p50 {fmt(r['ack_p50_ms'])}  p99 {fmt(r['ack_p99_ms'])}")
+    print(f"  SSE ms  p50 {fmt(r['sse_p50_ms'])}  p99 {fmt(r['sse_p99_ms'])}  max {fmt(r['sse_max_ms'])}  "
+          f"delivery {fmt(r['delivery'])}")
+    if 'recovery_s' in r:
+        print(f"  broker down {r['outage_s']:.0f}s: readings flowing again {r['recovery_s']:.1f}s after restart, "
+              f"{r['lost']:.0f} lost")
+
+
+def compare(old_path, new_path):
+    with open(old_path) as f:
+        old = json.load(f)
+    with open(new_path) as f:
+        new = json.load(f)
+    print(f"{old.get('commit')} -> {new.get('commit')}{' (dirty)' if new.get('dirty') else ''}")
+    for name, r in new['scenarios'].items():
+        base = old['scenarios'].get(name)
+        if base is None:
+            continue
+        print(f"\n[{name}]")
+        for key, label, higher_better in HEADLINE:
+            a, b = base.get(key), r.get(key)
+            if a is None or b is None:
+                continue
+            change = (b - a) / a * 100 if a else 0.0
+            better = (change > 0) == higher_better
+            mark = '' if abs(change) < 5 else (' better' if better else ' WORSE')
+            print(f"  {label:<18} {fmt(a):>10} -> {fmt(b):>10}  {change:+6.1f}%{mark}")
+
+
+async def run(args):
+    workdir = tempfile.mkdtemp(prefix='bench-suite-')
+    commit, dirty = git_commit()
+    report = {'commit': commit, 'dirty': dirty, 'started': time.strftime('%Y-%m-%dT%H:%M:%S%z'),
+              'python': platform.python_version(), 'platform': platform.platform(), 'cpus': os.cpu_count(),
+              'args': vars(args), 'scenarios': {}}
+    try:
+        for name in args.scenarios:
+            scenario_dir = os.path.join(workdir, name)
+            os.makedirs(scenario_dir)
+            r = await run_scenario(name, SCENARIOS[name], args, scenario_dir)
+            report['scenarios'][name] = r
+            print_result(name, r)
+    finally:
+        shutil.rmtree(workdir, ignore_errors=True)
+    if args.out:
+        with open(args.out, 'w') as f:
+            json.dump(report, f, indent=2)
+        print(f"\nwrote {args.out}")
+
+
+def main():
+    parser = argparse.ArgumentParser(description='End-to-end benchmark suite with JSON output')
+    parser.add_argument('--scenarios', nargs='+', choices=list(SCENARIOS), default=list(SCENARIOS))
+    parser.add_argument('--scale', type=float, default=1.0, help='multiply every scenario rate, sensor and viewer count')
+    parser.add_argument('--duration', type=float, default=15, help='measured seconds per scenario')
+    parser.add_argument('--warmup', type=float, default=5, help='seconds before measuring')
+    parser.add_argument('--drain', type=float, default=5, help='[broker_restart] seconds to let the outbox catch up')
+    parser.add_argument('--server', choices=('flask', 'asyncio'), default='asyncio')
+    parser.add_argument('--out', help='write results here as JSON')
+    parser.add_argument('--compare', nargs=2, metavar=('OLD', 'NEW'), help='compare two --out files and exit')
+    args = parser.parse_args()
+
+    if args.compare:
+        compare(*args.compare)
+        return
+    raise_fd_limit()
+    asyncio.run(run(args))
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,115 @@
+import collections
+import threading
+import time
+
+
+class BoundedMap:
+    """Dict with LRU and TTL eviction, for per-sensor state keyed by sensor id.
+
+    Sensor ids churn: publisher.py makes new ones on every restart, so a
+    plain dict keyed by them grows for as long as the dashboard runs. Here
+    every write moves a key to the young end; once there are more than
+    max_entries keys, or the oldest was last written more than ttl seconds
+    ago, it is evicted and on_evict(key, value) is called (outside the lock)
+    so state derived from it can go too. Reads do not refresh a key: an
+    entry lives as long as something keeps writing it.
+
+    Expiry is checked at the old end on every write and before items(), so
+    it costs O(1) per write and needs no sweeper thread.
+    """
+
+    def __init__(self, max_entries=10000, ttl=None, on_evict=None):
+        self.max_entries = max_entries
+        self.ttl = ttl
+        self.on_evict = on_evict
+        self._lock = threading.Lock()
+        # key -> (value, last write, monotonic)
+        self._data = collections.OrderedDict()
+        self.evicted_lru = 0
+        self.evicted_ttl = 0
+
+    def __setitem__(self, key, value):
+        now = time.monotonic()
+        with self._lock:
+            data = self._data
+            if key in data:
+                data.move_to_end(key)
+            data[key] = (value, now)
+            evicted = self._evict(now) if len(data) > self.max_entries or self.ttl else None
+        if evicted:
+            self._notify(evicted)
+
+    def _evict(self, now):
+        data = self._data
+        evicted = []
+        while len(data) > self.max_entries:
+            key, (value, _) = data.popitem(last=False)
+            evicted.append((key, value))
+            self.evicted_lru += 1
+        if self.ttl:
+            cutoff = now - self.ttl
+            while data:
+                key = next(iter(data))
+                value, touched = data[key]
+                if touched >= cutoff:
+                    break
+                del data[key]
+                evicted.append((key, value))
+                self.evicted_ttl += 1
+        return evicted
+
+    def _notify(self, evicted):
+        if self.on_evict is not None:
+            for key, value in evicted:
+                self.on_evict(key, value)
+
+    def expire(self):
+        """Evict whatever is over the limits now; returns how many went."""
+        with self._lock:
+            evicted = self._evict(time.monotonic())
+        self._notify(evicted)
+        return len(evicted)
+
+    def __getitem__(self, key):
+        return self._data[key][0]
+
+    def get(self, key, default=None):
+        entry = self._data.get(key)
+        return default if entry is None else entry[0]
+
+    def __contains__(self, key):
+        return key in self._data
+
+    def __len__(self):
+        return len(self._data)
+
+    def pop(self, key, default=None):
+        with self._lock:
+            entry = self._data.pop(key, None)
+        return default if entry is None else entry[0]
+
+    def items(self):
+        """Snapshot of (key, value) pairs, oldest write first."""
+        self.expire()
+        with self._lock:
+            return [(k, v[0]) for k, v in self._data.items()]
+
+    def ages(self):
+        """Snapshot of (key, value, seconds since last write), oldest write first."""
+        self.expire()
+        now = time.monotonic()
+        with self._lock:
+            return [(k, v, now - touched) for k, (v, touched) in self._data.items()]
+
+    def clear(self):
+        with self._lock:
+            self._data.clear()
+
+    def stats(self):
+        return {
+            'size': len(self._data),
+            'max_entries': self.max_entries,
+            'ttl_s': self.ttl,
+            'evicted_lru': self.evicted_lru,
+            'evicted_ttl': self.evicted_ttl,
+        }
@@ -257,14 +257,23 @@ function appendEventToTable(topic, item) {
   
   const payloadStr = JSON.stringify(payload);
 
+  // payloads come from whoever can publish to the broker: set as text, never as markup
   const row = document.createElement('tr');
-  row.innerHTML = `
-    <td class="time-cell">${time}</td>
-    <td><span class="direction-badge ${dirClass}">${dirText}</span></td>
-    <td class="topic-cell">${topicShort}</td>
-    <td class="value-cell">${displayValue}</td>
-    <td class="payload-cell" title="${payloadStr}">${payloadStr}</td>
-  `;
+  const cell = (className, text) => {
+    const td = document.createElement('td');
+    td.className = className;
+    td.textContent = text;
+    return td;
+  };
+  const dirCell = document.createElement('td');
+  const badge = document.createElement('span');
+  badge.className = 'direction-badge ' + dirClass;
+  badge.textContent = dirText;
+  dirCell.appendChild(badge);
+  const payloadCell = cell('payload-cell', payloadStr);
+  payloadCell.title = payloadStr;
+  row.append(cell('time-cell', time), dirCell, cell('topic-cell', topicShort),
+             cell('value-cell', String(displayValue)), payloadCell);
 
   log.tbody.insertBefore(row, log.tbody.firstChild);
   
@@ -279,7 +288,7 @@ function openModal(topic) {
   const cfg = sensorConfig[topic];
   const card = cards[topic];
   
-  document.getElementById('modalTitle').innerHTML = `${cfg.icon} ${cfg.label} - ${cfg.location}`;
+  document.getElementById('modalTitle').textContent = `${cfg.icon} ${cfg.label} - ${cfg.location}`;
   
   const modal = document.getElementById('chartModal');
   modal.classList.add('show');
@@ -391,8 +400,7 @@ document.addEventListener('keydown', function(event) {
 // SSE Connection
 const es = new EventSource('/stream');
 
-es.onmessage = function(e) {
-  const item = JSON.parse(e.data);
+function handleEvent(item) {
   const topic = item.topic;
 
   // Update sensor cards and charts
@@ -412,13 +420,24 @@ es.onmessage = function(e) {
     }
   }
 
-  // Add to appropriate sensor log table
+  // Add to appropriate sensor log table; batch acks carry origIds instead of origId
+  const isAck = topic && topic.startsWith('ack/') && item.payload && (item.payload.origId || item.payload.origIds);
   for (let sensorTopic in sensorConfig) {
-    if (topic && (topic.includes(sensorTopic) || (topic.startsWith('ack/') && item.payload && item.payload.origId))) {
+    if (topic && (topic.includes(sensorTopic) || isAck)) {
       appendEventToTable(sensorTopic, item);
       break;
     }
   }
+}
+
+es.onmessage = function(e) {
+  // Batched streams deliver a JSON array of events per frame
+  const data = JSON.parse(e.data);
+  if (Array.isArray(data)) {
+    data.forEach(handleEvent);
+  } else {
+    handleEvent(data);
+  }
 };
 
 es.onerror = function() {
@@ -0,0 +1,256 @@
+"""Single event loop server mode for the dashboard (--server asyncio).
+
+The paho client's socket is registered with the asyncio loop (loop_read /
+loop_write / loop_misc are driven from reader/writer callbacks), so MQTT
+ingestion, ack publishing and every /stream connection run on one thread.
+Each SSE client is an AsyncSubscriber coroutine instead of a blocked OS thread.
+
+Any other path (/history, /stream/stats, ...) is handed to the Flask app as a
+plain WSGI call on the loop's default executor.
+"""
+import asyncio
+import io
+import json
+import logging
+import sys
+import threading
+import urllib.parse
+
+from sse_hub import AsyncSubscriber, StreamFilter, collapse_latest
+
+log = logging.getLogger('dashboard')
+
+
+class AsyncioMqttLoop:
+    """Drive a paho client's network loop from an asyncio event loop.
+
+    Must be created on the loop's thread, before the client connects.
+    """
+
+    def __init__(self, loop, client):
+        self.loop = loop
+        self.client = client
+        self._misc = None
+        self._thread = threading.get_ident()
+        client.on_socket_open = self._on_socket_open
+        client.on_socket_close = self._on_socket_close
+        client.on_socket_register_write = self._on_register_write
+        client.on_socket_unregister_write = self._on_unregister_write
+        self._misc = loop.create_task(self._misc_loop())
+
+    def _call(self, fn, *args):
+        # paho may call back from another thread (e.g. a publish() elsewhere)
+        if threading.get_ident() == self._thread:
+            fn(*args)
+        else:
+            self.loop.call_soon_threadsafe(fn, *args)
+
+    def _on_socket_open(self, client, userdata, sock):
+        self._call(self._open, sock.fileno())
+
+    def _open(self, fd):
+        self.loop.add_reader(fd, self.client.loop_read)
+
+    def _on_socket_close(self, client, userdata, sock):
+        self._call(self.loop.remove_reader, sock.fileno())
+
+    def _on_register_write(self, client, userdata, sock):
+        self._call(self.loop.add_writer, sock.fileno(), self.client.loop_write)
+
+    def _on_unregister_write(self, client, userdata, sock):
+        self._call(self.loop.remove_writer, sock.fileno())
+
+    async def _misc_loop(self):
+        # keepalive pings, plus reconnect with backoff (this replaces both
+        # loop_forever's retry and the dashboard's reconnect thread)
+        delay = 1
+        while True:
+            if self.client.socket() is None:
+                try:
+                    # reconnect() is a blocking TCP connect (seconds when the
+                    # broker is down), so it runs off the loop; the socket it
+                    # opens comes back here through _call and is registered
+                    # before the loop reads or writes it
+                    await self.loop.run_in_executor(None, self.client.reconnect)
+                    log.info('Dashboard reconnected to broker')
+                    delay = 1
+                except OSError as e:
+                    log.warning('Reconnect failed: %s; retrying in %ss', e, delay)
+                    await asyncio.sleep(delay)
+                    delay = min(delay * 2, 60)
+                    continue
+            self.client.loop_misc()
+            await asyncio.sleep(1)
+
+
+class AsyncDashboardServer:
+    def __init__(self, app, hub, encoder, assets, host, port, snapshot=None, sock=None):
+        self.app = app
+        self.sock = sock
+        self.snapshot = snapshot
+        self.hub = hub
+        self.encoder = encoder
+        self.assets = assets
+        self.host = host
+        self.port = port
+        self._server = None
+
+    async def start(self):
+        if self.sock is not None:
+            # a listening socket shared with other worker processes
+            self._server = await asyncio.start_server(self._handle, sock=self.sock, backlog=4096)
+        else:
+            self._server = await asyncio.start_server(self._handle, self.host, self.port, backlog=4096)
+        return self
+
+    async def serve_forever(self):
+        async with self._server:
+            await self._server.serve_forever()
+
+    async def _handle(self, reader, writer):
+        try:
+            head = await asyncio.wait_for(reader.readuntil(b'\r\n\r\n'), 30)
+            request_line, *lines = head.decode('latin-1').rstrip('\r\n').split('\r\n')
+            method, target, _ = request_line.split(' ', 2)
+            headers = {}
+            for line in lines:
+                k, _, v = line.partition(':')
+                headers[k.strip().lower()] = v.strip()
+            path, _, query = target.partition('?')
+
+            if method == 'GET' and path in self.assets:
+                # the page and static files: precomputed bodies, no executor hop
+                version = urllib.parse.parse_qs(query).get('v', [None])[0]
+                status, resp_headers, body = self.assets.get(path).respond(
+                    headers.get('accept-encoding'), headers.get('if-none-match'), version)
+                await self._respond(writer, status, resp_headers, body)
+            elif method == 'GET' and path == '/stream':
+                await self._stream(writer, urllib.parse.parse_qs(query), headers)
+            else:
+                body = b''
+                if headers.get('content-length'):
+                    body = await reader.readexactly(int(headers['content-length']))
+                status, resp_headers, resp_body = await asyncio.get_running_loop().run_in_executor(
+                    None, self._call_wsgi, method, path, query, headers, body)
+                await self._respond(writer, status, resp_headers, resp_body)
+        except (asyncio.IncompleteReadError, asyncio.LimitOverrunError, asyncio.TimeoutError, ValueError):
+            pass
+        except ConnectionError:
+            pass
+        finally:
+            writer.close()
+
+    async def _respond(self, writer, status, headers, body):
+        out = [f"HTTP/1.1 {status}"]
+        out += [f"{k}: {v}" for k, v in headers if k.lower() not in ('content-length', 'connection')]
+        out += [f"Content-Length: {len(body)}", "Connection: close", "", ""]
+        writer.write('\r\n'.join(out).encode('latin-1') + body)
+        await writer.drain()
+
+    def _call_wsgi(self, method, path, query, headers, body):
+        environ = {
+            'REQUEST_METHOD': method,
+            'SCRIPT_NAME': '',
+            'PATH_INFO': urllib.parse.unquote(path),
+            'QUERY_STRING': query,
+            'SERVER_NAME': self.host,
+            'SERVER_PORT': str(self.port),
+            'SERVER_PROTOCOL': 'HTTP/1.1',
+            'CONTENT_TYPE': headers.get('content-type', ''),
+            'CONTENT_LENGTH': str(len(body)),
+            'wsgi.version': (1, 0),
+            'wsgi.url_scheme': 'http',
+            'wsgi.input': io.BytesIO(body),
+            'wsgi.errors': sys.stderr,
+            'wsgi.multithread': True,
+            'wsgi.multiprocess': False,
+            'wsgi.run_once': False,
+        }
+        for k, v in headers.items():
+            if k not in ('content-type', 'content-length'):
+                environ['HTTP_' + k.upper().replace('-', '_')] = v
+        result = {}
+
+        def start_response(status, response_headers, exc_info=None):
+            result['status'] = status
+            result['headers'] = response_headers
+
+        chunks = self.app(environ, start_response)
+        try:
+            body = b''.join(chunks)
+        finally:
+            if hasattr(chunks, 'close'):
+                chunks.close()
+        return result['status'], result['headers'], body
+
+    async def _stream(self, writer, query, headers):
+        cfg = self.app.config
+
+        def arg(name, default, type_):
+            try:
+                return type_(query[name][0]) if name in query else default
+            except ValueError:
+                return default
+
+        batch_ms = arg('batch_ms', cfg['SSE_BATCH_MS'], float)
+        batch_max = arg('batch_max', cfg['SSE_BATCH_MAX'], int)
+        collapse = arg('latest', '1' if cfg['SSE_COLLAPSE_LATEST'] else '0', str) == '1'
+        last_id = headers.get('last-event-id') or arg('last_id', None, str)
+        snapshot = self.snapshot if arg('snapshot', '1', str) == '1' else None
+        try:
+            filter = StreamFilter.parse(arg('topics', None, str), arg('events', None, str))
+        except ValueError as e:
+            await self._respond(writer, '400 BAD REQUEST', [('Content-Type', 'application/json')],
+                                json.dumps({'error': str(e)}).encode())
+            return
+
+        writer.write(b"HTTP/1.1 200 OK\r\nContent-Type: text/event-stream\r\n"
+                     b"Cache-Control: no-cache\r\nConnection: keep-alive\r\n\r\n")
+        sub = AsyncSubscriber(asyncio.get_running_loop(), self.hub.maxlen, self.hub.overflow, filter)
+        first = self.hub.join(sub, last_id, snapshot)
+        try:
+            if first:
+                writer.write(b''.join(self.encoder.frame(e, cache=False) for e in first))
+            await writer.drain()
+            while True:
+                if batch_ms > 0:
+                    batch = await sub.aget_batch(batch_max, batch_ms / 1000.0, timeout=15)
+                    if collapse:
+                        batch = collapse_latest(batch)
+                    item = batch or None
+                else:
+                    item = await sub.aget(timeout=15)
+                if item is None:
+                    writer.write(b": keepalive\n\n")
+                else:
+                    writer.write(self.encoder.frame(item))
+                    # flush whatever else is already buffered before yielding
+                    while batch_ms <= 0 and sub.lag:
+                        writer.write(self.encoder.frame(await sub.aget()))
+                # a slow client backs up here while its own buffer drops/coalesces
+                await writer.drain()
+        finally:
+            self.hub.unsubscribe(sub)
+
+
+def run_server(app, hub, encoder, assets, start_mqtt, host, port, snapshot=None, sock=None):
+    """Serve the dashboard from one asyncio loop.
+
+    start_mqtt(driver) must create the paho client, call driver(client)
+    before connecting, and not start paho's own network thread; a --workers
+    web process passes None, and an already listening sock instead of
+    host/port. snapshot() builds the first event for /stream clients with
+    nothing to resume. assets is the static_assets.AssetBundle with the page.
+    """
+
+    async def main():
+        loop = asyncio.get_running_loop()
+        if start_mqtt is not None:
+            start_mqtt(lambda client: AsyncioMqttLoop(loop, client))
+        server = await AsyncDashboardServer(app, hub, encoder, assets, host, port, snapshot, sock).start()
+        await server.serve_forever()
+
+    try:
+        asyncio.run(main())
+    except KeyboardInterrupt:
+        pass
@@ -1,8 +1,18 @@
 import argparse
+import atexit
+import functools
+import gc
 import json
-import queue
+import logging
+import os
+import signal
+import socket
+import subprocess
+import sys
 import threading
 import time
+import urllib.error
+import urllib.request
 import uuid
 import importlib
 import pkgutil
@@ -19,33 +29,166 @@ if not hasattr(pkgutil, 'get_loader'):
         return None
   pkgutil.get_loader = _get_loader
 
-from flask import Flask, Response, stream_with_context, render_template_string
+from flask import Flask, Response, request, stream_with_context, render_template_string
 import paho.mqtt.client as mqtt
+from werkzeug.serving import make_server
 
-app = Flask(__name__)
+from ack_aggregator import ACK_MODES, AckAggregator
+from aggregator import AggregateMirror, AggregationEngine
+from bounded_map import BoundedMap
+from event_relay import RelayClient, RelayServer, default_address, format_address, parse_address
+from history_store import DEFAULT_OPEN_SEGMENTS, HistoryStore
+from log_pipeline import HotPathLog, add_logging_args, setup_logging
+import metrics
+import payload_codec
+from static_assets import build_bundle
+from sse_hub import BroadcastHub, EventEncoder, OVERFLOW_POLICIES, StreamFilter, Subscriber, collapse_latest
+from topic_registry import TopicRegistry
+from tracing import Tracer, add_tracing_args
 
-event_q = queue.Queue()
-latest = {}
+# /static/ is served from the precompressed bundle below, not Flask's static folder
+app = Flask(__name__, static_folder=None)
+# SSE batching defaults; a client can override them per connection with
+# /stream?batch_ms=&batch_max=&latest=
+app.config.update(SSE_BATCH_MS=0, SSE_BATCH_MAX=200, SSE_COLLAPSE_LATEST=False)
 
-SENSOR_TOPICS = [
-    'home/livingroom/temperature',
-    'home/livingroom/humidity',
-    'home/entrance/motion',
-    'home/livingroom/light',
-    'home/entrance/door',
-]
+# every /stream client gets its own bounded buffer fed from this hub
+event_hub = BroadcastHub()
+# shared by all /stream clients so each event is json.dumps'd once
+event_encoder = EventEncoder(id_prefix=event_hub.epoch)
+# every sensor topic seen under SENSOR_TOPIC_FILTER, and sensor id -> topic
+topics = TopicRegistry()
+# sensors that publish binary readings get binary acks back
+binary_sensors = set()
+
+def forget_sensor(sensor_id, payload):
+  # a publisher restart brings new sensor ids; the old ones age out of
+  # latest and take their per-id state with them
+  topics.forget_sensor(sensor_id)
+  binary_sensors.discard(sensor_id)
+  stale_sensors.discard(sensor_id)
+
+# newest reading per sensor id; sent to each new /stream client as a snapshot.
+# Bounded by count and by time since the sensor last published (main() sets both)
+latest = BoundedMap(on_evict=forget_sensor)
+# binary readings carry a sensor index; publishers announce index -> id,
+# refreshed every ANNOUNCE_INTERVAL, so entries nobody announces any more expire
+sensor_names = BoundedMap()
+# and, for sensors reporting by exception, index -> heartbeat seconds
+sensor_heartbeats = BoundedMap()
+# sensor ids whose last reading is older than their staleness limit; the
+# sweeper adds them, their next reading takes them out
+stale_sensors = set()
+# a sensor that reports by exception is stale after this many heartbeats
+# without a reading; one without a heartbeat after stale_after seconds
+# (--stale-after, 0 = never)
+STALE_HEARTBEATS = 2
+stale_after = 30.0
+# numeric readings per topic; set up in main() unless --history-dir is empty
+history = None
+# acks back to the publisher; mode and window are set in main()
+acks = AckAggregator()
+# rolling 1m/5m/1h stats per topic, computed once here and pushed as deltas
+aggregates = AggregationEngine()
+# per-message log lines go through hot (sampled, counted); main() wires both
+# to a background queue writer
+log = logging.getLogger('dashboard')
+hot = HotPathLog(log)
+# sampled readings carry per-hop timestamps out to the page and back; main()
+# sets the rate and the trace file
+tracer = Tracer()
+
+# scraped at /metrics; counters and histograms are per-thread sharded so the
+# MQTT callback thread never waits on a lock to record
+registry = metrics.Registry()
+messages_total = registry.counter('dashboard_messages_total', 'MQTT messages received', ('topic',))
+malformed_total = registry.counter('dashboard_malformed_total', 'MQTT payloads that were not valid JSON', ('topic',))
+on_message_seconds = registry.histogram('dashboard_on_message_seconds', 'Time spent in the MQTT on_message callback')
+ingest_latency = registry.histogram('dashboard_ingest_latency_seconds', 'Reading ts to dashboard receipt (publisher and dashboard clocks)')
+unknown_sensor_total = registry.counter('dashboard_unknown_sensor_total', 'Binary readings from a sensor index not yet announced', ('topic',))
+index_conflicts_total = registry.counter('dashboard_sensor_index_conflicts_total', 'Announced sensor indices already held by another sensor id')
+history_failures = 0
+history_errors_total = registry.counter('dashboard_history_errors_total', 'Readings the history store failed to write', ('topic',))
+ack_roundtrip = registry.histogram('dashboard_ack_roundtrip_seconds', 'Ack ts to the ack coming back from the broker')
+# publish_to_receive and receive_to_enqueue for every reading, the rest for
+# traced ones; hops ending in the browser are reported through /trace/render.
+# With --workers, enqueue_to_sse_write is observed in the workers: see the trace file
+hop_seconds = registry.histogram('dashboard_hop_seconds', 'Per-hop latency of readings (see tracing.py)', ('hop',))
+
+def _subscriber_stats():
+  return event_hub.stats()['subscribers']
+
+registry.gauge('dashboard_sse_subscribers', 'Connected /stream clients', lambda: len(event_hub))
+registry.gauge('dashboard_sse_events_published', 'Events handed to the SSE hub', lambda: event_hub.published)
+registry.gauge('dashboard_sse_queue_depth', 'Events buffered across all /stream clients',
+               lambda: sum(s['lag'] for s in _subscriber_stats()))
+registry.gauge('dashboard_sse_subscriber_lag', 'Events buffered for one /stream client',
+               lambda: [((s['id'],), s['lag']) for s in _subscriber_stats()], ('subscriber',))
+registry.gauge('dashboard_sse_subscriber_dropped', 'Events dropped for one /stream client',
+               lambda: [((s['id'],), s['dropped']) for s in _subscriber_stats()], ('subscriber',))
+registry.gauge('dashboard_topics', 'Sensor topics discovered', lambda: len(topics))
+registry.gauge('dashboard_pending_publishes', 'Ack publishes waiting for on_publish',
+               lambda: len(acks.pending_publishes or ()))
+registry.gauge('dashboard_pending_publishes_expired', 'Ack publishes dropped without an on_publish',
+               lambda: acks.pending_expired)
+registry.gauge('dashboard_sensors_tracked', 'Sensor ids with a reading in the snapshot state', lambda: len(latest))
+registry.gauge('dashboard_sensors_stale', 'Sensor ids past their heartbeat without a reading', lambda: len(stale_sensors))
+registry.gauge('dashboard_sensors_evicted', 'Sensor ids evicted from the snapshot state',
+               lambda: [(('lru',), latest.evicted_lru), (('ttl',), latest.evicted_ttl)], ('reason',))
+
+# new rooms and sensor kinds show up on the page without code changes
+SENSOR_TOPIC_FILTER = 'home/#'
 
 def mqtt_on_connect(client, userdata, flags, rc):
-    print('Connected to broker, rc=', rc)
-    for t in SENSOR_TOPICS:
-        client.subscribe(t)
+    log.info('Connected to broker, rc= %s', rc)
+    client.subscribe(SENSOR_TOPIC_FILTER)
     client.subscribe('ack/#')
+    client.subscribe(payload_codec.ANNOUNCE_TOPIC)
 
 def mqtt_on_message(client, userdata, msg):
+  t0 = time.perf_counter()
   try:
-    payload = json.loads(msg.payload.decode())
+    handle_message(msg, time.time())
+  finally:
+    on_message_seconds.observe(time.perf_counter() - t0)
+
+def announce(entries):
+  conflicts = []
+  for entry in entries:
+    index, name = entry['index'], entry['sensor']
+    held = sensor_names.get(index)
+    if held is not None and held != name:
+      # two publishers drew the same index prefix: readings of the old
+      # sensor are credited to the new one from here on
+      conflicts.append((index, held, name))
+    sensor_names[index] = name
+    if entry.get('hb'):
+      sensor_heartbeats[index] = entry['hb']
+  if conflicts:
+    index_conflicts_total.inc(n=len(conflicts))
+    index, held, name = conflicts[0]
+    log.warning('Sensor index conflict: %d announced for %s, held by %s (%d indices remapped in this announcement)',
+                index, name, held, len(conflicts))
+
+def history_failed(topic, error):
+  global history_failures
+  history_failures += 1
+  history_errors_total.inc(topic)
+  # the first failure, then one line per thousand: a full disk fails every reading
+  if history_failures == 1 or history_failures % 1000 == 0:
+    log.warning('History append for %s failed: %s (%d failures so far)', topic, error, history_failures)
+
+def handle_message(msg, received=None):
+  messages_total.inc(msg.topic)
+  try:
+    # JSON or the compact binary layout, told apart by the first byte
+    payload = payload_codec.loads(msg.payload)
+    if msg.topic == payload_codec.ANNOUNCE_TOPIC:
+      announce(payload['sensors'])
+      return
   except Exception:
-    print('Malformed message on', msg.topic)
+    malformed_total.inc(msg.topic)
+    hot.malformed(msg.topic, 'Malformed message on %s', msg.topic)
     return
 
   # normalize primitive payloads (numbers/strings) into a dict so
@@ -54,40 +197,156 @@ def mqtt_on_message(client, userdata, msg):
     payload = {'value': payload}
   ts = int(time.time()*1000)
   topic = msg.topic
+  if 'index' in payload and payload_codec.is_binary(msg.payload):
+    name = sensor_names.get(payload['index'])
+    if name is None:
+      # shown on the stream, but not acked until the publisher announces it
+      unknown_sensor_total.inc(topic)
+    else:
+      payload['sensor'] = name
+      binary_sensors.add(name)
+      hb = sensor_heartbeats.get(payload['index'])
+      if hb:
+        payload['hb'] = hb
 
   if topic.startswith('ack/'):
-    event = {'direction': 'broker->publisher', 'topic': topic, 'payload': payload, 'ts': ts}
-    event_q.put(event)
-    print(f"[BROKER->PUBLISHER] {topic} -> {payload}")
+    if payload.get('from') == 'dashboard' and isinstance(payload.get('ts'), (int, float)):
+      ack_roundtrip.observe(max(0, ts - payload['ts']) / 1000.0)
+    event = {'direction': 'broker->publisher', 'topic': topic, 'payload': payload, 'ts': ts,
+             'sensor_topic': topics.topic_for_sensor(topic[4:])}
+    event_hub.publish(event)
+    hot.hot('ack', topic, "[BROKER->PUBLISHER] %s -> %s", topic, payload)
     return
 
-  event_q.put({'direction': 'publisher->broker', 'topic': topic, 'payload': payload, 'ts': ts})
-  print(f"[PUBLISH] {topic} -> {payload}")
-
-  event_q.put({'direction': 'broker->subscriber', 'topic': topic, 'payload': payload, 'ts': ts, 'subscriber': 'dashboard'})
-  print(f"[DELIVER] {topic} -> dashboard -> {payload}")
-
   sensor_id = payload.get('sensor')
   if sensor_id is not None:
+    # before the events go out: a client joining in between then finds the
+    # reading in its snapshot instead of missing it
     latest[sensor_id] = payload
+    # the page clears the mark itself when the reading arrives
+    stale_sensors.discard(sensor_id)
 
-    ack_topic = f"ack/{sensor_id}"
-    ack_msg = { 'origId': payload.get('id'), 'ts': int(time.time()*1000), 'from': 'dashboard' }
+  entry = topics.observe(topic, sensor_id)
+  if entry is not None:
+    # pushed before the reading so the page has a card to put it in
+    event_hub.publish({'type': 'topic', 'topic': topic, 'entry': entry, 'ts': ts})
 
+  reading = {'direction': 'publisher->broker', 'topic': topic, 'payload': payload, 'ts': ts}
+  if received is not None:
+    enqueued = time.time()
+    hop_seconds.observe(enqueued - received, 'receive_to_enqueue')
+    if isinstance(payload.get('ts'), (int, float)):
+      hop_seconds.observe(max(0, received - payload['ts'] / 1000.0), 'publish_to_receive')
+    if tracer.sampled(payload.get('id')):
+      trace = reading['trace'] = {'pub': payload.get('ts'), 'recv': round(received * 1000, 3),
+                                  'enq': round(enqueued * 1000, 3)}
+      tracer.open(payload['id'], trace)
+      tracer.record('ingest', payload['id'], topic=topic, **trace)
+  event_hub.publish(reading)
+  hot.hot('publish', topic, "[PUBLISH] %s -> %s", topic, payload)
+
+  event_hub.publish({'direction': 'broker->subscriber', 'topic': topic, 'payload': payload, 'ts': ts, 'subscriber': 'dashboard'})
+  hot.hot('deliver', topic, "[DELIVER] %s -> dashboard -> %s", topic, payload)
+  aggregates.add(topic, payload.get('value'), ts / 1000.0)
+
+  if sensor_id is not None:
+    if isinstance(payload.get('ts'), (int, float)):
+      ingest_latency.observe(max(0, ts - payload['ts']) / 1000.0)
+    if history is not None:
+      try:
+        history.append(topic, ts, payload.get('value'))
+      except OSError as e:
+        # a full disk or no descriptors left costs history, not ingestion
+        history_failed(topic, e)
+
+    # sent now (single) or folded into the next per-sensor batch (batch)
+    acks.add(sensor_id, payload.get('id'))
+
+def publish_ack(client, userdata, ack_topic, ack_msg):
+  if ack_topic[4:] in binary_sensors:
+    info = client.publish(ack_topic, payload_codec.encode_ack(ack_msg))
+  else:
     info = client.publish(ack_topic, json.dumps(ack_msg))
+  mid = None
+  try:
+    mid = info.mid
+  except Exception:
     mid = None
-    try:
-      mid = info.mid
-    except Exception:
-      mid = None
-    if mid is not None:
-      userdata['pending_publishes'][mid] = {'topic': ack_topic, 'payload': ack_msg, 'ts': int(time.time()*1000)}
+  entry = {'topic': ack_topic, 'payload': ack_msg, 'ts': int(time.time()*1000)}
+  early = False
+  if mid is not None:
+    # off the network thread, paho may confirm the publish before we get here
+    with userdata['pending_lock']:
+      early = userdata['early_publishes'].pop(mid, None) is not None
+      if not early:
+        userdata['pending_publishes'][mid] = entry
 
-    event_q.put({'direction': 'subscriber->broker', 'topic': ack_topic, 'payload': ack_msg, 'ts': int(time.time()*1000), 'publisher': 'dashboard'})
-    print(f"[ACK PUBLISH] {ack_topic} -> {ack_msg}")
+  event_hub.publish({'direction': 'subscriber->broker', 'topic': ack_topic, 'payload': ack_msg, 'ts': int(time.time()*1000), 'publisher': 'dashboard',
+                     'sensor_topic': topics.topic_for_sensor(ack_topic[4:])})
+  hot.hot('ack_publish', ack_topic, "[ACK PUBLISH] %s -> %s", ack_topic, ack_msg)
+  if early:
+    publish_accepted(mid, entry)
+  now = time.time() * 1000
+  for orig_id in ack_msg.get('origIds') or (ack_msg.get('origId'),):
+    trace = tracer.close(orig_id) if tracer.sampled(orig_id) else None
+    if trace is not None:
+      hop_seconds.observe(max(0, now - trace['recv']) / 1000.0, 'receive_to_ack_publish')
+      tracer.record('ack_pub', orig_id, t=round(now, 3))
 
-def start_mqtt(broker, port):
-    userdata = {'pending_publishes': {}}
+def trace_sse_write(item):
+  """EventEncoder hook: stamp a traced reading on its first /stream write."""
+  trace = item.get('trace')
+  if trace is None or 'sse' in trace:
+    return
+  now = time.time() * 1000
+  trace['sse'] = round(now, 3)
+  hop_seconds.observe(max(0, now - trace['enq']) / 1000.0, 'enqueue_to_sse_write')
+  tracer.record('sse', item['payload'].get('id'), t=trace['sse'])
+
+event_encoder.on_encode = trace_sse_write
+
+def stale_limit(payload):
+  hb = payload.get('hb')
+  if isinstance(hb, (int, float)) and hb > 0:
+    return hb * STALE_HEARTBEATS
+  return stale_after
+
+def sweep_stale():
+  """Mark sensors whose last reading is past their limit; one 'stale' event each."""
+  now = int(time.time() * 1000)
+  marked = 0
+  for sensor_id, payload, age in latest.ages():
+    limit = stale_limit(payload)
+    if not limit or age <= limit or sensor_id in stale_sensors:
+      continue
+    topic = topics.topic_for_sensor(sensor_id)
+    # a reading that came in since the snapshot replaced the payload
+    if topic is None or latest.get(sensor_id) is not payload:
+      continue
+    stale_sensors.add(sensor_id)
+    marked += 1
+    event_hub.publish({'type': 'stale', 'topic': topic, 'sensor': sensor_id, 'since': payload.get('ts'), 'ts': now})
+  return marked
+
+def start_stale_sweeper(interval=5.0):
+  def _run():
+    while True:
+      time.sleep(interval)
+      try:
+        sweep_stale()
+      except Exception:
+        log.exception('Staleness sweep failed')
+  threading.Thread(target=_run, daemon=True).start()
+
+def publish_accepted(mid, info):
+  event_hub.publish({'direction': 'broker->subscriber', 'topic': info['topic'], 'payload': info['payload'], 'ts': int(time.time()*1000), 'note': 'broker accepted publish',
+                     'sensor_topic': topics.topic_for_sensor(info['topic'][4:])})
+  hot.hot('ack_accepted', info['topic'], "[BROKER ACCEPTED PUBLISH mid=%s] topic=%s payload=%s", mid, info['topic'], info['payload'])
+
+def start_mqtt(broker, port, driver=None):
+    # driver(client) may take over the network loop (see dashboard_async);
+    # by default paho's loop_forever runs in a daemon thread
+    userdata = {'pending_publishes': {}, 'early_publishes': {}, 'pending_lock': threading.Lock()}
     client = mqtt.Client(client_id=f"dashboard-{uuid.uuid4()}", userdata=userdata)
     client.user_data_set(userdata)
     client.on_connect = mqtt_on_connect
@@ -96,19 +355,22 @@ def start_mqtt(broker, port):
     # handle disconnects with background reconnect attempts
     def on_disconnect(c, u, rc):
         if rc == 0:
-            print('Dashboard disconnected cleanly')
+            log.info('Dashboard disconnected cleanly')
+            return
+        log.warning('Unexpected dashboard disconnect (rc=%s), attempting reconnect...', rc)
+        if driver is not None:
+            # the driver owns the network loop, reconnects included
             return
-        print(f'Unexpected dashboard disconnect (rc={rc}), attempting reconnect...')
 
         def _reconnect_loop():
             delay = 1
             while True:
                 try:
                     c.reconnect()
-                    print('Dashboard reconnected to broker')
+                    log.info('Dashboard reconnected to broker')
                     break
                 except Exception as e:
-                    print(f'Reconnect failed: {e}; retrying in {delay}s')
+                    log.warning('Reconnect failed: %s; retrying in %ss', e, delay)
                     time.sleep(delay)
                     delay = min(delay * 2, 60)
 
@@ -118,35 +380,289 @@ def start_mqtt(broker, port):
     client.reconnect_delay_set(min_delay=1, max_delay=60)
 
     def on_publish(c, u, mid):
-        info = u['pending_publishes'].pop(mid, None)
+        with u['pending_lock']:
+            info = u['pending_publishes'].pop(mid, None)
+            if info is None:
+                u['early_publishes'][mid] = int(time.time() * 1000)
         if info:
-            event_q.put({'direction': 'broker->subscriber', 'topic': info['topic'], 'payload': info['payload'], 'ts': int(time.time()*1000), 'note': 'broker accepted publish'})
-            print(f"[BROKER ACCEPTED PUBLISH mid={mid}] topic={info['topic']} payload={info['payload']}")
+            publish_accepted(mid, info)
 
     client.on_publish = on_publish
+    acks.start(functools.partial(publish_ack, client, userdata), userdata['pending_publishes'],
+               userdata['early_publishes'])
+
+    if driver is not None:
+        driver(client)
 
     try:
         client.connect(broker, port, keepalive=60)
     except Exception as e:
-        print(f"Initial dashboard connect failed: {e}; background reconnect will be attempted")
+        log.warning("Initial dashboard connect failed: %s; background reconnect will be attempted", e)
 
-    t = threading.Thread(target=client.loop_forever, daemon=True)
-    t.start()
+    if driver is None:
+        t = threading.Thread(target=client.loop_forever, daemon=True)
+        t.start()
     return client
 
+# answered by the ingest process in --workers mode; workers forward them there
+INGEST_ROUTES = ('/history', '/ack/stats', '/metrics', '/trace/render')
+
+@app.before_request
+def forward_to_ingest():
+  ingest = app.config.get('INGEST_URL')
+  if ingest is None or request.path not in INGEST_ROUTES:
+    return None
+  forward = urllib.request.Request(ingest + request.full_path, method=request.method)
+  if request.method == 'POST':
+    forward.data = request.get_data()
+    forward.add_header('Content-Type', request.content_type or 'application/octet-stream')
+  try:
+    with urllib.request.urlopen(forward, timeout=10) as resp:
+      return Response(resp.read(), status=resp.status, content_type=resp.headers.get('Content-Type'))
+  except urllib.error.HTTPError as e:
+    return Response(e.read(), status=e.code, content_type=e.headers.get('Content-Type'))
+  except OSError as e:
+    return {'error': f'ingest process unavailable: {e}'}, 502
+
+# the page rendered once, Chart.js and the standalone template, with their
+# gzip/brotli bodies and ETags; built on first use (main() does it at startup)
+assets = None
+
+def page_assets():
+    global assets
+    if assets is None:
+        with app.app_context():
+            assets = build_bundle(render_template_string(DASHBOARD_HTML))
+    return assets
+
+def serve_asset(path):
+    asset = page_assets().get(path)
+    if asset is None:
+        return {'error': 'not found'}, 404
+    status, headers, body = asset.respond(request.headers.get('Accept-Encoding'), request.headers.get('If-None-Match'),
+                                          request.args.get('v'))
+    return Response(body, status=status, headers=headers)
+
 @app.route('/')
 def index():
-    return render_template_string(DASHBOARD_HTML)
+    return serve_asset('/')
+
+@app.route('/static/<path:name>')
+def static_asset(name):
+    return serve_asset('/static/' + name)
+
+def stream_snapshot():
+    """First event for a client with nothing to resume: every known topic and
+    the newest reading per sensor, so cards render without waiting."""
+    readings = []
+    for sensor_id, payload in latest.items():
+        topic = topics.topic_for_sensor(sensor_id)
+        if topic is not None:
+            reading = {'topic': topic, 'payload': payload}
+            if sensor_id in stale_sensors:
+                reading['stale'] = True
+            readings.append(reading)
+    return {'type': 'snapshot', 'topics': topics.snapshot(), 'latest': readings,
+            'aggregates': aggregates.summaries(), 'ts': int(time.time() * 1000)}
+
+def mirror_init(epoch, seq, snapshot):
+  """Worker: start over from the ingest process's state as of seq."""
+  event_hub.resync(epoch, seq)
+  event_encoder.id_prefix = epoch
+  topics.clear()
+  latest.clear()
+  stale_sensors.clear()
+  for entry in snapshot['topics']:
+    topics.add(entry)
+  for reading in snapshot['latest']:
+    sensor_id = reading['payload']['sensor']
+    latest[sensor_id] = reading['payload']
+    topics.observe(reading['topic'], sensor_id)
+    if reading.get('stale'):
+      stale_sensors.add(sensor_id)
+  aggregates.reset(snapshot['aggregates'])
+
+def mirror_batch(events):
+  """Worker: keep snapshot state current, then hand the events to this hub."""
+  for item in events:
+    kind = item.get('type')
+    if kind == 'topic':
+      topics.add(item['entry'])
+    elif kind == 'aggregates':
+      aggregates.apply(item['stats'])
+    elif kind == 'stale':
+      if item['sensor'] in latest:
+        stale_sensors.add(item['sensor'])
+    elif item.get('direction') == 'publisher->broker':
+      sensor_id = item['payload'].get('sensor')
+      if sensor_id is not None:
+        latest[sensor_id] = item['payload']
+        topics.observe(item['topic'], sensor_id)
+        stale_sensors.discard(sensor_id)
+  event_hub.relay(events)
 
 @app.route('/stream')
 def stream():
+    batch_ms = request.args.get('batch_ms', app.config['SSE_BATCH_MS'], type=float)
+    batch_max = request.args.get('batch_max', app.config['SSE_BATCH_MAX'], type=int)
+    collapse = request.args.get('latest', '1' if app.config['SSE_COLLAPSE_LATEST'] else '0') == '1'
+    # EventSource resends the last id it saw when it reconnects
+    last_id = request.headers.get('Last-Event-ID') or request.args.get('last_id')
+    snapshot = stream_snapshot if request.args.get('snapshot', '1') == '1' else None
+    # ?topics=home/livingroom/+,home/kitchen/#&events=publish,ack narrows what this client gets
+    try:
+        filter = StreamFilter.parse(request.args.get('topics'), request.args.get('events'))
+    except ValueError as e:
+        return {'error': str(e)}, 400
+    sub = Subscriber(event_hub.maxlen, event_hub.overflow, filter)
+    first = event_hub.join(sub, last_id, snapshot)
+
     def event_stream():
-        while True:
-            item = event_q.get()
-            data = json.dumps(item)
-            yield f"data: {data}\n\n"
+        try:
+            if first:
+                # replayed delta or snapshot, in one write
+                yield b''.join(event_encoder.frame(e, cache=False) for e in first)
+            while True:
+                if batch_ms > 0:
+                    # one frame carrying a JSON array of every event in the window
+                    batch = sub.get_batch(batch_max, batch_ms / 1000.0, timeout=15)
+                    if collapse:
+                        batch = collapse_latest(batch)
+                    item = batch or None
+                else:
+                    item = sub.get(timeout=15)
+                if item is None:
+                    # comment line keeps proxies from closing an idle stream
+                    yield ": keepalive\n\n"
+                    continue
+                yield event_encoder.frame(item)
+        finally:
+            event_hub.unsubscribe(sub)
     return Response(stream_with_context(event_stream()), mimetype='text/event-stream')
 
+@app.route('/history')
+def history_query():
+    topic = request.args.get('topic')
+    if not topic:
+        return {'error': 'topic is required'}, 400
+    now = int(time.time() * 1000)
+    t1 = request.args.get('to', now, type=int)
+    t0 = request.args.get('from', t1 - 3600 * 1000, type=int)
+    max_points = max(3, min(request.args.get('max_points', 500, type=int), 10000))
+    mode = request.args.get('mode', 'minmax')
+    if mode not in ('minmax', 'lttb'):
+        return {'error': 'mode must be minmax or lttb'}, 400
+    if history is None:
+        return {'topic': topic, 'from': t0, 'to': t1, 'kind': 'raw', 'points': []}
+    kind, points = history.query(topic, t0, t1, max_points, mode)
+    return {'topic': topic, 'from': t0, 'to': t1, 'kind': kind, 'points': points}
+
+@app.route('/topics')
+def topics_list():
+    try:
+        filter = StreamFilter.parse(request.args.get('topics'))
+    except ValueError as e:
+        return {'error': str(e)}, 400
+    entries = topics.snapshot()
+    if filter is not None:
+        entries = [e for e in entries if filter.matches(e['topic'])]
+    return {'topics': entries}
+
+@app.route('/aggregates')
+def aggregates_list():
+    return {'stats': aggregates.summaries(), 'engine': aggregates.stats()}
+
+@app.route('/stream/stats')
+def stream_stats():
+    return event_hub.stats()
+
+@app.route('/ack/stats')
+def ack_stats():
+    return acks.stats()
+
+@app.route('/metrics')
+def metrics_endpoint():
+    return Response(registry.render(), content_type=metrics.CONTENT_TYPE)
+
+@app.route('/trace/render', methods=['POST'])
+def trace_render():
+    """The page's hops for traced readings: [{id, trace, arrive, render}, ...],
+    browser times in ms since the epoch."""
+    reports = request.get_json(silent=True)
+    if not isinstance(reports, list):
+        return {'error': 'expected a JSON array of reports'}, 400
+    accepted = 0
+    for r in reports[:1000]:
+        try:
+            trace, arrive, render = r['trace'], float(r['arrive']), float(r['render'])
+        except (TypeError, KeyError, ValueError):
+            continue
+        if not isinstance(trace, dict):
+            continue
+        if isinstance(trace.get('sse'), (int, float)):
+            hop_seconds.observe(max(0, arrive - trace['sse']) / 1000.0, 'sse_write_to_arrive')
+        hop_seconds.observe(max(0, render - arrive) / 1000.0, 'arrive_to_render')
+        if isinstance(trace.get('pub'), (int, float)):
+            hop_seconds.observe(max(0, render - trace['pub']) / 1000.0, 'publish_to_render')
+        tracer.record('render', r.get('id'), arrive=arrive, render=render)
+        accepted += 1
+    return {'accepted': accepted}
+
+@app.route('/trace/stats')
+def trace_stats():
+    return tracer.stats()
+
+def process_memory():
+    """(current, peak) resident set size of this process in bytes."""
+    import resource
+    peak = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+    # kilobytes on Linux, bytes on macOS
+    peak *= 1 if sys.platform == 'darwin' else 1024
+    try:
+        with open('/proc/self/statm') as f:
+            return int(f.read().split()[1]) * os.sysconf('SC_PAGE_SIZE'), peak
+    except OSError:
+        return None, peak
+
+@app.route('/debug/memory')
+def debug_memory():
+    """Size and bound of every structure that grows with sensors, clients or load."""
+    rss, peak = process_memory()
+    hub = event_hub.stats()
+    queue_handler = next((h for h in log.handlers if hasattr(h, 'dropped')), None)
+    return {
+        'pid': os.getpid(),
+        'rss_bytes': rss,
+        'rss_peak_bytes': peak,
+        'gc_objects': len(gc.get_objects()),
+        'latest': latest.stats(),
+        'sensor_names': sensor_names.stats(),
+        'sensor_topics': {'size': topics.sensors, 'bound': 'latest'},
+        'binary_sensors': {'size': len(binary_sensors), 'bound': 'latest'},
+        'sensor_heartbeats': sensor_heartbeats.stats(),
+        'stale_sensors': {'size': len(stale_sensors), 'bound': 'latest'},
+        'topics': {'size': len(topics)},
+        'pending_publishes': {'size': len(acks.pending_publishes or ()), 'ttl_s': acks.pending_ttl,
+                              'expired': acks.pending_expired},
+        'early_publishes': {'size': len(acks.early_publishes or ()), 'ttl_s': acks.pending_ttl,
+                            'expired': acks.early_expired},
+        'sse_subscribers': {'count': len(hub['subscribers']), 'maxlen': event_hub.maxlen,
+                            'overflow': event_hub.overflow, 'buffered': sum(s['lag'] for s in hub['subscribers']),
+                            'dropped': sum(s['dropped'] for s in hub['subscribers'])},
+        'sse_replay': {'size': hub['replay_log'], 'maxlen': hub['replay_max']},
+        'event_encoder_cache': {'size': len(event_encoder), 'maxlen': event_encoder.size},
+        'log_queue': {'size': queue_handler.queue.qsize(), 'maxsize': queue_handler.queue.maxsize,
+                      'dropped': queue_handler.dropped} if queue_handler is not None else None,
+        'trace': tracer.stats(),
+        # one per live thread that has recorded a metric; exited threads are folded in
+        'metric_shards': {'size': registry.shard_count(), 'threads': threading.active_count()},
+        'static_assets': assets.stats() if assets is not None else None,
+        'aggregates': {'topics': len(aggregates.summaries())},
+        'history': {'topics': len(history.topics()), 'open_segments': len(history.segments),
+                    'max_open_segments': history.segments.max_open,
+                    'segments_unmapped': history.segments.unmapped} if history is not None else None,
+    }
+
 # HTML Template with embedded CSS and JavaScript
 DASHBOARD_HTML = '''<!doctype html>
 <html>
@@ -154,7 +670,7 @@ DASHBOARD_HTML = '''<!doctype html>
   <meta charset="utf-8"/>
   <meta name="viewport" content="width=device-width,initial-scale=1"/>
   <title>MQTT Smart Home Dashboard</title>
-  <script src="https://cdn.jsdelivr.net/npm/chart.js@4.4.1/dist/chart.umd.min.js"></script>
+  <script src="https://cdn.jsdelivr.net/npm/chart.js@4.5.1/dist/chart.umd.min.js"></script>
   <style>
     *{box-sizing:border-box;margin:0;padding:0}
     html{background:linear-gradient(135deg,#667eea 0%,#764ba2 100%);min-height:100vh}
@@ -166,6 +682,8 @@ DASHBOARD_HTML = '''<!doctype html>
     .sensors-grid{display:grid;grid-template-columns:repeat(auto-fit,minmax(320px,1fr));gap:20px;animation:fadeIn 1s}
     .card{background:rgba(255,255,255,.95);backdrop-filter:blur(10px);padding:24px;border-radius:16px;border:1px solid rgba(255,255,255,.3);box-shadow:0 8px 32px rgba(0,0,0,.1);transition:all .3s;animation:slideUp .6s}
     .card:hover{transform:translateY(-5px);box-shadow:0 12px 40px rgba(0,0,0,.15)}
+    .card:empty{min-height:290px}
+    .agg{font-size:11px;color:#6b7280;margin:-8px 0 8px;min-height:14px}
     .card-header{display:flex;justify-content:space-between;align-items:center;margin-bottom:16px}
     .card-header h3{margin:0;font-size:16px;color:#1f2937;font-weight:600;display:flex;align-items:center;gap:8px}
     .unit-badge{background:linear-gradient(135deg,#667eea 0%,#764ba2 100%);color:#fff;font-size:11px;padding:4px 12px;border-radius:12px;font-weight:600;box-shadow:0 2px 8px rgba(102,126,234,.3)}
@@ -175,6 +693,8 @@ DASHBOARD_HTML = '''<!doctype html>
     .small{font-size:12px;color:#9ca3af;margin-bottom:16px;display:flex;align-items:center;gap:4px}
     .status-indicator{width:8px;height:8px;border-radius:50%;background:#10b981;animation:pulse 2s infinite}
     @keyframes pulse{0%,100%{opacity:1}50%{opacity:.5}}
+    .card.stale{opacity:.6}
+    .card.stale .status-indicator{background:#9ca3af;animation:none}
     .chart-container{position:relative;height:120px;width:100%;margin-top:12px;cursor:pointer;padding:4px;border-radius:8px;transition:background .2s}
     .chart-container:hover{background:rgba(102,126,234,.05)}
     .chart-zoom-hint{text-align:center;font-size:10px;color:#9ca3af;margin-top:4px}
@@ -207,6 +727,7 @@ DASHBOARD_HTML = '''<!doctype html>
     .modal-content{background:#fff;padding:30px;border-radius:16px;width:90%;max-width:1200px;max-height:85vh;overflow:auto;animation:scaleIn .3s;box-shadow:0 20px 60px rgba(0,0,0,.3)}
     .modal-header{display:flex;justify-content:space-between;align-items:center;margin-bottom:20px}
     .modal-header h2{color:#1f2937;font-size:24px;display:flex;align-items:center;gap:10px}
+    .range-select{margin-left:auto;margin-right:12px;padding:8px 12px;border:1px solid #e5e7eb;border-radius:8px;font-size:13px;color:#374151;background:#fff;cursor:pointer}
     .close-btn{background:#ef4444;color:#fff;border:none;padding:10px 20px;border-radius:8px;cursor:pointer;font-weight:600;transition:all .2s}
     .close-btn:hover{background:#dc2626;transform:scale(1.05)}
     .modal-chart-container{height:550px;position:relative}
@@ -240,6 +761,7 @@ DASHBOARD_HTML = '''<!doctype html>
     <div class="modal-content">
       <div class="modal-header">
         <h2 id="modalTitle">📈 Chart Detail</h2>
+        <select id="modalRange" class="range-select" onchange="loadHistory()"><option value="0">Live</option><option value="3600000" selected>Last hour</option><option value="86400000">Last 24 h</option><option value="604800000">Last 7 days</option></select>
         <button class="close-btn" onclick="closeModal()">✕ Close</button>
       </div>
       <div class="modal-chart-container">
@@ -248,75 +770,158 @@ DASHBOARD_HTML = '''<!doctype html>
     </div>
   </div>
   <script>
-    const MAX_POINTS=30;
-    const sensorConfig={'home/livingroom/temperature':{label:'Temperature',location:'Livingroom',unit:'°C',color:'#ef4444',min:15,max:35,icon:'🌡️'},'home/livingroom/humidity':{label:'Humidity',location:'Livingroom',unit:'%',color:'#3b82f6',min:0,max:100,icon:'💧'},'home/entrance/motion':{label:'Motion Sensor',location:'Entrance',unit:'',color:'#8b5cf6',min:0,max:1,icon:'👁️'},'home/livingroom/light':{label:'Light Level',location:'Livingroom',unit:'lux',color:'#f59e0b',min:0,max:1200,icon:'💡'},'home/entrance/door':{label:'Door Sensor',location:'Entrance',unit:'',color:'#10b981',min:0,max:1,icon:'🚪'}};
-    const cards={},charts={},sensorLogs={};
-    let modalChart=null;
+    const MAX_POINTS=30,MAX_LOG=50;
+    // filled from /topics and from 'topic' events on the stream; nothing is hard-coded per sensor
+    const topicConfig={},cards={},sensorLogs={};
+    let modalChart=null,modalTopic=null,activeTab=null,refreshing=false,firstRender=null;
     const cardsEl=document.getElementById('cards'),tabsEl=document.getElementById('tabs'),logContentsEl=document.getElementById('log-contents');
-    for(let topic in sensorConfig){
-      const cfg=sensorConfig[topic],id=topic.replace(/\\//g,'-'),card=document.createElement('div');
-      card.className='card';card.id='card-'+id;
-      card.innerHTML=`<div class="card-header"><h3><span class="sensor-icon">${cfg.icon}</span>${cfg.label}</h3><span class="unit-badge">${cfg.location}</span></div><div class="value-row"><span class="value" id="v-${id}">—</span><span class="unit">${cfg.unit}</span></div><div class="small"><span class="status-indicator"></span><span id="m-${id}">Waiting for data...</span></div><div class="chart-container" onclick="openModal('${topic}')"><canvas id="chart-${id}"></canvas><div class="chart-zoom-hint">🔍 Click to enlarge</div></div>`;
+    logContentsEl.innerHTML=`<div class="log-content active"><div class="log-table-wrapper"><table class="log-table"><thead><tr><th style="width:80px">Time</th><th style="width:100px">Direction</th><th style="width:80px">Topic</th><th style="width:70px">Value</th><th>Payload</th></tr></thead><tbody id="log-tbody"></tbody></table></div></div>`;
+    const logTbody=document.getElementById('log-tbody');
+    const topicId=topic=>topic.replace(/\\//g,'-');
+    // cards start as empty placeholders; only those near the viewport get their DOM and a Chart
+    const cardObserver=new IntersectionObserver(entries=>{for(const e of entries){if(e.isIntersecting)mountCard(e.target.dataset.topic);else unmountCard(e.target.dataset.topic)}},{rootMargin:'300px'});
+    function addTopic(entry){
+      const topic=entry.topic;
+      if(topicConfig[topic])return;
+      const cfg=topicConfig[topic]=entry.config,id=topicId(topic),card=document.createElement('div');
+      card.className='card';card.id='card-'+id;card.dataset.topic=topic;
       cardsEl.appendChild(card);
-      cards[topic]={v:document.getElementById('v-'+id),m:document.getElementById('m-'+id),data:[]};
-      const ctx=document.getElementById('chart-'+id).getContext('2d');
-      charts[topic]=new Chart(ctx,{type:'line',data:{labels:[],datasets:[{data:[],borderColor:cfg.color,backgroundColor:cfg.color+'30',borderWidth:3,fill:!0,tension:.4,pointRadius:3,pointHoverRadius:6,pointBackgroundColor:cfg.color,pointBorderColor:'#fff',pointBorderWidth:2}]},options:{responsive:!0,maintainAspectRatio:!1,animation:{duration:300},plugins:{legend:{display:!1},tooltip:{backgroundColor:'rgba(0,0,0,0.8)',titleColor:'#fff',bodyColor:'#fff',padding:12,displayColors:!1,callbacks:{label:c=>`Value: ${c.parsed.y} ${cfg.unit}`}}},scales:{x:{display:!1},y:{display:!0,min:cfg.min,max:cfg.max,grid:{color:'rgba(0,0,0,0.05)'},ticks:{font:{size:11,weight:'500'},color:'#6b7280',maxTicksLimit:5}}}}});
+      cards[topic]={el:card,v:null,m:null,a:null,chart:null,last:null,agg:null,data:[],stale:!1,hold:!1};
+      cardObserver.observe(card);
       const tab=document.createElement('button');
-      tab.className='tab';tab.id='tab-'+id;tab.textContent=cfg.icon+' '+cfg.label;tab.onclick=()=>switchTab(id);
+      tab.className='tab';tab.id='tab-'+id;tab.textContent=`${cfg.icon} ${cfg.label} (${cfg.location})`;tab.onclick=()=>switchTab(topic);
       tabsEl.appendChild(tab);
-      const logContent=document.createElement('div');
-      logContent.className='log-content';logContent.id='log-'+id;
-      logContent.innerHTML=`<div class="log-table-wrapper"><table class="log-table"><thead><tr><th style="width:80px">Time</th><th style="width:100px">Direction</th><th style="width:80px">Topic</th><th style="width:70px">Value</th><th>Payload</th></tr></thead><tbody id="tbody-${id}"></tbody></table></div>`;
-      logContentsEl.appendChild(logContent);
-      sensorLogs[topic]={tbody:document.getElementById('tbody-'+id),events:[]};
+      sensorLogs[topic]={events:[]};
+      if(!activeTab)switchTab(topic);
+    }
+    // topics, labels and payloads come from whoever can publish under home/#: text nodes only, never markup
+    function el(tag,cls,text){const e=document.createElement(tag);if(cls)e.className=cls;if(text!==undefined)e.textContent=text;return e}
+    function mountCard(topic){
+      const card=cards[topic],cfg=topicConfig[topic];
+      if(card.chart)return;
+      const header=el('div','card-header'),title=el('h3'),valueRow=el('div','value-row'),small=el('div','small'),chartBox=el('div','chart-container'),canvas=el('canvas');
+      title.append(el('span','sensor-icon',cfg.icon),cfg.label);header.append(title,el('span','unit-badge',cfg.location));
+      card.v=el('span','value','—');valueRow.append(card.v,el('span','unit',cfg.unit));
+      card.m=el('span','','Waiting for data...');small.append(el('span','status-indicator'),card.m);
+      card.a=el('div','agg');
+      chartBox.append(canvas,el('div','chart-zoom-hint','🔍 Click to enlarge'));chartBox.addEventListener('click',()=>openModal(topic));
+      card.el.replaceChildren(header,valueRow,small,card.a,chartBox);
+      const ctx=canvas.getContext('2d');
+      card.chart=new Chart(ctx,{type:'line',data:{labels:[],datasets:[{data:[],borderColor:cfg.color,backgroundColor:cfg.color+'30',borderWidth:3,fill:!0,tension:.4,stepped:card.hold?'after':!1,pointRadius:3,pointHoverRadius:6,pointBackgroundColor:cfg.color,pointBorderColor:'#fff',pointBorderWidth:2}]},options:{responsive:!0,maintainAspectRatio:!1,animation:{duration:300},plugins:{legend:{display:!1},tooltip:{backgroundColor:'rgba(0,0,0,0.8)',titleColor:'#fff',bodyColor:'#fff',padding:12,displayColors:!1,callbacks:{label:c=>`Value: ${c.parsed.y} ${cfg.unit}`}}},scales:{x:{display:!1},y:{display:!0,min:cfg.min??undefined,max:cfg.max??undefined,grid:{color:'rgba(0,0,0,0.05)'},ticks:{font:{size:11,weight:'500'},color:'#6b7280',maxTicksLimit:5}}}}});
+      renderCard(topic);
+    }
+    function unmountCard(topic){const card=cards[topic];if(!card.chart)return;card.chart.destroy();card.chart=card.v=card.m=card.a=null;card.el.innerHTML=''}
+    // full redraw, only when a card is mounted; live updates go through updateChart
+    function renderCard(topic){
+      const card=cards[topic];
+      if(!card.chart)return;
+      renderValue(topic);renderAgg(topic);
+      card.chart.data.labels=card.data.map(d=>d.t);card.chart.data.datasets[0].data=card.data.map(d=>d.v);card.chart.update('none');
+    }
+    function renderValue(topic){const card=cards[topic],payload=card.last;if(!card.v||!payload)return;card.v.textContent=formatValue(payload.value,topicConfig[topic]);card.m.textContent=`${card.stale?'Stale, last':'Last'}: ${new Date(payload.ts).toLocaleTimeString()} • ID: ${payload.id ? payload.id.substr(0,8) : 'N/A'}`}
+    // past its heartbeat (server-side sweep) until the next reading: dimmed, value held
+    function markStale(topic,stale){const card=cards[topic];if(!card||card.stale===stale)return;card.stale=stale;card.el.classList.toggle('stale',stale);renderValue(topic)}
+    function renderAgg(topic){
+      const card=cards[topic],agg=card.agg,cfg=topicConfig[topic];
+      if(!card.a||!agg)return;
+      const num=v=>typeof v==='number'?v.toFixed(1):'—',w=name=>agg[name]||{};
+      // aggregates are computed server-side over rolling 1m/5m/1h windows
+      if(cfg.unit==='')card.a.textContent=`events 1m ${w('1m').events||0} · 5m ${w('5m').events||0} · 1h ${w('1h').events||0}`;
+      else card.a.textContent=`1m avg ${num(w('1m').mean)} (${num(w('1m').min)}–${num(w('1m').max)}) · 1h avg ${num(w('1h').mean)} · ${(w('1m').rate||0).toFixed(2)}/s`;
+    }
+    function setAggregates(stats){for(const topic in stats){const card=cards[topic];if(!card)continue;card.agg=stats[topic];renderAgg(topic)}}
+    function refreshTopics(){if(refreshing)return;refreshing=true;return fetch('/topics'+location.search).then(r=>r.json()).then(t=>t.topics.forEach(addTopic)).catch(e=>console.warn('topic list failed',e)).finally(()=>{refreshing=false})}
+    function switchTab(topic){
+      if(activeTab)document.getElementById('tab-'+topicId(activeTab)).classList.remove('active');
+      activeTab=topic;document.getElementById('tab-'+topicId(topic)).classList.add('active');
+      logTbody.replaceChildren(...sensorLogs[topic].events.map(item=>eventRow(topic,item)));
     }
-    if(tabsEl.firstChild){tabsEl.firstChild.classList.add('active');logContentsEl.firstChild.classList.add('active')}
-    function switchTab(id){document.querySelectorAll('.tab').forEach(t=>t.classList.remove('active'));document.querySelectorAll('.log-content').forEach(c=>c.classList.remove('active'));document.getElementById('tab-'+id).classList.add('active');document.getElementById('log-'+id).classList.add('active')}
-    function updateChart(topic,value,timestamp){const chart=charts[topic],card=cards[topic];if(!chart||!card)return;const timeLabel=new Date(timestamp).toLocaleTimeString();card.data.push({t:timeLabel,v:value});if(card.data.length>MAX_POINTS)card.data.shift();chart.data.labels=card.data.map(d=>d.t);chart.data.datasets[0].data=card.data.map(d=>d.v);chart.update('none')}
+    function updateChart(topic,value,timestamp){const card=cards[topic];if(!card)return;const t=new Date(timestamp).toLocaleTimeString();card.data.push({t,v:value});if(card.data.length>MAX_POINTS)card.data.shift();renderValue(topic);const chart=card.chart;if(!chart)return;const labels=chart.data.labels,data=chart.data.datasets[0].data;labels.push(t);data.push(value);if(labels.length>MAX_POINTS){labels.shift();data.shift()}chart.update('none')}
     function formatValue(value,cfg){if(cfg.unit==='')return value===1||value==='active'||value==='motion'||value==='open'?'Active':'Inactive';else if(typeof value==='number')return value.toFixed(1);return value}
-    function appendEventToTable(topic,item){const log=sensorLogs[topic];if(!log)return;const time=new Date(item.ts||Date.now()).toLocaleTimeString(),dir=item.direction||'';let dirClass='',dirText=dir;if(dir==='publisher->broker'){dirClass='dir-pubbroker';dirText='📤 Pub'}else if(dir==='broker->subscriber'){dirClass='dir-brokersub';dirText='📥 Del'}else if(dir==='subscriber->broker'){dirClass='dir-subbroker';dirText='📨 Ack'}else if(dir==='broker->publisher'){dirClass='dir-brokerpub';dirText='✅ Recv'}const payload=item.payload||{},cfg=sensorConfig[topic],topicShort=item.topic?item.topic.split('/').pop():'';let displayValue='—';if(payload.value!==undefined)displayValue=formatValue(payload.value,cfg);const payloadStr=JSON.stringify(payload),row=document.createElement('tr');row.innerHTML=`<td class="time-cell">${time}</td><td><span class="direction-badge ${dirClass}">${dirText}</span></td><td class="topic-cell">${topicShort}</td><td class="value-cell">${displayValue}</td><td class="payload-cell" title="${payloadStr}">${payloadStr}</td>`;log.tbody.insertBefore(row,log.tbody.firstChild);if(log.tbody.children.length>50)log.tbody.removeChild(log.tbody.lastChild)}
-    function openModal(topic){const cfg=sensorConfig[topic],card=cards[topic];document.getElementById('modalTitle').innerHTML=`${cfg.icon} ${cfg.label} - ${cfg.location}`;const modal=document.getElementById('chartModal');modal.classList.add('show');if(modalChart)modalChart.destroy();const ctx=document.getElementById('modalChart').getContext('2d');modalChart=new Chart(ctx,{type:'line',data:{labels:card.data.map(d=>d.t),datasets:[{label:`${cfg.label} (${cfg.unit})`,data:card.data.map(d=>d.v),borderColor:cfg.color,backgroundColor:cfg.color+'20',borderWidth:4,fill:!0,tension:.4,pointRadius:5,pointHoverRadius:8,pointBackgroundColor:cfg.color,pointBorderColor:'#fff',pointBorderWidth:3}]},options:{responsive:!0,maintainAspectRatio:!1,animation:{duration:500},plugins:{legend:{display:!0,labels:{font:{size:14,weight:'bold'},color:'#1f2937'}},tooltip:{backgroundColor:'rgba(0,0,0,0.8)',titleColor:'#fff',bodyColor:'#fff',padding:15,displayColors:!0,titleFont:{size:14},bodyFont:{size:13},callbacks:{label:c=>`${cfg.label}: ${c.parsed.y} ${cfg.unit}`}}},scales:{x:{display:!0,grid:{color:'rgba(0,0,0,0.05)'},ticks:{font:{size:12},color:'#6b7280',maxTicksLimit:10}},y:{display:!0,min:cfg.min,max:cfg.max,grid:{color:'rgba(0,0,0,0.1)'},ticks:{font:{size:13,weight:'500'},color:'#374151',maxTicksLimit:10}}}}})}
-    function closeModal(){const modal=document.getElementById('chartModal');modal.classList.remove('show');if(modalChart){modalChart.destroy();modalChart=null}}
+    function eventRow(topic,item){const time=new Date(item.ts||Date.now()).toLocaleTimeString(),dir=item.direction||'';let dirClass='',dirText=dir;if(dir==='publisher->broker'){dirClass='dir-pubbroker';dirText='📤 Pub'}else if(dir==='broker->subscriber'){dirClass='dir-brokersub';dirText='📥 Del'}else if(dir==='subscriber->broker'){dirClass='dir-subbroker';dirText='📨 Ack'}else if(dir==='broker->publisher'){dirClass='dir-brokerpub';dirText='✅ Recv'}const payload=item.payload||{},cfg=topicConfig[topic],topicShort=item.topic?item.topic.split('/').pop():'';let displayValue='—';if(payload.value!==undefined)displayValue=formatValue(payload.value,cfg);const payloadStr=JSON.stringify(payload),row=document.createElement('tr'),dirCell=el('td'),payloadCell=el('td','payload-cell',payloadStr);dirCell.append(el('span','direction-badge '+dirClass,dirText));payloadCell.title=payloadStr;row.append(el('td','time-cell',time),dirCell,el('td','topic-cell',topicShort),el('td','value-cell',String(displayValue)),payloadCell);return row}
+    function appendEventToTable(topic,item){const log=sensorLogs[topic];if(!log)return;log.events.unshift(item);if(log.events.length>MAX_LOG)log.events.pop();if(topic!==activeTab)return;logTbody.insertBefore(eventRow(topic,item),logTbody.firstChild);if(logTbody.children.length>MAX_LOG)logTbody.removeChild(logTbody.lastChild)}
+    function loadHistory(){const topic=modalTopic,card=cards[topic];if(!modalChart||!topic)return;const span=+document.getElementById('modalRange').value;if(!span){modalChart.data.labels=card.data.map(d=>d.t);modalChart.data.datasets[0].data=card.data.map(d=>d.v);modalChart.update('none');return}const to=Date.now(),fmt=span>86400000?(t=>new Date(t).toLocaleString()):(t=>new Date(t).toLocaleTimeString());fetch(`/history?topic=${encodeURIComponent(topic)}&from=${to-span}&to=${to}&max_points=500`).then(r=>r.json()).then(h=>{if(!modalChart||modalTopic!==topic||!h.points.length)return;modalChart.data.labels=h.points.map(p=>fmt(p[0]));modalChart.data.datasets[0].data=h.points.map(p=>p[1]);modalChart.update('none')}).catch(e=>console.warn('history load failed',e))}
+    function openModal(topic){const cfg=topicConfig[topic],card=cards[topic];document.getElementById('modalTitle').textContent=`${cfg.icon} ${cfg.label} - ${cfg.location}`;const modal=document.getElementById('chartModal');modal.classList.add('show');if(modalChart)modalChart.destroy();const ctx=document.getElementById('modalChart').getContext('2d');modalChart=new Chart(ctx,{type:'line',data:{labels:card.data.map(d=>d.t),datasets:[{label:`${cfg.label} (${cfg.unit})`,data:card.data.map(d=>d.v),borderColor:cfg.color,backgroundColor:cfg.color+'20',borderWidth:4,fill:!0,tension:.4,stepped:card.hold?'after':!1,pointRadius:5,pointHoverRadius:8,pointBackgroundColor:cfg.color,pointBorderColor:'#fff',pointBorderWidth:3}]},options:{responsive:!0,maintainAspectRatio:!1,animation:{duration:500},plugins:{legend:{display:!0,labels:{font:{size:14,weight:'bold'},color:'#1f2937'}},tooltip:{backgroundColor:'rgba(0,0,0,0.8)',titleColor:'#fff',bodyColor:'#fff',padding:15,displayColors:!0,titleFont:{size:14},bodyFont:{size:13},callbacks:{label:c=>`${cfg.label}: ${c.parsed.y} ${cfg.unit}`}}},scales:{x:{display:!0,grid:{color:'rgba(0,0,0,0.05)'},ticks:{font:{size:12},color:'#6b7280',maxTicksLimit:10}},y:{display:!0,min:cfg.min??undefined,max:cfg.max??undefined,grid:{color:'rgba(0,0,0,0.1)'},ticks:{font:{size:13,weight:'500'},color:'#374151',maxTicksLimit:10}}}}});modalTopic=topic;loadHistory()}
+    function closeModal(){const modal=document.getElementById('chartModal');modal.classList.remove('show');if(modalChart){modalChart.destroy();modalChart=null}modalTopic=null}
     window.onclick=e=>{const modal=document.getElementById('chartModal');if(e.target===modal)closeModal()};
     document.addEventListener('keydown',e=>{if(e.key==='Escape')closeModal()});
-    const es=new EventSource('/stream');
-    es.onmessage=e=>{
-      const item = JSON.parse(e.data), topic = item.topic;
+    function handleEvent(item){
+      if (item.type === 'topic') {
+        addTopic(item.entry);
+        return;
+      }
+      if (item.type === 'aggregates') {
+        setAggregates(item.stats);
+        return;
+      }
+      if (item.type === 'stale') {
+        markStale(item.topic, true);
+        return;
+      }
+      if (item.type === 'snapshot') {
+        // first frame on a fresh connection: every topic plus its newest reading
+        item.topics.forEach(addTopic);
+        setAggregates(item.aggregates || {});
+        item.latest.forEach(r => {
+          const card = cards[r.topic];
+          // a reconnect can re-send a reading this page already shows
+          if (!(card && card.last && card.last.id === r.payload.id)) showReading(r.topic, r.payload);
+          if (r.stale) markStale(r.topic, true);
+        });
+        return;
+      }
+      const topic = item.topic;
       if (item.direction && (item.direction === 'publisher->broker' || item.direction === 'broker->subscriber')) {
         const payload = item.payload || {}, card = cards[topic];
-        if (card && payload.value !== undefined) {
-          const cfg = sensorConfig[topic], displayVal = formatValue(payload.value, cfg);
-          card.v.textContent = displayVal;
-          card.m.textContent = `Last: ${new Date(payload.ts).toLocaleTimeString()} • ID: ${payload.id ? payload.id.substr(0,8) : 'N/A'}`;
-          const numValue = typeof payload.value === 'number' ? payload.value : (displayVal === 'Active' ? 1 : 0);
-          updateChart(topic, numValue, payload.ts);
+        if (!card && topic && topic.startsWith('home/')) {
+          // missed its 'topic' event (e.g. dropped from a full buffer): resync
+          refreshTopics();
+        } else if (card) {
+          showReading(topic, payload);
+          if (item.trace) traceRender(item);
         }
       }
 
-      // Map events to the correct sensor log.
-      // Only append when the event topic exactly matches a sensor topic,
-      // or when it's an ack/ message that we can map back to a sensor by kind.
-      for (let sensorTopic in sensorConfig) {
-        if (!topic) continue;
-
-        // Exact topic matches (e.g. home/livingroom/temperature)
-        if (topic === sensorTopic) {
-          appendEventToTable(sensorTopic, item);
-          break;
-        }
-
-        // Handle ack messages specifically: topic format is `ack/<sensorId>`
-        if (topic.startsWith('ack/') && item.payload) {
-          const sensorId = topic.split('/')[1] || '';
-          const kind = sensorTopic.split('/').pop();
-          // sensorId contains the kind (publisher uses `<room>-<kind>-<hex>`)
-          if (sensorId.includes(kind)) {
-            appendEventToTable(sensorTopic, item);
-            break;
-          }
-        }
+      // Readings are logged under their own topic; ack/<sensorId> events carry
+      // the sensor's topic, resolved server-side, in sensor_topic.
+      const logTopic = item.sensor_topic || topic;
+      if (logTopic) appendEventToTable(logTopic, item);
+    }
+    function showReading(topic, payload){
+      const card = cards[topic];
+      if (!card || payload.value === undefined) return;
+      const displayVal = formatValue(payload.value, topicConfig[topic]);
+      card.last = payload;
+      if (card.stale) markStale(topic, false);
+      if (payload.hb && !card.hold) {
+        // reported by exception: the value holds until the next reading, so draw steps
+        card.hold = true;
+        if (card.chart) card.chart.data.datasets[0].stepped = 'after';
+      }
+      const numValue = typeof payload.value === 'number' ? payload.value : (displayVal === 'Active' ? 1 : 0);
+      updateChart(topic, numValue, payload.ts);
+      if (firstRender === null) {
+        firstRender = performance.now();
+        console.log(`first reading rendered ${firstRender.toFixed(0)} ms after navigation start`);
       }
-    };
+    }
+    // sampled readings carry server-side hop times; send them back with when
+    // this page got the event and when the card was painted
+    let arrived=0;const traceReports=[];
+    function traceRender(item){
+      const report={id:item.payload.id,trace:item.trace,arrive:arrived};
+      // requestAnimationFrame runs just before the next paint, the timeout just after it
+      requestAnimationFrame(()=>setTimeout(()=>{report.render=Date.now();if(traceReports.length<1000)traceReports.push(report)},0));
+    }
+    setInterval(()=>{if(!traceReports.length)return;fetch('/trace/render',{method:'POST',headers:{'Content-Type':'application/json'},body:JSON.stringify(traceReports.splice(0,500))}).catch(e=>console.warn('trace report failed',e))},2000);
+    function dispatch(data){
+      // batched streams deliver a JSON array of events per frame
+      if (Array.isArray(data)) data.forEach(handleEvent); else handleEvent(data);
+    }
+    // the server opens every stream with a snapshot, or on reconnect (Last-Event-ID)
+    // with just the events missed, so there is nothing to fetch up front
+    const es=new EventSource('/stream'+location.search);
+    es.onmessage=e=>{arrived=Date.now();dispatch(JSON.parse(e.data))};
     es.onerror=()=>console.warn('SSE connection error, will retry...');
     console.log('Dashboard initialized!');
   </script>
@@ -324,14 +929,129 @@ DASHBOARD_HTML = '''<!doctype html>
 </html>
 '''
 
+def run_ingest(args):
+    """--workers N: MQTT, acks, aggregates and history here; the page and
+    /stream from N worker processes sharing the listening socket."""
+    listener = socket.create_server((args.host, args.webport), backlog=4096)
+    authkey = os.urandom(16)
+    relay = RelayServer(default_address(), authkey, event_hub, stream_snapshot).start()
+    # /history, /ack/stats and /metrics are served here on loopback; workers forward them
+    internal = make_server('127.0.0.1', 0, app, threaded=True)
+    cmd = [sys.executable, os.path.abspath(__file__)] + sys.argv[1:] + [
+        '--worker-of', format_address(relay.address), '--listen-fd', str(listener.fileno()),
+        '--ingest-url', f"http://127.0.0.1:{internal.server_port}"]
+    env = dict(os.environ, DASHBOARD_RELAY_KEY=authkey.hex())
+    workers = [subprocess.Popen(cmd, pass_fds=(listener.fileno(),), env=env) for _ in range(args.workers)]
+    listener.close()
+
+    def stop_workers():
+        for w in workers:
+            w.terminate()
+    atexit.register(stop_workers)
+    signal.signal(signal.SIGTERM, lambda signum, frame: sys.exit(0))
+
+    start_mqtt(args.broker, args.port)
+    print(f"✓ Ingest process {os.getpid()} with {args.workers} {args.server} web workers on http://{args.host}:{args.webport}")
+    print(f"✓ Connected to MQTT broker at {args.broker}:{args.port}")
+    internal.serve_forever()
+
+def run_worker(args):
+    """A --workers web process: the page and /stream, from a hub fed by the ingest process."""
+    global aggregates
+    aggregates = AggregateMirror()
+    app.config['INGEST_URL'] = args.ingest_url
+    relay = RelayClient(parse_address(args.worker_of), bytes.fromhex(os.environ['DASHBOARD_RELAY_KEY']),
+                        mirror_init, mirror_batch).start()
+    if not relay.connected.wait(10):
+        log.warning('No relay from the ingest process yet; serving what arrives')
+    listener = socket.socket(fileno=args.listen_fd)
+
+    if args.server == 'asyncio':
+        from dashboard_async import run_server
+        run_server(app, event_hub, event_encoder, page_assets(), None, None, None, stream_snapshot, sock=listener)
+        return
+    page_assets()
+    make_server(args.host, args.webport, app, threaded=True, fd=listener.fileno()).serve_forever()
+
 def main():
     parser = argparse.ArgumentParser()
     parser.add_argument('--broker', default='localhost')
     parser.add_argument('--port', type=int, default=1883)
     parser.add_argument('--host', default='127.0.0.1')
     parser.add_argument('--webport', type=int, default=5000)
+    parser.add_argument('--server', choices=('flask', 'asyncio'), default='flask', help='flask: thread per connection; asyncio: one event loop for MQTT and all SSE clients')
+    parser.add_argument('--sse-buffer', type=int, default=1000, help='per-client SSE ring buffer size (events)')
+    parser.add_argument('--sse-overflow', choices=OVERFLOW_POLICIES, default='drop_oldest', help='what a full client buffer does with new events')
+    parser.add_argument('--sse-batch-ms', type=float, default=0, help='pack events into one SSE frame per window (0 = one frame per event)')
+    parser.add_argument('--sse-batch-max', type=int, default=200, help='flush a batch early once it holds this many events')
+    parser.add_argument('--sse-replay', type=int, default=10000, help='events kept for Last-Event-ID resume')
+    parser.add_argument('--sse-collapse-latest', action='store_true', help='within a batch keep only the latest event per topic/direction')
+    parser.add_argument('--ack-mode', choices=ACK_MODES, default='single', help='single: one ack per reading; batch: one ack per sensor per window')
+    parser.add_argument('--ack-window-ms', type=float, default=500, help='[batch] flush pending acks this often')
+    parser.add_argument('--ack-batch-size', type=int, default=50, help='[batch] flush a sensor early once this many ids are waiting')
+    parser.add_argument('--pending-ttl', type=float, default=30, help='drop unconfirmed ack publishes after this many seconds')
+    parser.add_argument('--sensor-max', type=int, default=10000, help='sensor ids kept for the /stream snapshot; the least recently heard go first')
+    parser.add_argument('--sensor-ttl', type=float, default=86400, help='forget a sensor id this many seconds after its last reading (0 = never)')
+    parser.add_argument('--stale-after', type=float, default=30, help='mark a sensor without a heartbeat stale after this many seconds without a reading (0 = never); ones with a heartbeat after %d heartbeats' % STALE_HEARTBEATS)
+    add_logging_args(parser)
+    add_tracing_args(parser)
+    parser.add_argument('--agg-interval', type=float, default=1.0, help='seconds between pushes of changed rolling aggregates (0 = off)')
+    parser.add_argument('--history-dir', default='history_data', help="directory for the time-series history store ('' disables it)")
+    parser.add_argument('--history-retention-days', type=float, default=7, help='delete history segments older than this')
+    parser.add_argument('--history-open-segments', type=int, default=DEFAULT_OPEN_SEGMENTS,
+                        help='history segments kept mapped at once (one file descriptor each); the rest are mapped when read')
+    parser.add_argument('--workers', type=int, default=0, help='serve the page and /stream from N worker processes fed by this one (0 = single process)')
+    # set by the ingest process when it starts a worker
+    parser.add_argument('--worker-of', help=argparse.SUPPRESS)
+    parser.add_argument('--listen-fd', type=int, help=argparse.SUPPRESS)
+    parser.add_argument('--ingest-url', help=argparse.SUPPRESS)
     args = parser.parse_args()
 
+    global history, log, hot, stale_after
+    log, hot = setup_logging('dashboard', args.log_mode, args.log_sample, args.log_summary_interval)
+    tracer.sample = args.trace_sample
+    tracer.path = args.trace_file or None
+    tracer.start()
+
+    latest.max_entries = sensor_names.max_entries = sensor_heartbeats.max_entries = args.sensor_max
+    latest.ttl = sensor_names.ttl = sensor_heartbeats.ttl = args.sensor_ttl or None
+    stale_after = args.stale_after
+    event_hub.maxlen = args.sse_buffer
+    event_hub.overflow = args.sse_overflow
+    event_hub.replay = args.sse_replay
+    app.config.update(SSE_BATCH_MS=args.sse_batch_ms, SSE_BATCH_MAX=args.sse_batch_max,
+                      SSE_COLLAPSE_LATEST=args.sse_collapse_latest)
+
+    if args.worker_of:
+        run_worker(args)
+        return
+
+    if args.history_dir:
+        history = HistoryStore(args.history_dir, retention_s=args.history_retention_days * 86400,
+                               max_open=args.history_open_segments)
+
+    acks.mode = args.ack_mode
+    acks.window = args.ack_window_ms / 1000.0
+    acks.batch_size = args.ack_batch_size
+    acks.pending_ttl = args.pending_ttl
+
+    aggregates.interval = args.agg_interval
+    aggregates.start(lambda changed: event_hub.publish({'type': 'aggregates', 'stats': changed, 'ts': int(time.time() * 1000)}))
+    start_stale_sweeper()
+
+    if args.workers > 0:
+        run_ingest(args)
+        return
+
+    if args.server == 'asyncio':
+        from dashboard_async import run_server
+        print(f"✓ Starting asyncio server on http://{args.host}:{args.webport}")
+        print(f"✓ Connecting to MQTT broker at {args.broker}:{args.port}")
+        run_server(app, event_hub, event_encoder, page_assets(), lambda driver: start_mqtt(args.broker, args.port, driver),
+                   args.host, args.webport, stream_snapshot)
+        return
+
+    page_assets()
     mqtt_client = start_mqtt(args.broker, args.port)
 
     print(f"✓ Starting Flask app on http://{args.host}:{args.webport}")
@@ -0,0 +1,235 @@
+"""Hub-to-hub event relay over a local socket, for the multi-process dashboard.
+
+With --workers N, one ingest process owns the MQTT subscription, acks,
+aggregates and history, and N web worker processes serve /stream. Each
+worker's BroadcastHub is fed from the ingest hub through this relay, a
+multiprocessing.connection Listener on a Unix socket (a loopback TCP port
+where AF_UNIX is unavailable); no broker or external service is involved.
+
+    ingest:  RelayServer(address, key, event_hub, stream_snapshot).start()
+    worker:  RelayClient(address, key, on_init, on_batch).start()
+
+The server is a single hub sink. put() only appends to a deque, so the
+ingest hub never waits on a worker; a sender thread drains the deque,
+pickles each batch once and writes the same bytes to every worker. A new
+worker is sent (seq, snapshot) taken with no publish in between, then every
+batch from there on; it relays events with their ingest seq (see
+BroadcastHub.relay), so event ids, and Last-Event-ID resume, are the same
+whichever worker a browser lands on.
+"""
+import collections
+import logging
+import os
+import pickle
+import socket
+import threading
+import time
+from multiprocessing.connection import Client, Listener
+
+log = logging.getLogger('dashboard')
+
+
+def default_address():
+    """A fresh Unix socket path, or a loopback TCP address without AF_UNIX."""
+    if hasattr(socket, 'AF_UNIX'):
+        import tempfile
+        return os.path.join(tempfile.mkdtemp(prefix='dashboard-relay-'), 'relay.sock')
+    return ('127.0.0.1', 0)
+
+
+def parse_address(text):
+    host, sep, port = text.rpartition(':')
+    if sep and port.isdigit() and '/' not in text:
+        return (host, int(port))
+    return text
+
+
+def format_address(address):
+    return address if isinstance(address, str) else f"{address[0]}:{address[1]}"
+
+
+class _Join:
+    __slots__ = ('conn', 'seq', 'snapshot')
+
+    def __init__(self, conn, seq, snapshot):
+        self.conn = conn
+        self.seq = seq
+        self.snapshot = snapshot
+
+
+class RelayServer:
+    """Ingest side: a hub sink that forwards every event to connected workers.
+
+    `maxlen` bounds the events waiting to be sent; a worker that stops
+    reading stalls the sender, and once the backlog is full the oldest
+    events are dropped (counted in stats()) rather than growing without end.
+    """
+
+    def __init__(self, address, authkey, hub, snapshot, maxlen=100000):
+        self.hub = hub
+        self.snapshot = snapshot
+        self.filter = None
+        self._listener = Listener(address, authkey=authkey)
+        self.address = self._listener.address
+        self._items = collections.deque()
+        self._maxlen = maxlen
+        self._wake = threading.Event()
+        self._links = []
+        self.id = 'relay'
+        self.created = time.time()
+        self.received = 0
+        self.sent = 0
+        self.batches = 0
+        self.bytes_sent = 0
+        self.dropped = 0
+        self.max_lag = 0
+
+    def start(self):
+        self.hub.attach(self)
+        threading.Thread(target=self._accept, daemon=True).start()
+        threading.Thread(target=self._send_loop, daemon=True).start()
+        return self
+
+    def put(self, item):
+        # called under the hub's publish lock: no I/O here
+        self._items.append(item)
+        self.received += 1
+        if len(self._items) > self._maxlen:
+            self._items.popleft()
+            self.dropped += 1
+        self._wake.set()
+
+    def _accept(self):
+        while True:
+            try:
+                conn = self._listener.accept()
+            except (OSError, EOFError) as e:
+                # includes a worker failing the authkey handshake
+                log.warning('Relay accept failed: %s', e)
+                continue
+            # queued behind everything published before the snapshot, so the
+            # sender starts this worker exactly where the snapshot leaves off
+            self.hub.consistent(lambda: self._items.append(_Join(conn, self.hub.seq, self.snapshot())))
+            self._wake.set()
+
+    def _send_loop(self):
+        while True:
+            self._wake.wait()
+            self._wake.clear()
+            batch = []
+            while self._items:
+                lag = len(self._items)
+                if lag > self.max_lag:
+                    self.max_lag = lag
+                item = self._items.popleft()
+                if type(item) is _Join:
+                    self._send(batch)
+                    batch = []
+                    self._add_link(item)
+                else:
+                    batch.append(item)
+            self._send(batch)
+
+    def _add_link(self, join):
+        try:
+            join.conn.send({'epoch': self.hub.epoch, 'seq': join.seq, 'snapshot': join.snapshot})
+        except OSError as e:
+            log.warning('Relay worker went away during setup: %s', e)
+            return
+        self._links.append(join.conn)
+        log.info('Relay worker connected (%d total)', len(self._links))
+
+    def _send(self, batch):
+        if not batch or not self._links:
+            return
+        data = pickle.dumps(batch, pickle.HIGHEST_PROTOCOL)
+        for conn in list(self._links):
+            try:
+                conn.send_bytes(data)
+            except OSError as e:
+                log.warning('Relay worker disconnected: %s', e)
+                self._links.remove(conn)
+                conn.close()
+        self.sent += len(batch)
+        self.batches += 1
+        self.bytes_sent += len(data) * len(self._links)
+
+    @property
+    def lag(self):
+        return len(self._items)
+
+    def stats(self):
+        return {
+            'id': self.id,
+            'lag': len(self._items),
+            'max_lag': self.max_lag,
+            'received': self.received,
+            'delivered': self.sent,
+            'dropped': self.dropped,
+            'coalesced': 0,
+            'maxlen': self._maxlen,
+            'overflow': 'drop_oldest',
+            'filter': None,
+            'age_s': round(time.time() - self.created, 1),
+            'workers': len(self._links),
+            'batches': self.batches,
+            'bytes_sent': self.bytes_sent,
+        }
+
+
+class RelayClient:
+    """Worker side: receive the ingest hub's events on a background thread.
+
+    on_init(epoch, seq, snapshot) runs on every (re)connect before any batch;
+    on_batch(events) gets each batch in order. The thread reconnects with
+    backoff, and exits the process once the ingest process (its parent) is
+    gone, so workers never outlive it.
+    """
+
+    def __init__(self, address, authkey, on_init, on_batch):
+        self.address = address
+        self.authkey = authkey
+        self.on_init = on_init
+        self.on_batch = on_batch
+        self.parent = os.getppid()
+        self.connected = threading.Event()
+        self.received = 0
+
+    def start(self):
+        threading.Thread(target=self._run, daemon=True).start()
+        return self
+
+    def _orphaned(self):
+        return os.getppid() != self.parent
+
+    def _run(self):
+        delay = 0.1
+        while not self._orphaned():
+            try:
+                conn = Client(self.address, authkey=self.authkey)
+            except OSError as e:
+                log.debug('Relay connect failed: %s; retrying in %ss', e, delay)
+                time.sleep(delay)
+                delay = min(delay * 2, 5)
+                continue
+            delay = 0.1
+            try:
+                init = conn.recv()
+                self.on_init(init['epoch'], init['seq'], init['snapshot'])
+                self.connected.set()
+                while True:
+                    # wake up now and then to notice a dead parent
+                    if not conn.poll(1.0):
+                        if self._orphaned():
+                            break
+                        continue
+                    batch = pickle.loads(conn.recv_bytes())
+                    self.received += len(batch)
+                    self.on_batch(batch)
+            except (EOFError, OSError) as e:
+                log.warning('Relay connection lost: %s', e)
+            finally:
+                self.connected.clear()
+                conn.close()
+        log.info('Ingest process is gone; worker exiting')
+        os._exit(0)
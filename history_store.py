@@ -0,0 +1,329 @@
+import array
+import bisect
+import collections
+import mmap
+import os
+import struct
+import threading
+import time
+import urllib.parse
+
+# Segment file layout (little endian):
+#   header   magic 'TSG1', uint32 point count, 8 bytes reserved
+#   ts       capacity float64 timestamps (ms since epoch), ascending
+#   values   capacity float64 values
+# Both columns are preallocated, so a segment is memory-mapped once and points
+# are written in place; the count in the header is what makes them visible.
+MAGIC = b'TSG1'
+HEADER = struct.Struct('<4sI8x')
+DEFAULT_SEGMENT_POINTS = 65536
+# mapped segments across all topics, one file descriptor each
+DEFAULT_OPEN_SEGMENTS = 256
+
+
+class Segment:
+    """One fixed-capacity, memory-mapped columnar segment of a topic's series.
+
+    Mapped only while in use (see SegmentCache): the count, capacity and first
+    and last timestamps are kept here, so deciding whether a segment is full
+    or overlaps a range never maps it. lock is the owning series' lock.
+    """
+
+    def __init__(self, path, capacity=DEFAULT_SEGMENT_POINTS, lock=None):
+        if not os.path.exists(path):
+            with open(path, 'wb') as f:
+                f.write(HEADER.pack(MAGIC, 0))
+                f.truncate(HEADER.size + capacity * 16)
+        self.path = path
+        self.lock = lock or threading.Lock()
+        self._mm = None
+        self.map()
+        self.first_ts = self.ts[0] if self.count else None
+        self.last_ts = self.ts[self.count - 1] if self.count else None
+        self.unmap()
+
+    @property
+    def mapped(self):
+        return self._mm is not None
+
+    @property
+    def full(self):
+        return self.count >= self.capacity
+
+    def map(self):
+        with open(self.path, 'r+b') as f:
+            # the mmap holds its own descriptor; the file's is closed here
+            mm = mmap.mmap(f.fileno(), 0)
+        magic, count = HEADER.unpack_from(mm, 0)
+        if magic != MAGIC:
+            mm.close()
+            raise ValueError(f"{self.path} is not a history segment")
+        self._mm = mm
+        self.count = count
+        self.capacity = (len(mm) - HEADER.size) // 16
+        view = memoryview(mm)
+        split = HEADER.size + self.capacity * 8
+        self.ts = view[HEADER.size:split].cast('d')
+        self.values = view[split:split + self.capacity * 8].cast('d')
+        view.release()
+
+    def unmap(self):
+        if self._mm is None:
+            return
+        self.ts.release()
+        self.values.release()
+        self.ts = self.values = None
+        self._mm.close()
+        self._mm = None
+
+    def append(self, ts, value):
+        i = self.count
+        self.ts[i] = ts
+        self.values[i] = value
+        self.count = i + 1
+        HEADER.pack_into(self._mm, 0, MAGIC, self.count)
+        if i == 0:
+            self.first_ts = ts
+        self.last_ts = ts
+
+    def read_range(self, t0, t1, ts_out, values_out):
+        """Append points with t0 <= ts <= t1 to the given arrays."""
+        lo = bisect.bisect_left(self.ts, t0, 0, self.count)
+        hi = bisect.bisect_right(self.ts, t1, lo, self.count)
+        if hi > lo:
+            ts_out.frombytes(self.ts[lo:hi].cast('B'))
+            values_out.frombytes(self.values[lo:hi].cast('B'))
+
+    def close(self):
+        self.unmap()
+
+
+class SegmentCache:
+    """Bounds how many segments are mapped at once; the least recently used go first.
+
+    Every mapped segment holds a file descriptor, so mapping each segment of
+    every topic for good runs out of them once there are enough topics.
+    """
+
+    def __init__(self, max_open=DEFAULT_OPEN_SEGMENTS):
+        self.max_open = max_open
+        self._lock = threading.Lock()
+        self._open = collections.OrderedDict()
+        self.unmapped = 0
+
+    def touch(self, seg):
+        """Mark seg in use; returns the segments to unmap to get back under max_open."""
+        victims = []
+        with self._lock:
+            self._open[seg] = None
+            self._open.move_to_end(seg)
+            while len(self._open) > self.max_open:
+                victims.append(self._open.popitem(last=False)[0])
+            self.unmapped += len(victims)
+        return victims
+
+    def discard(self, seg):
+        with self._lock:
+            self._open.pop(seg, None)
+
+    def __contains__(self, seg):
+        return seg in self._open
+
+    def __len__(self):
+        return len(self._open)
+
+
+class TopicSeries:
+    def __init__(self, directory, segment_points, cache=None):
+        self.directory = directory
+        self.segment_points = segment_points
+        self.cache = cache
+        self.lock = threading.Lock()
+        os.makedirs(directory, exist_ok=True)
+        self.segments = []
+        for name in sorted(os.listdir(directory)):
+            if name.endswith('.seg'):
+                try:
+                    self.segments.append(Segment(os.path.join(directory, name), lock=self.lock))
+                except (OSError, ValueError) as e:
+                    print(f"Skipping history segment {name}: {e}")
+
+    def _use(self, seg):
+        """Map seg if it isn't; call with self.lock held, unmap the result without it."""
+        if not seg.mapped:
+            seg.map()
+        return self.cache.touch(seg) if self.cache is not None else ()
+
+    def _unmap(self, victims):
+        # victims can belong to any series: each is unmapped under its own
+        # lock, and only if nobody touched it again in the meantime
+        for seg in victims:
+            with seg.lock:
+                if seg not in self.cache:
+                    seg.unmap()
+
+    def append(self, ts, value):
+        with self.lock:
+            last = self.segments[-1] if self.segments else None
+            if last is not None and last.count:
+                # keep each series sorted so range reads can bisect
+                ts = max(ts, last.last_ts)
+            if last is None or last.full:
+                name = f"{int(ts):013d}.seg"
+                last = Segment(os.path.join(self.directory, name), self.segment_points, self.lock)
+                self.segments.append(last)
+            victims = self._use(last)
+            last.append(ts, value)
+        self._unmap(victims)
+
+    def read(self, t0, t1):
+        ts_out, values_out = array.array('d'), array.array('d')
+        victims = []
+        with self.lock:
+            for seg in self.segments:
+                if not seg.count or seg.last_ts < t0 or seg.first_ts > t1:
+                    continue
+                victims += self._use(seg)
+                seg.read_range(t0, t1, ts_out, values_out)
+        self._unmap(victims)
+        return ts_out, values_out
+
+    def _drop(self, seg):
+        if self.cache is not None:
+            self.cache.discard(seg)
+        seg.close()
+
+    def expire(self, cutoff):
+        with self.lock:
+            # never drop the segment currently being written
+            while len(self.segments) > 1 and self.segments[0].last_ts < cutoff:
+                seg = self.segments.pop(0)
+                self._drop(seg)
+                os.remove(seg.path)
+
+    def close(self):
+        with self.lock:
+            for seg in self.segments:
+                self._drop(seg)
+            self.segments = []
+
+
+def downsample_buckets(ts, values, t0, t1, max_points):
+    """Split [t0, t1] into max_points equal buckets: [ts, avg, min, max]."""
+    if not ts:
+        return []
+    t0 = max(t0, ts[0])
+    t1 = min(t1, ts[-1])
+    width = (t1 - t0) / max_points or 1
+    out = []
+    lo = 0
+    for i in range(max_points):
+        edge = t0 + (i + 1) * width
+        hi = len(ts) if i == max_points - 1 else bisect.bisect_right(ts, edge, lo)
+        if hi > lo:
+            chunk = values[lo:hi]
+            out.append([int(t0 + (i + 0.5) * width), sum(chunk) / len(chunk), min(chunk), max(chunk)])
+        lo = hi
+    return out
+
+
+def downsample_lttb(ts, values, max_points):
+    """Largest-Triangle-Three-Buckets: max_points representative [ts, value]."""
+    n = len(ts)
+    if n <= max_points or max_points < 3:
+        return [[int(t), v] for t, v in zip(ts, values)]
+    out = [[int(ts[0]), values[0]]]
+    every = (n - 2) / (max_points - 2)
+    a = 0
+    for i in range(max_points - 2):
+        # average of the next bucket is the third triangle vertex
+        nxt_lo = int((i + 1) * every) + 1
+        nxt_hi = min(int((i + 2) * every) + 1, n)
+        nxt_ts = ts[nxt_lo:nxt_hi]
+        avg_t = sum(nxt_ts) / len(nxt_ts)
+        avg_v = sum(values[nxt_lo:nxt_hi]) / len(nxt_ts)
+
+        lo = int(i * every) + 1
+        hi = int((i + 1) * every) + 1
+        at, av = ts[a], values[a]
+        best, best_area = lo, -1.0
+        for j in range(lo, hi):
+            area = abs((at - avg_t) * (values[j] - av) - (at - ts[j]) * (avg_v - av))
+            if area > best_area:
+                best, best_area = j, area
+        out.append([int(ts[best]), values[best]])
+        a = best
+    out.append([int(ts[-1]), values[-1]])
+    return out
+
+
+class HistoryStore:
+    """Append-only per-topic time-series store backed by mmap'd segment files.
+
+    Only numeric values are stored. Segments older than retention_s are
+    deleted when expire() runs (append() calls it at most once a minute).
+    At most max_open segments are mapped at a time, so the number of file
+    descriptors stays bounded however many topics there are.
+    """
+
+    def __init__(self, directory, segment_points=DEFAULT_SEGMENT_POINTS, retention_s=None,
+                 max_open=DEFAULT_OPEN_SEGMENTS):
+        self.directory = directory
+        self.segment_points = segment_points
+        self.retention_s = retention_s
+        self.segments = SegmentCache(max_open)
+        self._lock = threading.Lock()
+        self._series = {}
+        self._last_expire = 0
+        os.makedirs(directory, exist_ok=True)
+        for name in os.listdir(directory):
+            path = os.path.join(directory, name)
+            if os.path.isdir(path):
+                self._series[urllib.parse.unquote(name)] = TopicSeries(path, segment_points, self.segments)
+
+    def _get(self, topic, create):
+        series = self._series.get(topic)
+        if series is None and create:
+            with self._lock:
+                series = self._series.get(topic)
+                if series is None:
+                    path = os.path.join(self.directory, urllib.parse.quote(topic, safe=''))
+                    series = self._series[topic] = TopicSeries(path, self.segment_points, self.segments)
+        return series
+
+    def append(self, topic, ts, value):
+        if isinstance(value, bool):
+            value = int(value)
+        if not isinstance(value, (int, float)):
+            return False
+        self._get(topic, True).append(float(ts), float(value))
+        if self.retention_s and time.time() - self._last_expire > 60:
+            self.expire()
+        return True
+
+    def topics(self):
+        return sorted(self._series)
+
+    def query(self, topic, t0, t1, max_points=500, mode='minmax'):
+        """Return (kind, points) for [t0, t1]. kind is 'raw' ([ts, value]) when
+        the range already fits in max_points, otherwise 'lttb' ([ts, value]) or
+        'minmax' ([ts, avg, min, max] per bucket)."""
+        series = self._get(topic, False)
+        if series is None:
+            return 'raw', []
+        ts, values = series.read(t0, t1)
+        if len(ts) <= max_points:
+            return 'raw', [[int(t), v] for t, v in zip(ts, values)]
+        if mode == 'lttb':
+            return 'lttb', downsample_lttb(ts, values, max_points)
+        return 'minmax', downsample_buckets(ts, values, t0, t1, max_points)
+
+    def expire(self):
+        self._last_expire = time.time()
+        cutoff = (time.time() - self.retention_s) * 1000
+        for series in list(self._series.values()):
+            series.expire(cutoff)
+
+    def close(self):
+        for series in list(self._series.values()):
+            series.close()
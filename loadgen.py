@@ -0,0 +1,185 @@
+import bisect
+import itertools
+import json
+import threading
+import time
+import uuid
+
+import payload_codec
+
+# latency histogram bucket upper edges in milliseconds
+LATENCY_BUCKETS_MS = [1, 2, 5, 10, 20, 50, 100, 200, 500, 1000, 2000, 5000, float('inf')]
+
+
+class TokenBucket:
+    """Pace to `rate` tokens/s, allowing bursts of up to `burst` tokens."""
+
+    def __init__(self, rate, burst=None):
+        self.rate = rate
+        self.burst = burst or max(1.0, rate / 100.0)
+        self.tokens = self.burst
+        self.last = time.monotonic()
+
+    def take(self):
+        """Block until at least one token is available; return how many to spend."""
+        while True:
+            now = time.monotonic()
+            self.tokens = min(self.burst, self.tokens + (now - self.last) * self.rate)
+            self.last = now
+            if self.tokens >= 1:
+                n = int(self.tokens)
+                self.tokens -= n
+                return n
+            time.sleep((1 - self.tokens) / self.rate)
+
+
+class AckTracker:
+    """Publish-to-ack latency for in-flight message ids."""
+
+    def __init__(self, on_ack=None):
+        self.on_ack = on_ack
+        self._lock = threading.Lock()
+        self.pending = {}
+        self.acked = 0
+        self.ack_messages = 0
+        self.unknown = 0
+        self.overwritten = 0
+        self.latencies = []
+        self.histogram = [0] * len(LATENCY_BUCKETS_MS)
+
+    def sent(self, msg_id, t):
+        with self._lock:
+            if msg_id in self.pending:
+                # id pool wrapped before the old message was acked
+                self.overwritten += 1
+            self.pending[msg_id] = t
+
+    def ack(self, msg_id, t):
+        with self._lock:
+            t0 = self.pending.pop(msg_id, None)
+            if t0 is None:
+                self.unknown += 1
+                return
+            self.acked += 1
+            ms = (t - t0) * 1000
+            self.latencies.append(ms)
+            self.histogram[bisect.bisect_left(LATENCY_BUCKETS_MS, ms)] += 1
+        if self.on_ack is not None:
+            self.on_ack(ms / 1000.0)
+
+    def on_message(self, client, userdata, msg):
+        now = time.monotonic()
+        try:
+            payload = payload_codec.loads(msg.payload)
+        except Exception:
+            self.unknown += 1
+            return
+        self.ack_messages += 1
+        ids = payload.get('origIds')
+        if ids is None:
+            ids = [payload.get('origId')]
+        for msg_id in ids:
+            self.ack(msg_id, now)
+
+
+class LoadGenerator:
+    """Publish synthetic readings at a fixed aggregate rate.
+
+    Everything that can be is computed up front: one JSON template per
+    sensor, a pool of message ids and a table of values per sensor kind, so
+    the hot loop is a string format and client.publish().
+
+    Sensors on a topic starting with one of binary_prefixes publish the
+    compact binary encoding; their (id, topic) pairs are in binary_sensors
+    for the caller to announce. on_publish(topic) and on_ack(latency_s) are
+    optional metric hooks.
+    """
+
+    def __init__(self, client, specs, sensors, rate, payload_size=0, id_pool=65536,
+                 binary_prefixes=(), on_publish=None, on_ack=None):
+        self.client = client
+        self.rate = rate
+        self.on_publish = on_publish
+        self.tracker = AckTracker(on_ack)
+        uuids = [uuid.uuid4() for _ in range(id_pool)]
+        self.ids = [str(u) for u in uuids]
+        # binary acks come back as hex ids, so that is what gets tracked
+        self.binary_ids = [(u.hex, u.bytes) for u in uuids]
+        self.binary_sensors = []
+        self.sent = 0
+
+        run = uuid.uuid4().hex[:6]
+        self.templates = []
+        for i in range(sensors):
+            room, kind, _, _, generator = specs[i % len(specs)]
+            sensor_id = f"load{run}-{kind}-{i:06d}"
+            topic = f"home/{room}/{kind}"
+            if payload_codec.codec_for(topic, binary_prefixes) == 'binary':
+                index = payload_codec.sensor_index(sensor_id)
+                values = [generator() for _ in range(64)]
+                self.templates.append((topic, index, values, True))
+                self.binary_sensors.append((sensor_id, topic))
+                continue
+            values = [json.dumps(generator()) for _ in range(64)]
+            head = f'{{"id": "%s", "sensor": "{sensor_id}", "value": %s, "ts": %d'
+            # pad the JSON up to payload_size bytes with a filler field
+            base = len((head % (self.ids[0], values[0], int(time.time() * 1000))).encode()) + 1
+            pad = payload_size - base - len(', "pad": ""')
+            tail = f', "pad": "{"x" * pad}"}}' if pad > 0 else '}'
+            self.templates.append((topic, head + tail, values, False))
+
+        client.message_callback_add('ack/+', self.tracker.on_message)
+        client.subscribe('ack/+')
+
+    def run(self, duration):
+        bucket = TokenBucket(self.rate)
+        tracker = self.tracker
+        publish = self.client.publish
+        count = self.on_publish
+        encode = payload_codec.encode_reading
+        ids = self.ids
+        binary_ids = self.binary_ids
+        templates = self.templates
+        n_ids, n_templates = len(ids), len(templates)
+        counter = itertools.count()
+        start = time.monotonic()
+        end = start + duration
+        while True:
+            n = bucket.take()
+            now = time.monotonic()
+            if now >= end:
+                break
+            ts = int(time.time() * 1000)
+            for _ in range(n):
+                i = next(counter)
+                topic, template, values, binary = templates[i % n_templates]
+                if binary:
+                    # template is the sensor index
+                    msg_id, raw_id = binary_ids[i % n_ids]
+                    payload = encode(raw_id, template, values[i % len(values)], ts)
+                else:
+                    msg_id = ids[i % n_ids]
+                    payload = template % (msg_id, values[i % len(values)], ts)
+                tracker.sent(msg_id, now)
+                publish(topic, payload)
+                if count is not None:
+                    count(topic)
+        self.sent = next(counter)
+        return time.monotonic() - start
+
+    def report(self, elapsed):
+        t = self.tracker
+        lat = sorted(t.latencies)
+        pick = lambda p: lat[min(len(lat) - 1, int(p * len(lat)))] if lat else float('nan')
+        lines = [
+            f"sent={self.sent} in {elapsed:.1f}s -> {self.sent / elapsed:.0f} msgs/s (target {self.rate:.0f})",
+            f"acked={t.acked} in {t.ack_messages} ack messages, missing={len(t.pending) + t.overwritten} unknown={t.unknown}",
+            f"ack latency ms: p50={pick(0.5):.1f} p90={pick(0.9):.1f} p99={pick(0.99):.1f} max={(lat[-1] if lat else float('nan')):.1f}",
+        ]
+        peak = max(t.histogram) or 1
+        lo = 0
+        for edge, count in zip(LATENCY_BUCKETS_MS, t.histogram):
+            label = f"{lo:>5}-{edge:<5}" if edge != float('inf') else f"{lo:>5}+     "
+            lines.append(f"  {label} ms {count:>8} {'#' * int(40 * count / peak)}")
+            lo = edge
+        return '\n'.join(lines)
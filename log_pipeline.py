@@ -0,0 +1,136 @@
+import atexit
+import collections
+import logging
+import logging.handlers
+import queue
+import sys
+import threading
+import time
+
+LOG_MODES = ('verbose', 'summary')
+
+
+class DroppingQueueHandler(logging.handlers.QueueHandler):
+    """QueueHandler that never blocks: when the queue is full the record is
+    dropped and counted instead.
+
+    prepare() is skipped, so message formatting happens on the listener
+    thread; callers must not mutate objects passed as log args afterwards.
+    """
+
+    def __init__(self, q):
+        super().__init__(q)
+        self.dropped = 0
+
+    def prepare(self, record):
+        return record
+
+    def enqueue(self, record):
+        try:
+            self.queue.put_nowait(record)
+        except queue.Full:
+            self.dropped += 1
+
+
+class HotPathLog:
+    """Per-message logging for the MQTT callback and publish paths.
+
+    hot() counts every message per topic and, in verbose mode, logs one in
+    every `sample` of them per topic. A background thread logs an aggregate
+    line per topic every `summary_interval` seconds, e.g.
+    "home/livingroom/temperature: 1200.0 msgs/s (publish 1200.0), 0 malformed".
+    """
+
+    def __init__(self, logger, mode='verbose', sample=1, summary_interval=10.0):
+        if mode not in LOG_MODES:
+            raise ValueError(f"unknown log mode {mode!r}")
+        self.logger = logger
+        self.mode = mode
+        self.sample = max(1, sample)
+        self.summary_interval = summary_interval
+        self._lock = threading.Lock()
+        self._counts = collections.Counter()
+        self._malformed = collections.Counter()
+        self._seen = collections.Counter()
+        self._halt = threading.Event()
+        self._thread = None
+
+    def hot(self, kind, topic, msg, *args):
+        with self._lock:
+            self._counts[(topic, kind)] += 1
+            if self.mode != 'verbose':
+                return
+            n = self._seen[topic]
+            self._seen[topic] = n + 1
+        if n % self.sample == 0:
+            self.logger.info(msg, *args)
+
+    def malformed(self, topic, msg, *args):
+        with self._lock:
+            self._malformed[topic] += 1
+            n = self._seen[topic]
+            self._seen[topic] = n + 1
+        if n % self.sample == 0:
+            self.logger.warning(msg, *args)
+
+    def start(self):
+        if self.summary_interval and self._thread is None:
+            self._thread = threading.Thread(target=self._run, daemon=True)
+            self._thread.start()
+        return self
+
+    def stop(self):
+        self._halt.set()
+
+    def summary(self, elapsed):
+        with self._lock:
+            counts, self._counts = self._counts, collections.Counter()
+            malformed, self._malformed = self._malformed, collections.Counter()
+        per_topic = collections.defaultdict(dict)
+        for (topic, kind), n in counts.items():
+            per_topic[topic][kind] = n
+        lines = []
+        for topic in sorted(set(per_topic) | set(malformed)):
+            kinds = per_topic.get(topic, {})
+            total = sum(kinds.values())
+            detail = ', '.join(f"{k} {n / elapsed:.1f}" for k, n in sorted(kinds.items()))
+            lines.append(f"{topic}: {total / elapsed:.1f} msgs/s ({detail}), {malformed.get(topic, 0)} malformed")
+        return lines
+
+    def _run(self):
+        last = time.monotonic()
+        while not self._halt.wait(self.summary_interval):
+            now = time.monotonic()
+            for line in self.summary(now - last):
+                self.logger.info("[SUMMARY] %s", line)
+            last = now
+
+
+def setup_logging(name, mode='verbose', sample=1, summary_interval=10.0, level=logging.INFO,
+                  queue_size=100000, stream=None):
+    """Route `name`'s log records through a bounded queue to a background
+    writer thread and return (logger, HotPathLog)."""
+    logger = logging.getLogger(name)
+    logger.setLevel(level)
+    logger.propagate = False
+    for h in list(logger.handlers):
+        logger.removeHandler(h)
+
+    handler = logging.StreamHandler(stream or sys.stdout)
+    handler.setFormatter(logging.Formatter('%(message)s'))
+    q = queue.Queue(queue_size)
+    logger.addHandler(DroppingQueueHandler(q))
+    listener = logging.handlers.QueueListener(q, handler, respect_handler_level=True)
+    listener.start()
+    # flush whatever is still queued when the process exits
+    atexit.register(listener.stop)
+    logger.listener = listener
+
+    hot = HotPathLog(logger, mode, sample, summary_interval).start()
+    return logger, hot
+
+
+def add_logging_args(parser):
+    parser.add_argument('--log-mode', choices=LOG_MODES, default='verbose', help='verbose: per-message lines; summary: only periodic per-topic aggregates')
+    parser.add_argument('--log-sample', type=int, default=1, help='[verbose] log 1 in N messages per topic')
+    parser.add_argument('--log-summary-interval', type=float, default=10, help='seconds between per-topic summaries (0 = off)')
@@ -0,0 +1,241 @@
+"""In-process metrics with Prometheus text exposition.
+
+Counters and histograms are sharded per thread: each updating thread owns
+its own dict of values, so the MQTT callback thread never takes a lock or
+contends with a scrape. render() sums the shards. A shard is only written
+by its own thread; readers take dict.copy(), which is atomic under the GIL,
+so a scrape may be a few updates behind but never sees a torn dict.
+When a thread exits its shard is folded into a base dict, so servers that
+start a thread per request (werkzeug's threaded=True) keep one live shard
+per running thread rather than one per thread ever seen.
+
+    registry = Registry()
+    msgs = registry.counter('dashboard_messages_total', 'Readings received', ('topic',))
+    msgs.inc('home/livingroom/temperature')
+    rtt = registry.histogram('dashboard_ack_roundtrip_seconds', 'Ack round trip')
+    rtt.observe(0.004)
+    registry.gauge('dashboard_sse_subscribers', 'Connected /stream clients', lambda: len(hub))
+    text = registry.render()
+"""
+import bisect
+import http.server
+import threading
+import weakref
+
+CONTENT_TYPE = 'text/plain; version=0.0.4; charset=utf-8'
+
+# seconds; fine at the low end where the callback path lives
+DEFAULT_BUCKETS = (0.0001, 0.00025, 0.0005, 0.001, 0.0025, 0.005, 0.01, 0.025,
+                   0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0)
+
+
+def _escape(value):
+    return str(value).replace('\\', '\\\\').replace('\n', '\\n').replace('"', '\\"')
+
+
+def _labels(names, values, extra=''):
+    parts = [f'{n}="{_escape(v)}"' for n, v in zip(names, values)]
+    if extra:
+        parts.append(extra)
+    return '{' + ','.join(parts) + '}' if parts else ''
+
+
+def _num(v):
+    if v == float('inf'):
+        return '+Inf'
+    if isinstance(v, float) and v.is_integer() and abs(v) < 1e15:
+        return str(int(v))
+    return repr(v) if isinstance(v, float) else str(v)
+
+
+class _Owner:
+    """Lives in one thread's local storage; collected when that thread exits."""
+    __slots__ = ('shard', '__weakref__')
+
+    def __init__(self, shard):
+        self.shard = shard
+
+
+class _Sharded:
+    """Per-thread value dicts, merged on read."""
+
+    def __init__(self, name, help, labels):
+        self.name = name
+        self.help = help
+        self.labels = tuple(labels)
+        self._local = threading.local()
+        self._shards = []
+        # values from threads that have exited
+        self._base = {}
+        # reentrant: a finalizer may run on a thread that is inside _snapshots
+        self._lock = threading.RLock()
+
+    def _shard(self):
+        try:
+            return self._local.owner.shard
+        except AttributeError:
+            shard = {}
+            with self._lock:
+                self._shards.append(shard)
+            owner = self._local.owner = _Owner(shard)
+            weakref.finalize(owner, self._retire, shard)
+            return shard
+
+    def _retire(self, shard):
+        with self._lock:
+            self._merge(self._base, shard)
+            self._shards.remove(shard)
+
+    def _merge(self, into, shard):
+        raise NotImplementedError
+
+    def _snapshots(self):
+        with self._lock:
+            shards = list(self._shards)
+            base = self._base.copy()
+        return [base] + [s.copy() for s in shards]
+
+    def shard_count(self):
+        return len(self._shards)
+
+
+class Counter(_Sharded):
+    kind = 'counter'
+
+    def inc(self, *labels, n=1):
+        shard = self._shard()
+        shard[labels] = shard.get(labels, 0) + n
+
+    def _merge(self, into, shard):
+        for key, v in shard.items():
+            into[key] = into.get(key, 0) + v
+
+    def values(self):
+        total = {}
+        for snap in self._snapshots():
+            for key, v in snap.items():
+                total[key] = total.get(key, 0) + v
+        return total
+
+    def collect(self):
+        for key, v in sorted(self.values().items()):
+            yield self.name, _labels(self.labels, key), v
+
+
+class Histogram(_Sharded):
+    kind = 'histogram'
+
+    def __init__(self, name, help, labels=(), buckets=DEFAULT_BUCKETS):
+        super().__init__(name, help, labels)
+        self.buckets = tuple(sorted(buckets))
+
+    def observe(self, value, *labels):
+        shard = self._shard()
+        row = shard.get(labels)
+        if row is None:
+            # per-bucket counts (last one is +Inf), then sum and count
+            row = shard[labels] = [0] * (len(self.buckets) + 1) + [0.0, 0]
+        row[bisect.bisect_left(self.buckets, value)] += 1
+        row[-2] += value
+        row[-1] += 1
+
+    def _merge(self, into, shard):
+        for key, row in shard.items():
+            acc = into.get(key)
+            into[key] = list(row) if acc is None else [a + b for a, b in zip(acc, row)]
+
+    def values(self):
+        total = {}
+        for snap in self._snapshots():
+            for key, row in snap.items():
+                row = list(row)
+                acc = total.get(key)
+                total[key] = row if acc is None else [a + b for a, b in zip(acc, row)]
+        return total
+
+    def collect(self):
+        edges = self.buckets + (float('inf'),)
+        for key, row in sorted(self.values().items()):
+            cumulative = 0
+            for edge, n in zip(edges, row):
+                cumulative += n
+                yield self.name + '_bucket', _labels(self.labels, key, f'le="{_num(edge)}"'), cumulative
+            yield self.name + '_sum', _labels(self.labels, key), row[-2]
+            yield self.name + '_count', _labels(self.labels, key), row[-1]
+
+
+class Gauge:
+    """Value read at scrape time from fn().
+
+    Without labels fn returns a number; with labels it returns an iterable
+    of (label_values_tuple, number).
+    """
+    kind = 'gauge'
+
+    def __init__(self, name, help, fn, labels=()):
+        self.name = name
+        self.help = help
+        self.fn = fn
+        self.labels = tuple(labels)
+
+    def collect(self):
+        if not self.labels:
+            yield self.name, '', self.fn()
+            return
+        for key, v in self.fn():
+            yield self.name, _labels(self.labels, key), v
+
+
+class Registry:
+    def __init__(self):
+        self._metrics = []
+
+    def _add(self, metric):
+        self._metrics.append(metric)
+        return metric
+
+    def counter(self, name, help, labels=()):
+        return self._add(Counter(name, help, labels))
+
+    def histogram(self, name, help, labels=(), buckets=DEFAULT_BUCKETS):
+        return self._add(Histogram(name, help, labels, buckets))
+
+    def gauge(self, name, help, fn, labels=()):
+        return self._add(Gauge(name, help, fn, labels))
+
+    def shard_count(self):
+        """Live per-thread shards across every counter and histogram."""
+        return sum(m.shard_count() for m in self._metrics if isinstance(m, _Sharded))
+
+    def render(self):
+        lines = []
+        for m in self._metrics:
+            lines.append(f'# HELP {m.name} {m.help}')
+            lines.append(f'# TYPE {m.name} {m.kind}')
+            for name, labels, value in m.collect():
+                lines.append(f'{name}{labels} {_num(value)}')
+        return '\n'.join(lines) + '\n'
+
+
+def serve(registry, port, host='0.0.0.0'):
+    """Expose registry.render() at http://host:port/metrics from a daemon thread."""
+
+    class Handler(http.server.BaseHTTPRequestHandler):
+        def do_GET(self):
+            if self.path.split('?')[0] != '/metrics':
+                self.send_error(404)
+                return
+            body = registry.render().encode()
+            self.send_response(200)
+            self.send_header('Content-Type', CONTENT_TYPE)
+            self.send_header('Content-Length', str(len(body)))
+            self.end_headers()
+            self.wfile.write(body)
+
+        def log_message(self, *args):
+            pass
+
+    server = http.server.ThreadingHTTPServer((host, port), Handler)
+    server.daemon_threads = True
+    threading.Thread(target=server.serve_forever, daemon=True).start()
+    return server
@@ -0,0 +1,335 @@
+import os
+import struct
+import threading
+import time
+import zlib
+
+import paho.mqtt.client as mqtt
+
+# Outbox layout: numbered segment files (00000001.seg, ...) in one directory.
+#   header   magic 'OBX1', 4 bytes reserved
+#   records  <I payload length, I crc32(topic + payload), H topic length>,
+#            topic (utf-8), payload; appended with one write each
+# A 'cursor' file holds <Q segment, Q offset> of the oldest unsent record and
+# is replaced atomically after each drained batch. Segments behind the cursor
+# are deleted; once everything is drained the write segment is truncated back
+# to its header, so a drained outbox takes no disk space.
+MAGIC = b'OBX1'
+HEADER = struct.Struct('<4s4x')
+RECORD = struct.Struct('<IIH')
+CURSOR = struct.Struct('<QQ')
+READ_CHUNK = 65536
+
+
+def _segment_name(n):
+    return f"{n:08d}.seg"
+
+
+class Outbox:
+    """Bounded, disk-backed FIFO of (topic, payload) records.
+
+    append() is called from sensor threads; peek()/commit() from the one
+    thread that drains it. Records stay on disk until commit(), so a drain
+    cut short by a disconnect, or a crash, resends from the cursor (at least
+    once). When the outbox would grow past max_bytes, the oldest segment is
+    dropped and its records counted in `dropped`. Appends are flushed to the
+    OS, not fsync'd: they survive the process dying, not the machine.
+    """
+
+    def __init__(self, directory, max_bytes=256 * 1024 * 1024, segment_bytes=4 * 1024 * 1024):
+        os.makedirs(directory, exist_ok=True)
+        self.directory = directory
+        self.max_bytes = max_bytes
+        self.segment_bytes = max(HEADER.size + 1, min(segment_bytes, max_bytes // 4))
+        self._lock = threading.Lock()
+        self._sizes = {}
+        self._counts = {}
+        self.appended = 0
+        self.drained = 0
+        self.dropped = 0
+
+        for name in sorted(os.listdir(directory)):
+            if name.endswith('.seg') and name[:-4].isdigit():
+                self._sizes[int(name[:-4])] = None
+        self._cursor = self._load_cursor()
+        for seg in sorted(self._sizes):
+            if seg < self._cursor[0]:
+                # drained before the last shutdown but not yet deleted
+                os.remove(self._path(seg))
+                del self._sizes[seg]
+                continue
+            start = self._cursor[1] if seg == self._cursor[0] else HEADER.size
+            self._sizes[seg], self._counts[seg] = self._scan(seg, start)
+        if not self._sizes:
+            self._create(self._cursor[0] or 1)
+        if self._cursor[0] not in self._sizes:
+            self._cursor = (min(self._sizes), HEADER.size)
+        self._write_seg = max(self._sizes)
+        self._writer = open(self._path(self._write_seg), 'r+b')
+        self._writer.seek(self._sizes[self._write_seg])
+        self._reader = None
+        self._reader_seg = None
+
+    def _path(self, seg):
+        return os.path.join(self.directory, _segment_name(seg))
+
+    def _load_cursor(self):
+        try:
+            with open(os.path.join(self.directory, 'cursor'), 'rb') as f:
+                return CURSOR.unpack(f.read(CURSOR.size))
+        except (OSError, struct.error):
+            return (0, HEADER.size)
+
+    def _save_cursor(self):
+        path = os.path.join(self.directory, 'cursor')
+        with open(path + '.tmp', 'wb') as f:
+            f.write(CURSOR.pack(*self._cursor))
+        os.replace(path + '.tmp', path)
+
+    def _create(self, seg):
+        with open(self._path(seg), 'wb') as f:
+            f.write(HEADER.pack(MAGIC))
+        self._sizes[seg] = HEADER.size
+        self._counts[seg] = 0
+
+    def _scan(self, seg, start):
+        """Valid size and record count after start; cuts off a torn tail."""
+        path = self._path(seg)
+        with open(path, 'r+b') as f:
+            data = f.read()
+            if data[:4] != MAGIC:
+                raise ValueError(f"{path} is not an outbox segment")
+            pos, count = start, 0
+            while pos + RECORD.size <= len(data):
+                length, crc, topic_len = RECORD.unpack_from(data, pos)
+                end = pos + RECORD.size + topic_len + length
+                if end > len(data) or zlib.crc32(data[pos + RECORD.size:end]) != crc:
+                    break
+                pos, count = end, count + 1
+            if pos < len(data):
+                # a record half-written when the process died
+                f.truncate(max(pos, start))
+        return max(pos, start), count
+
+    def __len__(self):
+        return sum(self._counts.values())
+
+    @property
+    def bytes(self):
+        return sum(self._sizes.values())
+
+    def append(self, topic, payload):
+        if isinstance(payload, str):
+            payload = payload.encode()
+        t = topic.encode()
+        body = t + payload
+        record = RECORD.pack(len(payload), zlib.crc32(body), len(t)) + body
+        with self._lock:
+            while self.bytes + len(record) > self.max_bytes and len(self._sizes) > 1:
+                self._drop_oldest()
+            size = self._sizes[self._write_seg]
+            if size + len(record) > self.segment_bytes and size > HEADER.size:
+                self._rotate()
+            self._writer.write(record)
+            self._writer.flush()
+            self._sizes[self._write_seg] += len(record)
+            self._counts[self._write_seg] += 1
+            self.appended += 1
+
+    def _rotate(self):
+        self._writer.close()
+        self._write_seg += 1
+        self._create(self._write_seg)
+        self._writer = open(self._path(self._write_seg), 'r+b')
+        self._writer.seek(HEADER.size)
+
+    def _drop_oldest(self):
+        seg = min(self._sizes)
+        self.dropped += self._counts.pop(seg)
+        del self._sizes[seg]
+        self._close_reader(seg)
+        os.remove(self._path(seg))
+        if self._cursor[0] <= seg:
+            self._cursor = (min(self._sizes), HEADER.size)
+            self._save_cursor()
+
+    def _close_reader(self, seg):
+        if self._reader is not None and self._reader_seg == seg:
+            self._reader.close()
+            self._reader = self._reader_seg = None
+
+    def peek(self, n):
+        """Up to n of the oldest records as (topic, payload), and where they end.
+
+        Never spans segments; pass the position to commit() once they are sent.
+        """
+        with self._lock:
+            seg, off = self._cursor
+            if off >= self._sizes[seg] and seg != self._write_seg:
+                # everything in this segment is sent: move on to the next one
+                self._close_reader(seg)
+                os.remove(self._path(seg))
+                del self._sizes[seg]
+                del self._counts[seg]
+                seg, off = self._cursor = (min(self._sizes), HEADER.size)
+                self._save_cursor()
+            end = self._sizes[seg]
+            if self._reader_seg != seg:
+                self._close_reader(self._reader_seg)
+                self._reader = open(self._path(seg), 'rb')
+                self._reader_seg = seg
+            reader = self._reader
+            records = []
+            buf = b''
+            pos = off
+            while len(records) < n and pos < end:
+                if len(buf) < RECORD.size:
+                    reader.seek(pos + len(buf))
+                    buf += reader.read(min(READ_CHUNK, end - pos - len(buf)))
+                length, crc, topic_len = RECORD.unpack_from(buf, 0)
+                size = RECORD.size + topic_len + length
+                if len(buf) < size:
+                    reader.seek(pos + len(buf))
+                    buf += reader.read(max(size - len(buf), min(READ_CHUNK, end - pos - len(buf))))
+                topic = buf[RECORD.size:RECORD.size + topic_len].decode()
+                records.append((topic, buf[RECORD.size + topic_len:size]))
+                buf = buf[size:]
+                pos += size
+        return records, (seg, pos)
+
+    def commit(self, position, n):
+        """Mark the records returned by peek() as sent."""
+        with self._lock:
+            seg, off = position
+            if seg != self._cursor[0] or off <= self._cursor[1]:
+                # their segment was dropped while they were being sent
+                return
+            self._cursor = position
+            self._counts[seg] -= n
+            self.drained += n
+            if seg == self._write_seg and off >= self._sizes[seg]:
+                # caught up: compact the write segment back to its header
+                self._writer.truncate(HEADER.size)
+                self._writer.seek(HEADER.size)
+                self._sizes[seg] = HEADER.size
+                self._cursor = (seg, HEADER.size)
+            self._save_cursor()
+
+    def close(self):
+        with self._lock:
+            self._writer.close()
+            self._close_reader(self._reader_seg)
+
+    def stats(self):
+        return {
+            'pending': len(self),
+            'bytes': self.bytes,
+            'segments': len(self._sizes),
+            'appended': self.appended,
+            'drained': self.drained,
+            'dropped': self.dropped,
+        }
+
+
+class OutboxPublisher:
+    """publish() for sensors that survives broker outages.
+
+    While the client is connected and nothing is queued a reading goes
+    straight to client.publish(), at QoS 1 by default: paho keeps what it
+    accepted until the broker acks it and resends it after a reconnect, which
+    covers readings written just before a dead connection is noticed. Once
+    the client knows it is disconnected readings are appended to the outbox
+    instead, so paho's own queue never grows with the outage. A background
+    thread drains the outbox once the client is connected again:
+    `batch` records at a time at QoS 1, committed only after the broker has
+    acknowledged the whole batch, paced to at most `rate` records/s so a long
+    outage replays as a steady stream instead of a burst. New readings queue
+    behind the backlog until it is empty, so per-topic order is kept. A batch
+    cut short by a disconnect is sent again from the outbox, so a reading may
+    arrive twice, never not at all.
+
+    Create it after the client's own on_connect/on_disconnect are set; it
+    wraps them to follow the connection state, since paho's is_connected()
+    stays true until its reconnect attempt starts.
+    """
+
+    def __init__(self, client, outbox, rate=200.0, batch=50, ack_timeout=10.0, qos=1):
+        self.client = client
+        self.qos = qos
+        self.outbox = outbox
+        self.rate = rate
+        self.batch = batch
+        self.ack_timeout = ack_timeout
+        self._wake = threading.Event()
+        self.online = threading.Event()
+        if client.is_connected():
+            self.online.set()
+        self.replayed = 0
+        self.batches = 0
+        self.retries = 0
+        on_connect, on_disconnect = client.on_connect, client.on_disconnect
+
+        def _on_connect(c, u, flags, rc):
+            if rc == 0:
+                self.online.set()
+                self._wake.set()
+            if on_connect is not None:
+                on_connect(c, u, flags, rc)
+
+        def _on_disconnect(c, u, rc):
+            self.online.clear()
+            if on_disconnect is not None:
+                on_disconnect(c, u, rc)
+
+        client.on_connect = _on_connect
+        client.on_disconnect = _on_disconnect
+
+    def start(self):
+        threading.Thread(target=self._run, daemon=True).start()
+        return self
+
+    def publish(self, topic, payload):
+        if not len(self.outbox) and self.online.is_set():
+            info = self.client.publish(topic, payload, qos=self.qos)
+            if info.rc == mqtt.MQTT_ERR_SUCCESS or (self.qos and info.rc == mqtt.MQTT_ERR_NO_CONN):
+                return True
+        self.outbox.append(topic, payload)
+        self._wake.set()
+        return False
+
+    def _run(self):
+        while True:
+            if not len(self.outbox) or not self.online.is_set():
+                self._wake.wait(0.5)
+                self._wake.clear()
+                continue
+            t0 = time.monotonic()
+            records, end = self.outbox.peek(self.batch)
+            if records and self._send(records):
+                self.outbox.commit(end, len(records))
+                self.replayed += len(records)
+                self.batches += 1
+            elif records:
+                self.retries += 1
+            # pace the replay: a batch of n may go out every n / rate seconds
+            time.sleep(max(0.0, len(records) / self.rate - (time.monotonic() - t0)))
+
+    def _send(self, records):
+        sent = []
+        for topic, payload in records:
+            info = self.client.publish(topic, payload, qos=1)
+            if info.rc != mqtt.MQTT_ERR_SUCCESS:
+                return False
+            sent.append(info)
+        deadline = time.monotonic() + self.ack_timeout
+        for info in sent:
+            while not info.is_published():
+                left = deadline - time.monotonic()
+                if left <= 0 or not self.online.is_set():
+                    return False
+                info.wait_for_publish(min(left, 0.5))
+        return True
+
+    def stats(self):
+        return dict(self.outbox.stats(), replayed=self.replayed, batches=self.batches, retries=self.retries,
+                    rate=self.rate)
@@ -0,0 +1,155 @@
+"""Compact fixed-layout binary payloads, used alongside JSON.
+
+A JSON reading is ~120 bytes (36-char uuid, sensor id string, value, ts) and
+its ack repeats the uuid. The binary layout carries the same fields in 38
+bytes: a 16-byte raw id and a numeric sensor index instead of strings.
+
+    reading    <B B 16s I d q>  magic, READING, id, sensor index, value, ts ms
+    ack        <B B 16s q>      magic, ACK, original id, ts ms
+    batch ack  <B B H q> + n*16s  magic, ACK_BATCH, n, ts ms, original ids
+
+Every binary payload starts with MAGIC (0xB1), a UTF-8 continuation byte
+that can never start a JSON document, so a receiver tells the formats apart
+from the first byte. Binary ids travel as 32-char hex strings once decoded.
+
+Sensor indices are handed out per process by sensor_index(): a random
+INDEX_PREFIX_BITS prefix drawn at startup and a sequence number below it, so
+two sensors of one publisher never share an index (a hash of the id would,
+eventually). Publishers announce index -> id mappings on ANNOUNCE_TOPIC
+(JSON) when they connect and periodically, which is how the dashboard learns
+the names it needs for acks and `latest`; two publishers drawing the same
+prefix is possible, rare, and logged by the dashboard when an announcement
+remaps an index another sensor holds.
+"""
+import json
+import os
+import struct
+import threading
+
+CODECS = ('json', 'binary')
+MAGIC = 0xB1
+READING, ACK, ACK_BATCH = 1, 2, 3
+ANNOUNCE_TOPIC = 'sensors/announce'
+ANNOUNCE_INTERVAL = 10.0
+
+_READING = struct.Struct('<BB16sIdq')
+_ACK = struct.Struct('<BB16sq')
+_BATCH = struct.Struct('<BBHq')
+_MAGIC_BYTE = bytes([MAGIC])
+
+
+# 14 bits of publisher prefix, 18 of sequence: 262144 binary sensors per process
+INDEX_PREFIX_BITS = 14
+INDEX_SEQ_BITS = 32 - INDEX_PREFIX_BITS
+
+
+class IndexAllocator:
+    """sensor id -> a uint32 index no other sensor of this allocator has."""
+
+    def __init__(self, prefix=None):
+        if prefix is None:
+            # not random.getrandbits: publishers started with the same --seed
+            # would all draw the same prefix
+            prefix = int.from_bytes(os.urandom(2), 'little') >> (16 - INDEX_PREFIX_BITS)
+        self.prefix = prefix
+        self._lock = threading.Lock()
+        self._indices = {}
+
+    def index(self, sensor_id):
+        with self._lock:
+            index = self._indices.get(sensor_id)
+            if index is None:
+                seq = len(self._indices)
+                if seq >= 1 << INDEX_SEQ_BITS:
+                    raise OverflowError(f"more than {1 << INDEX_SEQ_BITS} binary sensors in one process")
+                index = self._indices[sensor_id] = self.prefix << INDEX_SEQ_BITS | seq
+            return index
+
+    def __len__(self):
+        return len(self._indices)
+
+
+_allocator = IndexAllocator()
+
+
+def sensor_index(sensor_id):
+    """This process's index for sensor_id; the same id always gets the same one."""
+    return _allocator.index(sensor_id)
+
+
+def is_binary(raw):
+    return raw[:1] == _MAGIC_BYTE
+
+
+def parse_prefixes(spec):
+    """'home/livingroom,home/entrance' -> ('home/livingroom', 'home/entrance')"""
+    return tuple(p.strip() for p in (spec or '').split(',') if p.strip())
+
+
+def codec_for(topic, binary_prefixes):
+    return 'binary' if binary_prefixes and topic.startswith(binary_prefixes) else 'json'
+
+
+def encode_reading(msg_id, index, value, ts):
+    """msg_id is 16 raw bytes."""
+    return _READING.pack(MAGIC, READING, msg_id, index, value, ts)
+
+
+def encode_ack(body):
+    """Binary form of an AckAggregator body ({'origId' | 'origIds', 'ts', ...})."""
+    ids = body.get('origIds')
+    if ids is None:
+        return _ACK.pack(MAGIC, ACK, bytes.fromhex(body['origId']), body['ts'])
+    return _BATCH.pack(MAGIC, ACK_BATCH, len(ids), body['ts']) + bytes.fromhex(''.join(ids))
+
+
+def _expect(raw, size, what):
+    if len(raw) != size:
+        raise ValueError(f"{what} is {len(raw)} bytes, expected {size}")
+
+
+def decode(raw):
+    """Binary payload -> the dict its JSON counterpart would parse to.
+
+    Readings come back with 'index' instead of 'sensor'; acks are always
+    from the dashboard, the only side that sends binary acks.
+    """
+    if len(raw) < 2:
+        raise ValueError(f"binary payload of {len(raw)} bytes has no type")
+    kind = raw[1]
+    if kind == READING:
+        _expect(raw, _READING.size, 'reading')
+        _, _, msg_id, index, value, ts = _READING.unpack(raw)
+        if value.is_integer():
+            value = int(value)
+        return {'id': msg_id.hex(), 'index': index, 'value': value, 'ts': ts}
+    if kind == ACK:
+        _expect(raw, _ACK.size, 'ack')
+        _, _, msg_id, ts = _ACK.unpack(raw)
+        return {'origId': msg_id.hex(), 'ts': ts, 'from': 'dashboard'}
+    if kind == ACK_BATCH:
+        if len(raw) < _BATCH.size:
+            raise ValueError(f"batch ack of {len(raw)} bytes is shorter than its header")
+        _, _, n, ts = _BATCH.unpack_from(raw)
+        # n comes from the frame: a short or padded body is rejected, not truncated
+        _expect(raw, _BATCH.size + 16 * n, f'batch ack of {n} ids')
+        h = raw[_BATCH.size:].hex()
+        ids = [h[i:i + 32] for i in range(0, 32 * n, 32)]
+        return {'origIds': ids, 'ts': ts, 'from': 'dashboard'}
+    raise ValueError(f"unknown binary payload type {kind}")
+
+
+def loads(raw):
+    """Decode either format, detected from the first byte."""
+    if is_binary(raw):
+        return decode(raw)
+    return json.loads(raw)
+
+
+def announce_message(sensors, heartbeat=None):
+    """sensors: iterable of (sensor id, topic); heartbeat (s) when they report by exception."""
+    entries = [{'index': sensor_index(s), 'sensor': s, 'topic': t} for s, t in sensors]
+    if heartbeat is not None:
+        for entry in entries:
+            entry['hb'] = heartbeat
+    return json.dumps({'sensors': entries})
@@ -1,5 +1,8 @@
 import argparse
+import collections
+import heapq
 import json
+import logging
 import random
 import math
 import threading
@@ -8,70 +11,347 @@ import uuid
 
 import paho.mqtt.client as mqtt
 
+from loadgen import LoadGenerator
+from log_pipeline import HotPathLog, add_logging_args, setup_logging
+import metrics
+from outbox import Outbox, OutboxPublisher
+import payload_codec
+from sensor_sim import SimulationEngine
+from tracing import Tracer, add_tracing_args
+
+# per-message log lines go through hot (sampled, counted); main() wires both
+# to a background queue writer
+log = logging.getLogger('publisher')
+hot = HotPathLog(log)
+# writes ack_recv lines for readings picked by the same sampling as the
+# dashboard's; main() sets the rate and the trace file
+tracer = Tracer()
+
+# same counters as the dashboard's /metrics, served with --metrics-port
+registry = metrics.Registry()
+messages_total = registry.counter('publisher_messages_total', 'Readings published', ('topic',))
+acks_total = registry.counter('publisher_acks_total', 'Reading ids acknowledged', ('topic',))
+malformed_total = registry.counter('publisher_malformed_acks_total', 'Ack payloads that could not be parsed', ('topic',))
+suppressed_total = registry.counter('publisher_suppressed_total', 'Readings not sent because they stayed inside the deadband', ('topic',))
+publish_errors_total = registry.counter('publisher_publish_errors_total', 'Readings that raised instead of publishing', ('topic',))
+ack_roundtrip = registry.histogram('publisher_ack_roundtrip_seconds', 'Reading published to its ack received')
+# the ack's ts is when the dashboard published it: the first hop is on both
+# clocks, the second ends on this one
+hop_seconds = registry.histogram('publisher_hop_seconds', 'Reading published to ack published, and ack published to received', ('hop',))
+schedule_drift = registry.histogram('publisher_schedule_drift_seconds', 'Actual minus planned publish time')
+
+# readings buffered on disk while the broker is unreachable; set up in main()
+# unless --outbox-dir is empty
+outbox = None
+
+def _outbox_stat(key):
+    return lambda: outbox.stats()[key] if outbox is not None else 0
+
+registry.gauge('publisher_outbox_pending', 'Readings waiting in the outbox', _outbox_stat('pending'))
+registry.gauge('publisher_outbox_bytes', 'Outbox size on disk', _outbox_stat('bytes'))
+registry.gauge('publisher_outbox_replayed', 'Readings sent from the outbox after a reconnect', _outbox_stat('replayed'))
+registry.gauge('publisher_outbox_dropped', 'Readings dropped because the outbox was full', _outbox_stat('dropped'))
+
+# per-sensor cap on reading ids remembered for ack round-trip timing
+INFLIGHT_MAX = 1024
+
+# --publish-mode exception: a reading is sent only when it moved more than
+# this from the last one sent (0 = any change), or when the sensor has been
+# quiet for the heartbeat. Sized a little above each generator's noise
+DEADBANDS = {
+    'temperature': 0.5,
+    'humidity': 3,
+    'light': 100,
+    'motion': 0,
+    'door': 0,
+}
+HEARTBEAT = 60.0
+
+def _register_resubscribe(client, topic):
+    # register ack topic in client's userdata so on reconnect we can re-subscribe
+    try:
+        ud = getattr(client, '_userdata', None)
+        if isinstance(ud, dict):
+            ud.setdefault('sensors', []).append(topic)
+    except Exception:
+        pass
+
+
+class ScheduleStats:
+    """Messages sent and schedule drift (actual minus planned send time)."""
+
+    def __init__(self, window=10000):
+        self._lock = threading.Lock()
+        self._drifts = collections.deque(maxlen=window)
+        self.sent = 0
+        self.suppressed = 0
+        self.max_drift = 0.0
+        self.started = time.monotonic()
+        self._last_sent = 0
+        self._last_t = self.started
+
+    def record(self, drift):
+        schedule_drift.observe(drift)
+        with self._lock:
+            self.sent += 1
+            self._drifts.append(drift)
+            if drift > self.max_drift:
+                self.max_drift = drift
+
+    def skip(self):
+        with self._lock:
+            self.suppressed += 1
+
+    def report(self):
+        """Rate since the previous report plus drift over the recent window."""
+        with self._lock:
+            now = time.monotonic()
+            rate = (self.sent - self._last_sent) / max(now - self._last_t, 1e-9)
+            self._last_sent, self._last_t = self.sent, now
+            drifts = sorted(self._drifts)
+        pick = lambda p: drifts[min(len(drifts) - 1, int(p * len(drifts)))] * 1000 if drifts else 0.0
+        return {
+            'sent': self.sent,
+            'suppressed': self.suppressed,
+            'msgs_per_s': rate,
+            'drift_p50_ms': pick(0.50),
+            'drift_p99_ms': pick(0.99),
+            'drift_max_ms': self.max_drift * 1000,
+        }
+
+
+class AckRouter:
+    """One 'ack/+' subscription dispatched to sensors by id.
+
+    Large generated fleets use this instead of one subscription per sensor.
+    """
+
+    def __init__(self, client):
+        self.sensors = {}
+        client.message_callback_add('ack/+', self._on_ack)
+        client.subscribe('ack/+')
+        _register_resubscribe(client, 'ack/+')
+
+    def add(self, sensor):
+        self.sensors[sensor.id] = sensor
+
+    def _on_ack(self, client, userdata, msg):
+        sensor = self.sensors.get(msg.topic[4:])
+        if sensor is not None:
+            sensor._on_ack(client, userdata, msg)
+
+
+def start_announcer(client, sensors, heartbeat=None):
+    """Announce index -> id for binary sensors now, on reconnect and every ANNOUNCE_INTERVAL.
+
+    sensors: list of (sensor id, topic). Binary readings have no room for the
+    heartbeat, so it travels here instead.
+    """
+    if not sensors:
+        return
+    message = payload_codec.announce_message(sensors, heartbeat)
+    ud = getattr(client, '_userdata', None)
+    if isinstance(ud, dict):
+        ud['announce'] = message
+
+    def _run():
+        while True:
+            client.publish(payload_codec.ANNOUNCE_TOPIC, message)
+            time.sleep(payload_codec.ANNOUNCE_INTERVAL)
+
+    threading.Thread(target=_run, daemon=True).start()
+
+
 class Sensor(threading.Thread):
-    def __init__(self, client, sensor_id, display_name, topic, interval, generator):
+    def __init__(self, client, sensor_id, display_name, topic, interval, generator, ack_router=None, stats=None, codec='json', outbox=None,
+                 deadband=None, heartbeat=HEARTBEAT):
         super().__init__(daemon=True)
         self.client = client
+        # an OutboxPublisher keeps readings made while disconnected
+        self.send = outbox.publish if outbox is not None else client.publish
         self.id = sensor_id
         self.display_name = display_name
         self.topic = topic
         self.interval = interval
         self.generator = generator
+        self.stats = stats
+        self.codec = codec
+        self.index = payload_codec.sensor_index(sensor_id) if codec == 'binary' else None
         self.acked = None
+        # report by exception when deadband is set: last value sent and when
+        self.deadband = deadband
+        self.heartbeat = heartbeat
+        self._sent_value = None
+        self._sent_at = 0.0
+        self._inflight = {}
+        self.errors = 0
         self._stop = threading.Event()
 
         # subscribe to ack topic
         self.ack_topic = f"ack/{self.id}"
-        self.client.message_callback_add(self.ack_topic, self._on_ack)
-        self.client.subscribe(self.ack_topic)
-        # register ack topic in client's userdata so on reconnect we can re-subscribe
-        try:
-            ud = getattr(client, '_userdata', None)
-            if isinstance(ud, dict):
-                ud.setdefault('sensors', []).append(self.ack_topic)
-        except Exception:
-            pass
+        if ack_router is not None:
+            ack_router.add(self)
+        else:
+            self.client.message_callback_add(self.ack_topic, self._on_ack)
+            self.client.subscribe(self.ack_topic)
+            _register_resubscribe(client, self.ack_topic)
+
+    def _acked(self, ids, ack_ts=None):
+        now = time.time()
+        acks_total.inc(self.topic, n=len(ids))
+        for msg_id in ids:
+            sent = self._inflight.pop(msg_id, None)
+            if sent is None:
+                continue
+            ack_roundtrip.observe(now - sent)
+            if ack_ts is None:
+                continue
+            hop_seconds.observe(max(0, ack_ts / 1000.0 - sent), 'publish_to_ack_publish')
+            hop_seconds.observe(max(0, now - ack_ts / 1000.0), 'ack_publish_to_receive')
+            if tracer.path and tracer.sampled(msg_id):
+                tracer.record('ack_recv', msg_id, topic=self.topic, sent=round(sent * 1000, 3), ack_ts=ack_ts,
+                              t=round(now * 1000, 3))
 
     def _on_ack(self, client, userdata, msg):
         try:
-            payload = json.loads(msg.payload.decode())
+            payload = payload_codec.loads(msg.payload)
+            # batched acks from --ack-mode batch carry a list of ids
+            ids = payload.get('origIds')
+            ack_ts = payload.get('ts')
+            if not isinstance(ack_ts, (int, float)):
+                ack_ts = None
+            if ids:
+                self._acked(ids, ack_ts)
+                hot.hot('ack', self.topic, "[ACK RECEIVED] %s <- batch ack for %d msgs (last %s)", self.display_name, len(ids), ids[-1])
+                self.acked = ids[-1]
+                return
             orig = payload.get('origId')
-            print(f"[ACK RECEIVED] {self.display_name} <- ack for msg {orig}")
+            self._acked([orig], ack_ts)
+            hot.hot('ack', self.topic, "[ACK RECEIVED] %s <- ack for msg %s", self.display_name, orig)
             self.acked = orig
         except Exception as e:
-            print("Malformed ack", e)
+            malformed_total.inc(self.topic)
+            hot.malformed(self.topic, "Malformed ack %s", e)
 
     def stop(self):
         self._stop.set()
 
-    def run(self):
-        while not self._stop.is_set():
-            val = self.generator()
+    def next_delay(self):
+        # interval with random jitter
+        return max(0.0, self.interval + random.uniform(-0.7, 0.7))
+
+    def unchanged(self, val, now):
+        """True when val is inside the deadband of the last reading sent and the heartbeat isn't due."""
+        if self.deadband is None or self._sent_value is None or now - self._sent_at >= self.heartbeat:
+            return False
+        return abs(val - self._sent_value) <= self.deadband
+
+    def publish_once(self):
+        val = self.generator()
+        now = time.monotonic()
+        if self.unchanged(val, now):
+            suppressed_total.inc(self.topic)
+            if self.stats is not None:
+                self.stats.skip()
+            return
+        self._sent_value, self._sent_at = val, now
+        if self.codec == 'binary':
+            raw_id = uuid.uuid4().bytes
+            message = {'id': raw_id.hex(), 'sensor': self.id, 'value': val, 'ts': int(time.time() * 1000)}
+            payload = payload_codec.encode_reading(raw_id, self.index, val, message['ts'])
+        else:
             message = {
                 'id': str(uuid.uuid4()),
                 'sensor': self.id,
                 'value': val,
                 'ts': int(time.time() * 1000)
             }
-            self.client.publish(self.topic, json.dumps(message))
-            print(f"[PUBLISH] {self.topic} -> {message}")
-            
-            # wait with random jitter
-            time.sleep(self.interval + random.uniform(-0.7, 0.7))
+            if self.deadband is not None:
+                # quiet is not down: the dashboard holds the value this long
+                message['hb'] = self.heartbeat
+            payload = json.dumps(message)
+        if len(self._inflight) >= INFLIGHT_MAX:
+            # never acked (dashboard down, dropped): forget the oldest
+            self._inflight.pop(next(iter(self._inflight)), None)
+        self._inflight[message['id']] = time.time()
+        self.send(self.topic, payload)
+        messages_total.inc(self.topic)
+        hot.hot('publish', self.topic, "[PUBLISH] %s -> %s", self.topic, message)
 
+    def publish_guarded(self):
+        """publish_once, with a failure logged and counted instead of ending the caller's loop."""
+        try:
+            self.publish_once()
+        except Exception:
+            self.errors += 1
+            publish_errors_total.inc(self.topic)
+            # the traceback once, then a reminder every 100 so a broken generator doesn't flood the log
+            if self.errors == 1:
+                log.exception("Publishing %s failed; the sensor stays scheduled", self.id)
+            elif self.errors % 100 == 0:
+                log.warning("Publishing %s has failed %d times", self.id, self.errors)
+
+    def run(self):
+        due = time.monotonic()
+        while not self._stop.is_set():
+            if self.stats is not None:
+                self.stats.record(time.monotonic() - due)
+            self.publish_guarded()
 
-def temp_gen():
+            delay = self.next_delay()
+            due = time.monotonic() + delay
+            time.sleep(delay)
+
+
+class SensorScheduler(threading.Thread):
+    """Drive any number of sensors from one thread.
+
+    A min-heap holds each sensor's next due time. Sensors keep the same
+    interval + jitter semantics as Sensor.run, but the next due time is
+    computed from the planned one rather than from when the publish actually
+    happened, so a busy loop doesn't stretch every sensor's period.
+    """
+
+    def __init__(self, sensors, stats=None):
+        super().__init__(daemon=True)
+        self.stats = stats
+        self._halt = threading.Event()
+        now = time.monotonic()
+        # spread first publishes over one interval so a big fleet doesn't burst
+        self._heap = [(now + random.uniform(0, s.interval), i, s) for i, s in enumerate(sensors)]
+        heapq.heapify(self._heap)
+
+    def stop(self):
+        self._halt.set()
+
+    def run(self):
+        heap = self._heap
+        while heap and not self._halt.is_set():
+            due, seq, sensor = heap[0]
+            now = time.monotonic()
+            if due > now:
+                self._halt.wait(due - now)
+                continue
+            if self.stats is not None:
+                self.stats.record(now - due)
+            # one failing sensor must not take the thread, and every other sensor, down with it
+            sensor.publish_guarded()
+            # never schedule into the past: an overloaded loop sheds rather than bursts
+            heapq.heapreplace(heap, (max(due + sensor.next_delay(), now), seq, sensor))
+
+
+def temp_gen(clock=time.time):
     """Generate realistic temperature readings (18-26°C with sine wave variation)"""
     base_temp = 22.0
-    variation = 4.0 * math.sin(time.time() / 60)
+    variation = 4.0 * math.sin(clock() / 60)
     noise = random.uniform(-0.5, 0.5)
     return round(base_temp + variation + noise, 1)
 
 
-def humidity_gen():
+def humidity_gen(clock=time.time):
     """Generate realistic humidity readings (30-60%)"""
     base_humidity = 45
-    variation = 10 * math.sin(time.time() / 90)
+    variation = 10 * math.sin(clock() / 90)
     noise = random.randint(-3, 3)
     return max(30, min(60, int(base_humidity + variation + noise)))
 
@@ -82,10 +362,10 @@ def motion_gen():
     return 1 if random.random() < 0.15 else 0
 
 
-def light_gen():
+def light_gen(clock=time.time):
     """Generate realistic light level readings (0-1200 lux)"""
     # Simulate day/night cycle
-    base = 400 + 600 * (0.5 + 0.5 * math.sin(time.time() / 300))
+    base = 400 + 600 * (0.5 + 0.5 * math.sin(clock() / 300))
     noise = random.uniform(-100, 100)
     return max(0, min(1200, int(base + noise)))
 
@@ -96,11 +376,128 @@ def door_gen():
     return 1 if random.random() < 0.10 else 0
 
 
+# (room, kind, display label, interval seconds, generator)
+SENSOR_SPECS = [
+    ('livingroom', 'temperature', 'Temperature', 4, temp_gen),
+    ('livingroom', 'humidity', 'Humidity', 6, humidity_gen),
+    ('entrance', 'motion', 'Motion', 3, motion_gen),
+    ('livingroom', 'light', 'Light Level', 5, light_gen),
+    ('entrance', 'door', 'Door', 7, door_gen),
+]
+
+
+def make_id(room, kind):
+    """Generate readable sensor ID: <room>-<kind>-<6hex>"""
+    return f"{room}-{kind}-{uuid.uuid4().hex[:6]}"
+
+
+def build_sensors(client, per_topic=1, ack_router=None, stats=None, binary_prefixes=(), outbox=None, engine=None,
+                  deadbands=None, heartbeat=HEARTBEAT):
+    """Create per_topic sensors for each SENSOR_SPECS entry.
+
+    The first copy keeps the original topic (home/livingroom/temperature);
+    extra copies get numbered rooms (home/livingroom2/temperature, ...).
+    Sensors whose topic starts with one of binary_prefixes publish the
+    compact binary encoding instead of JSON. With a SimulationEngine their
+    values come from its batched per-kind ticks instead of the generators.
+    With deadbands (kind -> deadband) they report by exception.
+    """
+    sensors = []
+    for room, kind, label, interval, generator in SENSOR_SPECS:
+        for i in range(per_topic):
+            r = room if i == 0 else f"{room}{i + 1}"
+            topic = f"home/{r}/{kind}"
+            sensors.append(Sensor(
+                client,
+                make_id(r, kind),
+                f"{label} ({r.capitalize()})",
+                topic,
+                interval,
+                engine.add(kind) if engine is not None else generator,
+                ack_router=ack_router,
+                stats=stats,
+                codec=payload_codec.codec_for(topic, binary_prefixes),
+                outbox=outbox,
+                deadband=deadbands.get(kind) if deadbands is not None else None,
+                heartbeat=heartbeat,
+            ))
+    return sensors
+
+
+def parse_deadbands(spec):
+    """'temperature=0.2,light=50' -> DEADBANDS with those kinds overridden."""
+    deadbands = dict(DEADBANDS)
+    for item in (spec or '').split(','):
+        if not item.strip():
+            continue
+        kind, _, value = item.partition('=')
+        kind = kind.strip()
+        if kind not in deadbands:
+            raise ValueError(f"no sensor kind {kind!r} (one of {', '.join(deadbands)})")
+        deadbands[kind] = float(value)
+    return deadbands
+
+
+def run_load(client, args):
+    gen = LoadGenerator(client, SENSOR_SPECS, args.sensors, args.rate, args.payload_size,
+                        binary_prefixes=payload_codec.parse_prefixes(args.binary_topics),
+                        on_publish=messages_total.inc, on_ack=ack_roundtrip.observe)
+    start_announcer(client, gen.binary_sensors)
+    # give the connection and the ack subscription a moment to settle
+    time.sleep(1)
+    print(f"\n=== Load: {args.rate:.0f} msgs/s from {args.sensors} sensors for {args.duration:.0f}s ===")
+    try:
+        elapsed = gen.run(args.duration)
+        print(f"Waiting {args.ack_wait:.0f}s for trailing acks...")
+        time.sleep(args.ack_wait)
+    except KeyboardInterrupt:
+        elapsed = args.duration
+    print(gen.report(elapsed))
+    client.loop_stop()
+    client.disconnect()
+
+
 def main():
     parser = argparse.ArgumentParser(description='MQTT Sensor Publisher')
     parser.add_argument('--broker', default='localhost', help='MQTT broker address')
     parser.add_argument('--port', type=int, default=1883, help='MQTT broker port')
+    parser.add_argument('--scheduler', choices=('loop', 'threads'), default='loop', help='loop: one heap-scheduled thread for all sensors; threads: one thread per sensor')
+    parser.add_argument('--sensors-per-topic', type=int, default=1, help='how many sensors to simulate for each topic pattern')
+    parser.add_argument('--report-interval', type=float, default=10, help='seconds between throughput/drift reports (0 = off)')
+    add_logging_args(parser)
+    add_tracing_args(parser)
+    parser.add_argument('--metrics-port', type=int, default=0, help='serve Prometheus metrics at http://0.0.0.0:PORT/metrics (0 = off)')
+    parser.add_argument('--outbox-dir', default='outbox_data', help="directory for readings buffered while the broker is down ('' disables it)")
+    parser.add_argument('--outbox-max-mb', type=float, default=256, help='outbox size cap; the oldest readings are dropped beyond it')
+    parser.add_argument('--replay-rate', type=float, default=200, help='readings per second sent from the outbox after a reconnect')
+    parser.add_argument('--replay-batch', type=int, default=50, help='outbox readings per QoS 1 batch')
+    parser.add_argument('--engine', choices=('scalar', 'vector'), default='scalar', help='scalar: one generator call per reading; vector: batched per-kind ticks (NumPy when installed)')
+    parser.add_argument('--seed', type=int, help='seed sensor values and interval jitter for reproducible runs')
+    parser.add_argument('--sim-tick', type=float, default=1.0, help='[vector] seconds between recomputing every sensor value')
+    parser.add_argument('--publish-mode', choices=('interval', 'exception'), default='interval', help='interval: send every reading; exception: only readings that left the deadband, plus a heartbeat')
+    parser.add_argument('--deadband', default='', help='[exception] per-kind overrides, e.g. temperature=0.2,light=50 (defaults: ' + ', '.join(f'{k}={v}' for k, v in DEADBANDS.items()) + ')')
+    parser.add_argument('--heartbeat', type=float, default=HEARTBEAT, help='[exception] longest a sensor stays quiet, seconds; keep it above the publish intervals')
+    parser.add_argument('--binary-topics', default='', help='comma-separated topic prefixes that publish the compact binary encoding (e.g. home/livingroom)')
+    parser.add_argument('--mode', choices=('simulate', 'load'), default='simulate', help='simulate: realistic sensors; load: publish at a fixed rate to find saturation')
+    parser.add_argument('--rate', type=float, default=1000, help='[load] target messages per second')
+    parser.add_argument('--sensors', type=int, default=100, help='[load] number of distinct sensor ids')
+    parser.add_argument('--duration', type=float, default=30, help='[load] seconds to publish for')
+    parser.add_argument('--payload-size', type=int, default=0, help='[load] pad each JSON payload to this many bytes')
+    parser.add_argument('--ack-wait', type=float, default=3, help='[load] seconds to wait for trailing acks')
     args = parser.parse_args()
+    try:
+        deadbands = parse_deadbands(args.deadband) if args.publish_mode == 'exception' else None
+    except ValueError as e:
+        parser.error(f"--deadband: {e}")
+
+    global log, hot, outbox
+    log, hot = setup_logging('publisher', args.log_mode, args.log_sample, args.log_summary_interval)
+    tracer.sample = args.trace_sample
+    tracer.path = args.trace_file or None
+    tracer.start()
+    if args.metrics_port:
+        metrics.serve(registry, args.metrics_port)
+        print(f"✓ Metrics on http://0.0.0.0:{args.metrics_port}/metrics")
 
     # Create MQTT client with userdata to track sensors
     userdata = {'sensors': []}
@@ -109,29 +506,31 @@ def main():
 
     # reconnect/backoff handler
     def on_connect(c, u, flags, rc):
-        print(f"Publisher connected to broker, rc={rc}")
+        log.info("Publisher connected to broker, rc=%s", rc)
         # re-subscribe to ack topics registered earlier
         for t in u.get('sensors', []):
             try:
                 c.subscribe(t)
-                print(f"Re-subscribed to {t}")
+                log.info("Re-subscribed to %s", t)
             except Exception:
                 pass
+        if u.get('announce'):
+            c.publish(payload_codec.ANNOUNCE_TOPIC, u['announce'])
 
     def on_disconnect(c, u, rc):
         if rc == 0:
-            print("Publisher disconnected cleanly")
+            log.info("Publisher disconnected cleanly")
             return
-        print(f"Unexpected publisher disconnect (rc={rc}), attempting reconnect...")
+        log.warning("Unexpected publisher disconnect (rc=%s), attempting reconnect...", rc)
         def _reconnect_loop():
             delay = 1
             while True:
                 try:
                     c.reconnect()
-                    print("Publisher reconnected to broker")
+                    log.info("Publisher reconnected to broker")
                     break
                 except Exception as e:
-                    print(f"Reconnect failed: {e}; retrying in {delay}s")
+                    log.warning("Reconnect failed: %s; retrying in %ss", e, delay)
                     time.sleep(delay)
                     delay = min(delay * 2, 60)
         threading.Thread(target=_reconnect_loop, daemon=True).start()
@@ -145,76 +544,80 @@ def main():
     try:
         client.connect(args.broker, args.port, keepalive=60)
     except Exception as e:
-        print(f"Initial connect failed: {e}; background reconnect will be attempted")
+        log.warning("Initial connect failed: %s; background reconnect will be attempted", e)
     client.loop_start()
     print("Publisher MQTT loop started")
 
-    def make_id(room, kind):
-        """Generate readable sensor ID: <room>-<kind>-<6hex>"""
-        return f"{room}-{kind}-{uuid.uuid4().hex[:6]}"
-
-    # Create sensors with different intervals
-    sensors = [
-        Sensor(
-            client,
-            make_id('livingroom', 'temperature'),
-            'Temperature (Livingroom)',
-            'home/livingroom/temperature',
-            4,
-            temp_gen
-        ),
-        Sensor(
-            client,
-            make_id('livingroom', 'humidity'),
-            'Humidity (Livingroom)',
-            'home/livingroom/humidity',
-            6,
-            humidity_gen
-        ),
-        Sensor(
-            client,
-            make_id('entrance', 'motion'),
-            'Motion (Entrance)',
-            'home/entrance/motion',
-            3,
-            motion_gen
-        ),
-        Sensor(
-            client,
-            make_id('livingroom', 'light'),
-            'Light Level (Livingroom)',
-            'home/livingroom/light',
-            5,
-            light_gen
-        ),
-        Sensor(
-            client,
-            make_id('entrance', 'door'),
-            'Door (Entrance)',
-            'home/entrance/door',
-            7,
-            door_gen
-        ),
-    ]
+    if args.mode == 'load':
+        run_load(client, args)
+        return
+
+    if args.outbox_dir:
+        outbox = OutboxPublisher(client, Outbox(args.outbox_dir, int(args.outbox_max_mb * 1024 * 1024)),
+                                 args.replay_rate, args.replay_batch).start()
+        if len(outbox.outbox):
+            print(f"✓ {len(outbox.outbox)} readings left in {args.outbox_dir} from the last run will be replayed")
+
+    if args.seed is not None:
+        random.seed(args.seed)
+    engine = None
+    if args.engine == 'vector':
+        engine = SimulationEngine(args.seed, args.sim_tick)
+        print(f"✓ Vectorized sensor values ({engine.backend} backend, tick {args.sim_tick}s)")
+
+    stats = ScheduleStats()
+    # one shared ack subscription once the fleet is bigger than the demo set
+    ack_router = AckRouter(client) if args.sensors_per_topic > 1 else None
+    sensors = build_sensors(client, args.sensors_per_topic, ack_router, stats,
+                            payload_codec.parse_prefixes(args.binary_topics), outbox, engine,
+                            deadbands, args.heartbeat)
+    start_announcer(client, [(s.id, s.topic) for s in sensors if s.codec == 'binary'],
+                    args.heartbeat if deadbands is not None else None)
+    if deadbands is not None:
+        print(f"✓ Reporting by exception (heartbeat {args.heartbeat:.0f}s, deadbands "
+              + ', '.join(f'{k}={v}' for k, v in deadbands.items()) + ')')
 
     # Start all sensors
     print("\n=== Starting sensors ===")
-    for s in sensors:
-        s.start()
-        print(f"✓ Started: {s.display_name} (ID: {s.id})")
+    scheduler = None
+    if args.scheduler == 'loop':
+        scheduler = SensorScheduler(sensors, stats)
+        scheduler.start()
+    else:
+        for s in sensors:
+            s.start()
+    if len(sensors) <= 20:
+        for s in sensors:
+            print(f"✓ Started: {s.display_name} (ID: {s.id})")
+    else:
+        print(f"✓ Started {len(sensors)} sensors ({args.sensors_per_topic} per topic, scheduler={args.scheduler})")
 
     print("\n=== Sensors are running ===")
     print("Press Ctrl-C to stop.\n")
 
     try:
+        last_report = time.monotonic()
         while True:
             time.sleep(1)
+            if args.report_interval and time.monotonic() - last_report >= args.report_interval:
+                last_report = time.monotonic()
+                r = stats.report()
+                log.info("[STATS] %.1f msgs/s, drift p50=%.1fms p99=%.1fms max=%.1fms, total=%d, suppressed=%d",
+                         r['msgs_per_s'], r['drift_p50_ms'], r['drift_p99_ms'], r['drift_max_ms'], r['sent'], r['suppressed'])
+                if outbox is not None and (len(outbox.outbox) or outbox.outbox.dropped):
+                    o = outbox.stats()
+                    log.info("[OUTBOX] %d pending (%.1f MB), %d replayed, %d dropped",
+                             o['pending'], o['bytes'] / 1e6, o['replayed'], o['dropped'])
     except KeyboardInterrupt:
         print("\n\n=== Stopping sensors ===")
+        if scheduler is not None:
+            scheduler.stop()
         for s in sensors:
             s.stop()
-            print(f"✓ Stopped: {s.display_name}")
-        
+        if len(sensors) <= 20:
+            for s in sensors:
+                print(f"✓ Stopped: {s.display_name}")
+
         client.loop_stop()
         client.disconnect()
         print("\n=== All sensors stopped ===")
@@ -0,0 +1,157 @@
+"""Batched sensor value generation for large simulated fleets.
+
+publisher.py's temp_gen, humidity_gen, ... compute one value per call from
+time.time() and the global random module: fine for a handful of sensors,
+but a 50k-sensor building spends its time in Python-level generator calls.
+SimulationEngine computes a whole tick for every sensor of a kind in one
+NumPy call instead:
+
+    engine = SimulationEngine(seed=42)
+    gen = engine.add('temperature')   # one slot; a drop-in for temp_gen
+    gen()                             # this tick's value for the slot
+
+Each slot gets its own phase offset on the kind's sine curve, so sensors of
+a kind don't move in lockstep; the models are otherwise the scalar
+generators' (same base, amplitude, period, noise and clamping), which stay
+in publisher.py as the reference implementation. Values are recomputed at
+most once per `tick` seconds, on the first read after the tick is due;
+sensors publish every few seconds, so with the default 1 s tick each
+reading still gets fresh noise.
+
+With a seed, phases and noise come from one seeded generator: the same
+seed and slots give the same phases and noise sequence, and with the same
+tick times (pass a clock) the same readings. Without NumPy the
+engine falls back to a per-slot Python loop over the same models
+(backend='python'); it is reproducible too, just not faster.
+"""
+import math
+import random
+import threading
+import time
+
+try:
+    import numpy as np
+except ImportError:  # optional: pip install numpy
+    np = None
+
+# base + amplitude * sin(t / period + phase) + noise, as in publisher.py:
+# kind -> (base, amplitude, period s, (noise kind, size), low, high, rounding)
+WAVE_MODELS = {
+    'temperature': (22.0, 4.0, 60.0, ('uniform', 0.5), None, None, 'round1'),
+    'humidity': (45.0, 10.0, 90.0, ('integers', 3), 30, 60, 'int'),
+    'light': (700.0, 300.0, 300.0, ('uniform', 100.0), 0, 1200, 'int'),
+}
+# binary kinds: probability of reading 1 on each tick
+EVENT_MODELS = {
+    'motion': 0.15,
+    'door': 0.10,
+}
+KINDS = tuple(WAVE_MODELS) + tuple(EVENT_MODELS)
+BACKENDS = ('numpy', 'python')
+
+
+def _vector_wave(rng, model, t, phases):
+    base, amp, period, (noise_kind, noise), low, high, rounding = model
+    values = base + amp * np.sin(t / period + phases)
+    if noise_kind == 'uniform':
+        values += rng.uniform(-noise, noise, len(phases))
+    else:
+        values += rng.integers(-noise, noise + 1, len(phases))
+    if rounding == 'round1':
+        values = np.round(values, 1)
+    if low is not None:
+        # int() truncates toward zero, then clamp, as the scalar generators do
+        values = np.clip(np.trunc(values), low, high).astype(np.int64)
+    return values.tolist()
+
+
+def _python_wave(rnd, model, t, phases):
+    base, amp, period, (noise_kind, noise), low, high, rounding = model
+    out = []
+    for phase in phases:
+        v = base + amp * math.sin(t / period + phase)
+        v += rnd.uniform(-noise, noise) if noise_kind == 'uniform' else rnd.randint(-noise, noise)
+        if rounding == 'round1':
+            v = round(v, 1)
+        if low is not None:
+            v = max(low, min(high, int(v)))
+        out.append(v)
+    return out
+
+
+class SimulationEngine:
+    """Values for every registered sensor slot, a tick at a time per kind."""
+
+    def __init__(self, seed=None, tick=1.0, clock=time.time, backend=None):
+        if backend is None:
+            backend = 'numpy' if np is not None else 'python'
+        if backend not in BACKENDS:
+            raise ValueError(f"unknown backend {backend!r}")
+        if backend == 'numpy' and np is None:
+            raise RuntimeError('the numpy backend needs numpy installed')
+        self.backend = backend
+        self.seed = seed
+        self.tick = tick
+        self.clock = clock
+        self._rng = np.random.default_rng(seed) if backend == 'numpy' else random.Random(seed)
+        self._lock = threading.Lock()
+        self._phases = {}
+        self._arrays = {}
+        self._values = {}
+        self._next_tick = 0.0
+        self.ticks = 0
+
+    def add(self, kind):
+        """Register one sensor of `kind`; returns its zero-argument generator."""
+        if kind not in KINDS:
+            raise ValueError(f"no model for sensor kind {kind!r}")
+        with self._lock:
+            phases = self._phases.setdefault(kind, [])
+            slot = len(phases)
+            # the first slot of a kind stays on the scalar generator's curve
+            phases.append(0.0 if slot == 0 else self._rng.uniform(0, 2 * math.pi))
+            self._arrays.pop(kind, None)
+            self._next_tick = 0.0
+
+        def generator():
+            if self.clock() >= self._next_tick:
+                self.refresh()
+            return self._values[kind][slot]
+
+        return generator
+
+    def __len__(self):
+        return sum(len(p) for p in self._phases.values())
+
+    def refresh(self, now=None):
+        """Compute the tick at `now` for every slot; a no-op if another thread just did."""
+        with self._lock:
+            now = self.clock() if now is None else now
+            if now < self._next_tick:
+                return
+            self._values = self.compute(now)
+            self._next_tick = now + self.tick
+            self.ticks += 1
+
+    def compute(self, t):
+        """kind -> list of values for every slot at time t, one batched call per kind."""
+        out = {}
+        for kind, phases in self._phases.items():
+            if self.backend == 'numpy':
+                arr = self._arrays.get(kind)
+                if arr is None:
+                    arr = self._arrays[kind] = np.asarray(phases, dtype=np.float64)
+                if kind in EVENT_MODELS:
+                    out[kind] = (self._rng.random(len(arr)) < EVENT_MODELS[kind]).astype(np.int64).tolist()
+                else:
+                    out[kind] = _vector_wave(self._rng, WAVE_MODELS[kind], t, arr)
+            elif kind in EVENT_MODELS:
+                p = EVENT_MODELS[kind]
+                out[kind] = [1 if self._rng.random() < p else 0 for _ in phases]
+            else:
+                out[kind] = _python_wave(self._rng, WAVE_MODELS[kind], t, phases)
+        return out
+
+    def stats(self):
+        return {'backend': self.backend, 'seed': self.seed, 'tick_s': self.tick, 'ticks': self.ticks,
+                'sensors': {kind: len(p) for kind, p in self._phases.items()}}
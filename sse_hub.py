@@ -0,0 +1,507 @@
+import collections
+import itertools
+import json
+import threading
+import time
+import uuid
+
+from topic_trie import TopicTrie, validate_filter
+
+# Overflow policies for a subscriber whose ring buffer is full.
+#   drop_oldest: discard the oldest buffered event to make room
+#   coalesce:    collapse the backlog to the newest event per (topic, direction)
+#                first, then fall back to drop_oldest if it is still full
+OVERFLOW_POLICIES = ('drop_oldest', 'coalesce')
+
+
+# what a /stream?events= filter can select; see event_category()
+EVENT_CATEGORIES = ('publish', 'deliver', 'ack', 'topic', 'aggregates', 'stale')
+
+
+def event_category(item):
+    kind = item.get('type')
+    if kind is not None:
+        return kind
+    direction = item.get('direction')
+    if direction == 'publisher->broker':
+        return 'publish'
+    if direction == 'broker->subscriber' and not item.get('topic', '').startswith('ack/'):
+        return 'deliver'
+    return 'ack'
+
+
+class StreamFilter:
+    """One client's /stream?topics=&events= selection.
+
+    topics are MQTT filters ('+' one level, '#' the rest), compiled into a
+    trie; ack events are matched by the topic of the sensor they belong to.
+    An empty selection means everything.
+    """
+
+    def __init__(self, topics=(), events=()):
+        self.topics = tuple(topics) or ('#',)
+        self.events = frozenset(events) or None
+        unknown = (self.events or frozenset()) - set(EVENT_CATEGORIES)
+        if unknown:
+            raise ValueError(f"unknown event type(s): {', '.join(sorted(unknown))}")
+        self._trie = TopicTrie()
+        for pattern in self.topics:
+            self._trie.insert(pattern, True)
+        # clients with equal selections share filtered copies of multi-topic events
+        self.key = (self.topics, self.events)
+
+    @classmethod
+    def parse(cls, topics=None, events=None):
+        """From comma-separated query values; None when nothing is selected."""
+        topics = [t.strip() for t in (topics or '').split(',') if t.strip()]
+        events = [e.strip() for e in (events or '').split(',') if e.strip()]
+        if not topics and not events:
+            return None
+        return cls(topics, events)
+
+    def matches(self, topic):
+        return bool(self._trie.match(topic))
+
+    def wants(self, category):
+        return self.events is None or category in self.events
+
+    def apply(self, item):
+        """item, a filtered copy of it (snapshots, aggregates), or None."""
+        kind = item.get('type')
+        if kind == 'snapshot':
+            return dict(item,
+                        topics=[e for e in item['topics'] if self.matches(e['topic'])],
+                        latest=[r for r in item['latest'] if self.matches(r['topic'])],
+                        aggregates={t: a for t, a in item.get('aggregates', {}).items()
+                                    if self.wants('aggregates') and self.matches(t)})
+        if kind == 'aggregates':
+            stats = {t: a for t, a in item['stats'].items() if self.matches(t)}
+            return dict(item, stats=stats) if stats and self.wants('aggregates') else None
+        topic = item.get('sensor_topic') or item.get('topic')
+        if topic is None:
+            return item
+        return item if self.wants(event_category(item)) and self.matches(topic) else None
+
+    def __str__(self):
+        events = ','.join(sorted(self.events)) if self.events else '*'
+        return f"topics={','.join(self.topics)} events={events}"
+
+
+def collapse_latest(batch):
+    """Keep only the newest event per (topic, direction) within a batch.
+
+    Used for card updates where only the latest value per topic matters;
+    relative order of the surviving events is preserved. Events without a
+    topic (snapshots, aggregate deltas) are always kept.
+    """
+    seen = set()
+    kept = []
+    for item in reversed(batch):
+        if item.get('topic') is None:
+            kept.append(item)
+            continue
+        key = (item.get('topic'), item.get('direction'))
+        if key in seen:
+            continue
+        seen.add(key)
+        kept.append(item)
+    kept.reverse()
+    return kept
+
+
+class EventEncoder:
+    """Serialize each event once, however many subscribers send it.
+
+    Events are shared dicts, so the JSON text is cached by identity for the
+    most recent `size` events (the cache keeps a reference, so ids cannot be
+    reused while an entry is live). Events carrying a hub 'seq' get an SSE
+    `id:` line of id_prefix-seq, which the browser echoes as Last-Event-ID.
+    on_encode(item), if set, runs once per event just before it is
+    serialized, i.e. on its first write to any /stream client.
+
+    frame(item, cache=False) is for the frames a client gets once on
+    joining: its snapshot and its filtered or replayed events. Those are
+    mostly fresh dicts nobody else sends, so caching them would only push
+    live events out; they reuse a cached encoding when there is one and are
+    otherwise encoded without storing it, and without on_encode.
+    """
+
+    def __init__(self, size=4096, id_prefix=None, on_encode=None):
+        self.size = size
+        self.id_prefix = id_prefix
+        self.on_encode = on_encode
+        self._cache = collections.OrderedDict()
+        self._lock = threading.Lock()
+
+    def _entry(self, item, cache=True):
+        key = id(item)
+        hit = self._cache.get(key)
+        if hit is not None and hit[0] is item:
+            return hit
+        if cache and self.on_encode is not None:
+            self.on_encode(item)
+        text = json.dumps(item)
+        entry = (item, text, f"{self._id_line(item)}data: {text}\n\n".encode())
+        if not cache:
+            return entry
+        with self._lock:
+            self._cache[key] = entry
+            while len(self._cache) > self.size:
+                self._cache.popitem(last=False)
+        return entry
+
+    def _id_line(self, item):
+        seq = item.get('seq')
+        if seq is None or self.id_prefix is None:
+            return ''
+        return f"id: {self.id_prefix}-{seq}\n"
+
+    def __len__(self):
+        return len(self._cache)
+
+    def json(self, item):
+        return self._entry(item)[1]
+
+    def frame(self, item, cache=True):
+        """Encoded SSE data frame for one event, or for a list of events as an array."""
+        if isinstance(item, list):
+            last = next((i for i in reversed(item) if 'seq' in i), {})
+            return (self._id_line(last) + "data: [" + ", ".join(self.json(i) for i in item) + "]\n\n").encode()
+        return self._entry(item, cache)[2]
+
+
+class Subscriber:
+    """A single SSE client's view of the hub: a bounded ring buffer of events.
+
+    publish() never blocks on a slow subscriber; once the buffer is full the
+    subscriber pays for its own backlog according to its overflow policy.
+    """
+
+    _ids = itertools.count(1)
+
+    def __init__(self, maxlen=1000, overflow='drop_oldest', filter=None):
+        if overflow not in OVERFLOW_POLICIES:
+            raise ValueError(f"unknown overflow policy {overflow!r}")
+        self.id = next(self._ids)
+        self.filter = filter
+        self.maxlen = maxlen
+        self.overflow = overflow
+        self.created = time.time()
+        self._buf = collections.deque()
+        self._cond = threading.Condition(threading.Lock())
+        self.received = 0
+        self.delivered = 0
+        self.dropped = 0
+        self.coalesced = 0
+        self.max_lag = 0
+
+    def _coalesce(self):
+        kept = collapse_latest(self._buf)
+        removed = len(self._buf) - len(kept)
+        if removed:
+            self._buf = collections.deque(kept)
+            self.coalesced += removed
+        return removed
+
+    def _append(self, item):
+        self.received += 1
+        if len(self._buf) >= self.maxlen:
+            if not (self.overflow == 'coalesce' and self._coalesce()):
+                self._buf.popleft()
+                self.dropped += 1
+        self._buf.append(item)
+        if len(self._buf) > self.max_lag:
+            self.max_lag = len(self._buf)
+
+    def put(self, item):
+        with self._cond:
+            self._append(item)
+            self._cond.notify()
+
+    def get(self, timeout=None):
+        """Return the next event, or None if nothing arrived within timeout."""
+        with self._cond:
+            if not self._buf and not self._cond.wait_for(lambda: self._buf, timeout):
+                return None
+            self.delivered += 1
+            return self._buf.popleft()
+
+    def get_batch(self, max_items, window, timeout=None):
+        """Wait up to timeout for a first event, then keep collecting for up to
+        window seconds or until max_items are buffered. Returns a (possibly
+        empty) list."""
+        with self._cond:
+            if not self._buf and not self._cond.wait_for(lambda: self._buf, timeout):
+                return []
+            deadline = time.monotonic() + window
+            while len(self._buf) < max_items:
+                remaining = deadline - time.monotonic()
+                if remaining <= 0:
+                    break
+                self._cond.wait(remaining)
+            n = min(max_items, len(self._buf))
+            batch = [self._buf.popleft() for _ in range(n)]
+            self.delivered += n
+            return batch
+
+    @property
+    def lag(self):
+        return len(self._buf)
+
+    def stats(self):
+        with self._cond:
+            return {
+                'id': self.id,
+                'lag': len(self._buf),
+                'max_lag': self.max_lag,
+                'received': self.received,
+                'delivered': self.delivered,
+                'dropped': self.dropped,
+                'coalesced': self.coalesced,
+                'maxlen': self.maxlen,
+                'overflow': self.overflow,
+                'filter': str(self.filter) if self.filter is not None else None,
+                'age_s': round(time.time() - self.created, 1),
+            }
+
+
+class AsyncSubscriber(Subscriber):
+    """Subscriber drained by a coroutine on an asyncio loop instead of a thread.
+
+    put() may be called from any thread; off-loop calls are handed to the loop
+    with call_soon_threadsafe so the buffer is only ever touched on the loop.
+    Must be created on the loop's thread.
+    """
+
+    def __init__(self, loop, maxlen=1000, overflow='drop_oldest', filter=None):
+        super().__init__(maxlen, overflow, filter)
+        self._loop = loop
+        self._loop_thread = threading.get_ident()
+        self._waiter = None
+
+    def _put_local(self, item):
+        self._append(item)
+        if self._waiter is not None and not self._waiter.done():
+            self._waiter.set_result(True)
+
+    def put(self, item):
+        if threading.get_ident() == self._loop_thread:
+            self._put_local(item)
+        else:
+            self._loop.call_soon_threadsafe(self._put_local, item)
+
+    @staticmethod
+    def _expire(fut):
+        if not fut.done():
+            fut.set_result(False)
+
+    async def _wait(self, timeout):
+        # a bare future plus call_later is much cheaper per event than
+        # asyncio.wait_for(), which wraps every wait in a new Task
+        self._waiter = fut = self._loop.create_future()
+        timer = self._loop.call_later(timeout, self._expire, fut) if timeout is not None else None
+        try:
+            return await fut
+        finally:
+            if timer is not None:
+                timer.cancel()
+            self._waiter = None
+
+    async def aget(self, timeout=None):
+        if not self._buf and not await self._wait(timeout):
+            return None
+        self.delivered += 1
+        return self._buf.popleft()
+
+    async def aget_batch(self, max_items, window, timeout=None):
+        if not self._buf and not await self._wait(timeout):
+            return []
+        deadline = self._loop.time() + window
+        while len(self._buf) < max_items:
+            remaining = deadline - self._loop.time()
+            if remaining <= 0 or not await self._wait(remaining):
+                break
+        n = min(max_items, len(self._buf))
+        batch = [self._buf.popleft() for _ in range(n)]
+        self.delivered += n
+        return batch
+
+
+class BroadcastHub:
+    """Fan-out of dashboard events to every connected SSE subscriber.
+
+    The subscriber list is copy-on-write so publish() iterates a snapshot
+    without holding the hub lock, and only ever touches each subscriber's own
+    short-lived buffer lock.
+
+    Every event gets a monotonically increasing 'seq' and is kept in a
+    bounded replay log, so a reconnecting client can be sent just what it
+    missed (see join()). publish() is serialized by its own lock so seq order
+    is also delivery order.
+
+    Subscribers with a StreamFilter are indexed in a topic trie by their
+    filters, so publish() only puts an event to the filtered subscribers
+    whose filters match its topic, instead of testing each one.
+    """
+
+    def __init__(self, maxlen=1000, overflow='drop_oldest', replay=10000):
+        if overflow not in OVERFLOW_POLICIES:
+            raise ValueError(f"unknown overflow policy {overflow!r}")
+        self.maxlen = maxlen
+        self.overflow = overflow
+        self._lock = threading.Lock()
+        self._publish_lock = threading.Lock()
+        self._subs = ()
+        self._plain = ()
+        self._filtered = ()
+        # filtered subscribers by topic filter; changed under the publish lock
+        self._trie = TopicTrie()
+        self._log = collections.deque(maxlen=replay)
+        # event ids from a previous process must not match this one's
+        self.epoch = uuid.uuid4().hex[:8]
+        self.seq = 0
+        self.published = 0
+
+    @property
+    def replay(self):
+        return self._log.maxlen
+
+    @replay.setter
+    def replay(self, n):
+        with self._publish_lock:
+            self._log = collections.deque(self._log, maxlen=n)
+
+    def subscribe(self, maxlen=None, overflow=None):
+        return self.attach(Subscriber(maxlen or self.maxlen, overflow or self.overflow))
+
+    def attach(self, sink):
+        """Register any object with put(item) and stats() as a subscriber.
+
+        A sink with a non-None `filter` (StreamFilter) only gets matching events.
+        """
+        with self._publish_lock:
+            return self._attach(sink)
+
+    def _attach(self, sink):
+        # caller holds the publish lock
+        filter = getattr(sink, 'filter', None)
+        with self._lock:
+            self._subs = self._subs + (sink,)
+            if filter is None:
+                self._plain = self._plain + (sink,)
+            else:
+                self._filtered = self._filtered + (sink,)
+                for pattern in filter.topics:
+                    self._trie.insert(pattern, sink)
+        return sink
+
+    def parse_event_id(self, event_id):
+        """'epoch-seq' from Last-Event-ID -> seq, or None if not one of ours."""
+        epoch, _, seq = (event_id or '').partition('-')
+        if epoch != self.epoch or not seq.isdigit():
+            return None
+        return int(seq)
+
+    def join(self, sink, last_event_id=None, snapshot=None):
+        """Attach sink and return the events to send it before its live feed.
+
+        If last_event_id is ours and the replay log still reaches back to it,
+        that is every event after it; otherwise [snapshot()] when a snapshot
+        callable is given. Both are taken under the publish lock, so nothing
+        falls between them and the live feed.
+        """
+        last = self.parse_event_id(last_event_id)
+        filter = getattr(sink, 'filter', None)
+        with self._publish_lock:
+            self._attach(sink)
+            first = None
+            if last is not None and last <= self.seq:
+                if last == self.seq:
+                    first = []
+                elif self._log and self._log[0]['seq'] <= last + 1:
+                    first = [e for e in self._log if e['seq'] > last]
+            if first is None:
+                first = [snapshot()] if snapshot is not None else []
+        if filter is not None:
+            first = [e for e in map(filter.apply, first) if e is not None]
+        return first
+
+    def unsubscribe(self, sub):
+        filter = getattr(sub, 'filter', None)
+        with self._publish_lock, self._lock:
+            self._subs = tuple(s for s in self._subs if s is not sub)
+            self._plain = tuple(s for s in self._plain if s is not sub)
+            if filter is not None:
+                self._filtered = tuple(s for s in self._filtered if s is not sub)
+                for pattern in filter.topics:
+                    self._trie.remove(pattern, sub)
+
+    def publish(self, item):
+        with self._publish_lock:
+            self.seq += 1
+            item['seq'] = self.seq
+            self._deliver(item)
+
+    def relay(self, items):
+        """Publish events already sequenced by another hub, keeping their seq.
+
+        Used by dashboard workers fed from the ingest process (event_relay);
+        events at or below the current seq were covered by the snapshot the
+        worker started from and are skipped.
+        """
+        with self._publish_lock:
+            for item in items:
+                if item['seq'] <= self.seq:
+                    continue
+                self.seq = item['seq']
+                self._deliver(item)
+
+    def resync(self, epoch, seq):
+        """Continue another hub's id space from seq; the replay log restarts."""
+        with self._publish_lock:
+            self.epoch = epoch
+            self.seq = seq
+            self._log.clear()
+
+    def consistent(self, fn):
+        """fn() with no event published while it runs."""
+        with self._publish_lock:
+            return fn()
+
+    def _deliver(self, item):
+        # caller holds the publish lock
+        self._log.append(item)
+        self.published += 1
+        for sub in self._plain:
+            sub.put(item)
+        if self._filtered:
+            self._route(item)
+
+    def _route(self, item):
+        topic = item.get('sensor_topic') or item.get('topic')
+        if topic is not None:
+            category = event_category(item)
+            for sub in self._trie.match(topic):
+                if sub.filter.wants(category):
+                    sub.put(item)
+            return
+        # multi-topic events (aggregates): one filtered copy per distinct selection
+        copies = {}
+        for sub in self._filtered:
+            key = sub.filter.key
+            if key not in copies:
+                copies[key] = sub.filter.apply(item)
+            if copies[key] is not None:
+                sub.put(copies[key])
+
+    def __len__(self):
+        return len(self._subs)
+
+    def stats(self):
+        return {
+            'published': self.published,
+            'filtered': len(self._filtered),
+            'replay_log': len(self._log),
+            'replay_max': self._log.maxlen,
+            'subscribers': [s.stats() for s in self._subs],
+        }
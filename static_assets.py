@@ -0,0 +1,195 @@
+"""Precomputed responses for the dashboard page and its static assets.
+
+Every asset is read (or rendered) once at startup and kept as bytes together
+with its gzip and, when the brotli package is installed, brotli encodings
+and an ETag over the uncompressed body. A request then costs a dict lookup
+and a header comparison: no template rendering and no per-request
+compression. Both servers use the same bundle: Flask from a route, the
+asyncio server directly on its loop.
+
+Caching:
+  - a request whose If-None-Match matches the ETag gets 304 with no body
+  - an asset requested with ?v=<its version> (how the pages reference
+    Chart.js and dashboard.js) is cached for a year as immutable; any other
+    request (the page itself, a bare asset URL) must revalidate (no-cache),
+    which the ETag turns into a 304
+
+Chart.js is vendored in static/vendor/ (the MIT-licensed upstream build,
+version CHART_JS_VERSION) and both pages are pointed at it, so they work
+on a network without internet access. To move to another version, change
+CHART_JS_VERSION and the pages' CDN URLs, then refresh the file:
+
+    python static_assets.py --fetch-chartjs
+
+If the file is missing the pages fall back to the CDN.
+"""
+import argparse
+import gzip
+import hashlib
+import logging
+import os
+import re
+import urllib.request
+
+try:
+    import brotli
+except ImportError:  # optional: pip install brotli
+    brotli = None
+
+log = logging.getLogger('dashboard')
+
+ROOT = os.path.dirname(os.path.abspath(__file__))
+VENDOR_DIR = os.path.join(ROOT, 'static', 'vendor')
+CHART_JS = 'chart.umd.min.js'
+CHART_JS_VERSION = '4.5.1'
+CHART_JS_CDN = f'https://cdn.jsdelivr.net/npm/chart.js@{CHART_JS_VERSION}/dist/chart.umd.min.js'
+# any pinned jsdelivr Chart.js URL in a page, swapped for the vendored copy
+CHART_JS_CDN_RE = re.compile(r'https://cdn\.jsdelivr\.net/npm/chart\.js@[^"/]+/dist/chart\.umd(?:\.min)?\.js')
+CHART_JS_PATH = '/static/vendor/' + CHART_JS
+
+REVALIDATE = 'no-cache'
+IMMUTABLE = 'public, max-age=31536000, immutable'
+# below this the encoded body plus its header is not worth it
+MIN_COMPRESS = 256
+
+
+def _accepted(accept_encoding):
+    """Accept-Encoding -> the set of codings with a non-zero q value."""
+    accepted = set()
+    for part in (accept_encoding or '').split(','):
+        coding, _, params = part.strip().partition(';')
+        q = params.strip()
+        if q.startswith('q='):
+            try:
+                if float(q[2:]) == 0:
+                    continue
+            except ValueError:
+                continue
+        if coding:
+            accepted.add(coding.strip().lower())
+    return accepted
+
+
+class Asset:
+    """One static response, with its encodings and ETag computed up front."""
+
+    def __init__(self, body, content_type):
+        if isinstance(body, str):
+            body = body.encode()
+        self.content_type = content_type
+        self.version = hashlib.sha256(body).hexdigest()[:16]
+        self.etag = f'"{self.version}"'
+        self.encoded = {'identity': body}
+        if len(body) >= MIN_COMPRESS:
+            # mtime=0 keeps the gzip bytes, and so the response, identical across restarts
+            self._keep('gzip', gzip.compress(body, 9, mtime=0))
+            if brotli is not None:
+                self._keep('br', brotli.compress(body, quality=11))
+
+    def _keep(self, coding, data):
+        if len(data) < len(self.encoded['identity']):
+            self.encoded[coding] = data
+
+    def not_modified(self, if_none_match):
+        if not if_none_match:
+            return False
+        if if_none_match.strip() == '*':
+            return True
+        # weak comparison, as for GET: W/"x" matches "x"
+        tags = (t.strip() for t in if_none_match.split(','))
+        return any((t[2:] if t.startswith('W/') else t) == self.etag for t in tags)
+
+    def respond(self, accept_encoding=None, if_none_match=None, version=None):
+        """(status, headers, body) for a GET with these request headers and ?v=."""
+        headers = [('ETag', self.etag),
+                   ('Cache-Control', IMMUTABLE if version == self.version else REVALIDATE),
+                   ('Vary', 'Accept-Encoding')]
+        if self.not_modified(if_none_match):
+            return '304 Not Modified', headers, b''
+        accepted = _accepted(accept_encoding)
+        coding = next((c for c in ('br', 'gzip') if c in self.encoded and (c in accepted or '*' in accepted)),
+                      'identity')
+        headers.append(('Content-Type', self.content_type))
+        if coding != 'identity':
+            headers.append(('Content-Encoding', coding))
+        return '200 OK', headers, self.encoded[coding]
+
+    def stats(self):
+        return {'version': self.version, **{coding: len(data) for coding, data in self.encoded.items()}}
+
+
+class AssetBundle:
+    """Path -> Asset for everything the dashboard serves that never changes while it runs."""
+
+    def __init__(self):
+        self.assets = {}
+
+    def add(self, path, body, content_type):
+        asset = self.assets[path] = Asset(body, content_type)
+        return asset
+
+    def get(self, path):
+        return self.assets.get(path)
+
+    def __contains__(self, path):
+        return path in self.assets
+
+    def stats(self):
+        return {path: asset.stats() for path, asset in self.assets.items()}
+
+
+def _read(path):
+    with open(path, 'rb') as f:
+        return f.read()
+
+
+def build_bundle(page):
+    """The dashboard page (already rendered) at '/', plus the static assets.
+
+    The standalone dashboard_template.html and its dashboard.js are served
+    under /static/. Pages reference dashboard.js and Chart.js with ?v= so
+    those can be cached for good; the CDN URL is swapped for the vendored
+    copy when there is one.
+    """
+    bundle = AssetBundle()
+    chart_js = os.path.join(VENDOR_DIR, CHART_JS)
+    chart_url = CHART_JS_CDN
+    if os.path.exists(chart_js):
+        asset = bundle.add(CHART_JS_PATH, _read(chart_js), 'application/javascript; charset=utf-8')
+        chart_url = f"{CHART_JS_PATH}?v={asset.version}"
+    else:
+        log.warning('Chart.js is missing from %s; pages load it from %s. '
+                    'Run python static_assets.py --fetch-chartjs', chart_js, CHART_JS_CDN)
+
+    script = bundle.add('/static/dashboard.js', _read(os.path.join(ROOT, 'dashboard.js')),
+                        'application/javascript; charset=utf-8')
+    template = _read(os.path.join(ROOT, 'dashboard_template.html')).decode()
+    template = CHART_JS_CDN_RE.sub(chart_url, template)
+    template = template.replace('src="dashboard.js"', f'src="dashboard.js?v={script.version}"')
+    bundle.add('/static/dashboard_template.html', template, 'text/html; charset=utf-8')
+    bundle.add('/', CHART_JS_CDN_RE.sub(chart_url, page), 'text/html; charset=utf-8')
+    return bundle
+
+
+def fetch_chartjs(url=CHART_JS_CDN):
+    os.makedirs(VENDOR_DIR, exist_ok=True)
+    with urllib.request.urlopen(url, timeout=30) as resp:
+        body = resp.read()
+    path = os.path.join(VENDOR_DIR, CHART_JS)
+    with open(path, 'wb') as f:
+        f.write(body)
+    print(f"{url} -> {path} ({len(body)} bytes, sha256 {hashlib.sha256(body).hexdigest()})")
+
+
+def main():
+    parser = argparse.ArgumentParser(description='Dashboard static assets')
+    parser.add_argument('--fetch-chartjs', action='store_true', help=f'refresh the vendored copy from {CHART_JS_CDN}')
+    args = parser.parse_args()
+    if args.fetch_chartjs:
+        fetch_chartjs()
+    else:
+        parser.print_help()
+
+
+if __name__ == '__main__':
+    main()
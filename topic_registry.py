@@ -0,0 +1,77 @@
+import threading
+import time
+
+# display defaults per sensor kind (the last topic level); anything else gets GENERIC
+KIND_CONFIG = {
+    'temperature': {'label': 'Temperature', 'unit': '°C', 'color': '#ef4444', 'min': 15, 'max': 35, 'icon': '🌡️'},
+    'humidity': {'label': 'Humidity', 'unit': '%', 'color': '#3b82f6', 'min': 0, 'max': 100, 'icon': '💧'},
+    'motion': {'label': 'Motion Sensor', 'unit': '', 'color': '#8b5cf6', 'min': 0, 'max': 1, 'icon': '👁️'},
+    'light': {'label': 'Light Level', 'unit': 'lux', 'color': '#f59e0b', 'min': 0, 'max': 1200, 'icon': '💡'},
+    'door': {'label': 'Door Sensor', 'unit': '', 'color': '#10b981', 'min': 0, 'max': 1, 'icon': '🚪'},
+}
+GENERIC = {'unit': '', 'color': '#6b7280', 'min': None, 'max': None, 'icon': '📟'}
+
+
+def topic_config(topic):
+    """Card config for home/<location>/<kind>, filled from KIND_CONFIG."""
+    parts = topic.split('/')
+    kind = parts[-1]
+    location = parts[-2] if len(parts) >= 3 else ''
+    cfg = dict(KIND_CONFIG.get(kind) or dict(GENERIC, label=kind.capitalize()))
+    cfg['location'] = location.capitalize()
+    return cfg
+
+
+class TopicRegistry:
+    """Sensor topics seen on the wire, and which topic each sensor id publishes to.
+
+    observe() runs on the MQTT thread for every reading and is a pair of dict
+    lookups once a topic and sensor are known; the lock is only taken to add
+    something new, so readers on request threads get consistent snapshots.
+    """
+
+    def __init__(self):
+        self._lock = threading.Lock()
+        self._topics = {}
+        self._by_sensor = {}
+
+    def observe(self, topic, sensor_id=None):
+        """Record a reading; return the new entry if the topic was not known yet."""
+        entry = None
+        if topic not in self._topics:
+            entry = {'topic': topic, 'config': topic_config(topic), 'first_seen': int(time.time() * 1000)}
+            with self._lock:
+                self._topics[topic] = entry
+        if sensor_id is not None and self._by_sensor.get(sensor_id) != topic:
+            with self._lock:
+                self._by_sensor[sensor_id] = topic
+        return entry
+
+    def add(self, entry):
+        """Record an entry made by another registry (a worker mirroring ingest)."""
+        with self._lock:
+            self._topics.setdefault(entry['topic'], entry)
+
+    def clear(self):
+        with self._lock:
+            self._topics = {}
+            self._by_sensor = {}
+
+    def topic_for_sensor(self, sensor_id):
+        return self._by_sensor.get(sensor_id)
+
+    def forget_sensor(self, sensor_id):
+        """Drop a sensor id that is no longer tracked; its topic stays."""
+        with self._lock:
+            self._by_sensor.pop(sensor_id, None)
+
+    @property
+    def sensors(self):
+        return len(self._by_sensor)
+
+    def __len__(self):
+        return len(self._topics)
+
+    def snapshot(self):
+        with self._lock:
+            return sorted(self._topics.values(), key=lambda e: e['topic'])
@@ -0,0 +1,101 @@
+"""MQTT topic-filter matching through a trie.
+
+Filters are inserted once; match(topic) then walks the topic's levels,
+following the literal child, any '+' child and collecting '#' children on
+the way, so the cost depends on topic depth and wildcard use rather than on
+how many filters are registered.
+
+    trie = TopicTrie()
+    trie.insert('home/livingroom/+', client_a)
+    trie.insert('home/#', client_b)
+    trie.match('home/livingroom/temperature')   # {client_a, client_b}
+"""
+
+
+def validate_filter(pattern):
+    """Raise ValueError unless pattern is a valid MQTT topic filter."""
+    if not pattern:
+        raise ValueError("empty topic filter")
+    levels = pattern.split('/')
+    for i, level in enumerate(levels):
+        if level == '#' and i != len(levels) - 1:
+            raise ValueError(f"'#' must be the last level in {pattern!r}")
+        if level not in ('+', '#') and ('+' in level or '#' in level):
+            raise ValueError(f"wildcards must occupy a whole level in {pattern!r}")
+    return pattern
+
+
+class _Node:
+    __slots__ = ('children', 'values')
+
+    def __init__(self):
+        self.children = {}
+        self.values = set()
+
+
+class TopicTrie:
+    def __init__(self):
+        self.root = _Node()
+        self.size = 0
+
+    def insert(self, pattern, value):
+        node = self.root
+        for level in validate_filter(pattern).split('/'):
+            node = node.children.setdefault(level, _Node())
+        if value not in node.values:
+            node.values.add(value)
+            self.size += 1
+
+    def remove(self, pattern, value):
+        path = [self.root]
+        for level in pattern.split('/'):
+            node = path[-1].children.get(level)
+            if node is None:
+                return
+            path.append(node)
+        if value in path[-1].values:
+            path[-1].values.discard(value)
+            self.size -= 1
+        # prune empty branches
+        levels = pattern.split('/')
+        for depth in range(len(levels), 0, -1):
+            node = path[depth]
+            if node.values or node.children:
+                break
+            del path[depth - 1].children[levels[depth - 1]]
+
+    def match(self, topic):
+        """Every value whose filter matches topic."""
+        found = set()
+        nodes = [self.root]
+        for level in topic.split('/'):
+            next_nodes = []
+            for node in nodes:
+                children = node.children
+                if not children:
+                    continue
+                multi = children.get('#')
+                if multi is not None:
+                    found |= multi.values
+                child = children.get(level)
+                if child is not None:
+                    next_nodes.append(child)
+                child = children.get('+')
+                if child is not None:
+                    next_nodes.append(child)
+            if not next_nodes:
+                return found
+            nodes = next_nodes
+        for node in nodes:
+            found |= node.values
+            # 'a/#' also matches 'a' itself
+            multi = node.children.get('#')
+            if multi is not None:
+                found |= multi.values
+        return found
+
+    def __len__(self):
+        return self.size
+
+    def __bool__(self):
+        return self.size > 0
@@ -0,0 +1,145 @@
+"""Per-hop latency report from --trace-file captures (see tracing.py).
+
+Give it the dashboard's and the publisher's trace files (or one file both
+append to); lines are joined by reading id:
+
+    python trace_report.py dashboard.trace publisher.trace
+    python trace_report.py traces/*.jsonl --slowest 10 --json report.json
+
+Hops marked * are measured across two clocks (publisher, dashboard, browser);
+they are only as good as the clocks' sync, and are clamped at zero.
+"""
+import argparse
+import collections
+import json
+import sys
+
+# (name, start, end, cross-clock)
+HOPS = [
+    ('publish_to_receive', 'pub', 'recv', True),
+    ('receive_to_enqueue', 'recv', 'enq', False),
+    ('enqueue_to_sse_write', 'enq', 'sse', False),
+    ('sse_write_to_arrive', 'sse', 'arrive', True),
+    ('arrive_to_render', 'arrive', 'render', False),
+    ('receive_to_ack_publish', 'recv', 'ack_pub', False),
+    ('ack_publish_to_receive', 'ack_pub', 'ack_recv', True),
+    ('publish_to_render', 'pub', 'render', True),
+    ('roundtrip', 'pub', 'ack_recv', False),
+]
+
+
+def load(paths):
+    """id -> {hop name: ms timestamp}, plus the number of unreadable lines."""
+    traces = collections.defaultdict(dict)
+    bad = 0
+    for path in paths:
+        with open(path) as f:
+            for line in f:
+                try:
+                    rec = json.loads(line)
+                    ev, msg_id = rec['ev'], rec['id']
+                except (ValueError, KeyError, TypeError):
+                    bad += 1
+                    continue
+                t = traces[msg_id]
+                if ev == 'ingest':
+                    t.update(pub=rec.get('pub'), recv=rec['recv'], enq=rec['enq'], topic=rec.get('topic'))
+                elif ev == 'sse':
+                    # several workers or browsers: keep the first write
+                    t['sse'] = min(rec['t'], t.get('sse', rec['t']))
+                elif ev == 'ack_pub':
+                    t['ack_pub'] = rec['t']
+                elif ev == 'render':
+                    if 'render' not in t or rec['render'] < t['render']:
+                        t['arrive'], t['render'] = rec['arrive'], rec['render']
+                elif ev == 'ack_recv':
+                    t['ack_recv'] = rec['t']
+                    t.setdefault('ack_pub', rec.get('ack_ts'))
+                    # the publisher's own send time is finer than the payload's ms ts
+                    t['sent'] = rec.get('sent')
+    return traces, bad
+
+
+def hop_samples(traces):
+    samples = {name: [] for name, *_ in HOPS}
+    for t in traces.values():
+        for name, start, end, _ in HOPS:
+            a, b = t.get(start), t.get(end)
+            if start == 'pub' and t.get('sent') is not None and (a is None or end == 'ack_recv'):
+                # the roundtrip stays on the publisher's clock
+                a = t['sent']
+            if isinstance(a, (int, float)) and isinstance(b, (int, float)):
+                samples[name].append(max(0.0, b - a))
+    return samples
+
+
+def percentile(sorted_values, p):
+    if not sorted_values:
+        return 0.0
+    return sorted_values[min(len(sorted_values) - 1, int(p / 100.0 * len(sorted_values)))]
+
+
+def summarize(samples):
+    out = {}
+    for name, values in samples.items():
+        values.sort()
+        out[name] = {
+            'count': len(values),
+            'p50_ms': percentile(values, 50),
+            'p90_ms': percentile(values, 90),
+            'p99_ms': percentile(values, 99),
+            'max_ms': values[-1] if values else 0.0,
+            'mean_ms': sum(values) / len(values) if values else 0.0,
+        }
+    return out
+
+
+def slowest(traces, n):
+    """The n traces with the longest publish-to-render (or roundtrip) time, hop by hop."""
+    rows = []
+    for msg_id, t in traces.items():
+        start = t.get('pub') or t.get('sent')
+        end = t.get('render') or t.get('ack_recv')
+        if isinstance(start, (int, float)) and isinstance(end, (int, float)):
+            rows.append((end - start, msg_id, t))
+    rows.sort(key=lambda r: r[0], reverse=True)
+    return rows[:n]
+
+
+def main():
+    parser = argparse.ArgumentParser(description='Per-hop latency report from trace files')
+    parser.add_argument('files', nargs='+', help='JSON-lines trace files written with --trace-file')
+    parser.add_argument('--slowest', type=int, default=0, help='also list the N slowest traces hop by hop')
+    parser.add_argument('--json', help='write the summary as JSON here')
+    args = parser.parse_args()
+
+    traces, bad = load(args.files)
+    if not traces:
+        sys.exit('no trace lines found')
+    summary = summarize(hop_samples(traces))
+    complete = sum(1 for t in traces.values() if 'render' in t and 'ack_recv' in t)
+    print(f"{len(traces)} traced readings, {complete} with every hop, {bad} unreadable lines\n")
+    print(f"{'hop':<26} {'n':>7} {'p50 ms':>9} {'p90 ms':>9} {'p99 ms':>9} {'max ms':>9}")
+    cross = {name: c for name, _, _, c in HOPS}
+    for name, s in summary.items():
+        label = name + (' *' if cross[name] else '')
+        print(f"{label:<26} {s['count']:>7} {s['p50_ms']:>9.2f} {s['p90_ms']:>9.2f} {s['p99_ms']:>9.2f} {s['max_ms']:>9.2f}")
+    print("\n* spans two clocks")
+
+    if args.slowest:
+        print(f"\nslowest {args.slowest}:")
+        for total, msg_id, t in slowest(traces, args.slowest):
+            parts = []
+            for name, start, end, _ in HOPS[:7]:
+                a, b = t.get(start), t.get(end)
+                if isinstance(a, (int, float)) and isinstance(b, (int, float)):
+                    parts.append(f"{name}={b - a:.1f}")
+            print(f"  {total:9.1f} ms  {msg_id[:12]}  {t.get('topic') or ''}  " + ' '.join(parts))
+
+    if args.json:
+        with open(args.json, 'w') as f:
+            json.dump({'traces': len(traces), 'complete': complete, 'hops': summary}, f, indent=2)
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,115 @@
+"""Per-reading hop tracing across publisher, dashboard and browser.
+
+A reading is traced when crc32 of its id falls under the sample rate, so the
+publisher and the dashboard pick the same readings without talking to each
+other. A traced reading collects one timestamp per hop (ms since the epoch,
+each on the clock of the process that recorded it):
+
+    pub       publisher: the reading's ts
+    recv      dashboard: MQTT on_message entered
+    enq       dashboard: reading event handed to the SSE hub
+    sse       dashboard: event first written to a /stream client
+    ack_pub   dashboard: ack for the reading published
+    ack_recv  publisher: ack arrived in Sensor._on_ack
+    arrive    browser:   EventSource message handled
+    render    browser:   card repainted (reported to POST /trace/render)
+
+pub/recv/enq/sse travel with the event in its 'trace' field, so the page can
+send them back with its own two. Each process appends what it saw to
+--trace-file as JSON lines, written by a background thread:
+
+    {"ev": "ingest", "id": ..., "topic": ..., "pub": ..., "recv": ..., "enq": ...}
+    {"ev": "sse", "id": ..., "t": ...}
+    {"ev": "ack_pub", "id": ..., "t": ...}
+    {"ev": "render", "id": ..., "arrive": ..., "render": ...}
+    {"ev": "ack_recv", "id": ..., "sent": ..., "ack_ts": ..., "t": ...}
+
+trace_report.py joins the files by id. Processes may share one file: every
+batch of lines goes out in a single O_APPEND write.
+"""
+import collections
+import json
+import os
+import queue
+import threading
+import zlib
+
+
+class Tracer:
+    """Sampling decision, open traces and the trace file writer for one process."""
+
+    def __init__(self, sample=0.0, path=None, queue_size=100000, open_max=10000):
+        self.sample = sample
+        self.path = path
+        self.open_max = open_max
+        self.recorded = 0
+        self.dropped = 0
+        # id -> trace dict of readings waiting for their ack
+        self._open = collections.OrderedDict()
+        self._lock = threading.Lock()
+        self._queue = queue.Queue(queue_size)
+        self._thread = None
+
+    @property
+    def sample(self):
+        return self._sample
+
+    @sample.setter
+    def sample(self, rate):
+        self._sample = max(0.0, min(1.0, rate))
+        self._threshold = int(self._sample * 0x100000000)
+
+    def sampled(self, msg_id):
+        if not self._threshold or not isinstance(msg_id, str):
+            return False
+        return zlib.crc32(msg_id.encode()) < self._threshold
+
+    def start(self):
+        if self.path and self._thread is None:
+            self._thread = threading.Thread(target=self._run, daemon=True)
+            self._thread.start()
+        return self
+
+    def record(self, ev, msg_id, **fields):
+        """Queue one trace line; never blocks, drops (and counts) when full."""
+        if self._thread is None:
+            return
+        fields['ev'] = ev
+        fields['id'] = msg_id
+        try:
+            self._queue.put_nowait(fields)
+            self.recorded += 1
+        except queue.Full:
+            self.dropped += 1
+
+    def open(self, msg_id, trace):
+        with self._lock:
+            self._open[msg_id] = trace
+            if len(self._open) > self.open_max:
+                # never acked: forget the oldest
+                self._open.popitem(last=False)
+
+    def close(self, msg_id):
+        """The trace opened for msg_id, or None; it is forgotten either way."""
+        with self._lock:
+            return self._open.pop(msg_id, None)
+
+    def _run(self):
+        fd = os.open(self.path, os.O_WRONLY | os.O_APPEND | os.O_CREAT, 0o644)
+        while True:
+            lines = [self._queue.get()]
+            while len(lines) < 1000:
+                try:
+                    lines.append(self._queue.get_nowait())
+                except queue.Empty:
+                    break
+            os.write(fd, ''.join(json.dumps(l, separators=(',', ':')) + '\n' for l in lines).encode())
+
+    def stats(self):
+        return {'sample': self.sample, 'path': self.path, 'recorded': self.recorded,
+                'dropped': self.dropped, 'open': len(self._open), 'queued': self._queue.qsize()}
+
+
+def add_tracing_args(parser, sample=0.01):
+    parser.add_argument('--trace-sample', type=float, default=sample, help='fraction of readings traced hop by hop (picked by id, the same on every side)')
+    parser.add_argument('--trace-file', default='', help='append traced readings here as JSON lines for trace_report.py')